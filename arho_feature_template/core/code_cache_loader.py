@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import logging
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from qgis.core import QgsApplication, QgsTask, QgsVectorLayer
+
+from arho_feature_template.core.settings_manager import SettingsManager
+from arho_feature_template.exceptions import LayerNotFoundError
+from arho_feature_template.project.layers.code_layers import code_layers
+from arho_feature_template.utils.misc_utils import iface
+
+if TYPE_CHECKING:
+    from arho_feature_template.project.layers.code_layers import AbstractCodeLayer
+
+logger = logging.getLogger(__name__)
+
+
+class CodeCacheLoadTask(QgsTask):
+    """Reads the codes of a code layer in a background thread with `AbstractCodeLayer.read_codes`."""
+
+    def __init__(self, layer_class: type[AbstractCodeLayer]):
+        """Raises `LayerNotFoundError` if the code layer is not in the project."""
+        super().__init__(f"Koodiston {layer_class.name} lataus", QgsTask.CanCancel)
+        layer = layer_class.get_from_project()
+        self.layer_class = layer_class
+        self.layer_source = layer.source()
+        self.layer_name = layer.name()
+        self.provider_type = layer.providerType()
+
+        self.codes: dict[str, dict[str, Any]] | None = None
+        self.state: dict[str, Any] | None = None
+
+    def run(self) -> bool:
+        # Project layers may only be accessed from the main thread, so the task reads from a layer of its own
+        layer = QgsVectorLayer(self.layer_source, self.layer_name, self.provider_type)
+        if not layer.isValid() or self.isCanceled():
+            return False
+
+        try:
+            self.codes, self.state = self.layer_class.read_codes(layer)
+        except Exception:
+            logger.exception("Failed to read codes of layer %s", self.layer_name)
+            return False
+        return not self.isCanceled()
+
+
+class CodeCacheLoader:
+    """
+    Builds the caches of all code layers with parallel background tasks.
+
+    While the cache of a layer is being built, lookups from the layer wait for that layer's task only (see
+    `AbstractCodeLayer._pending_cache_load`). If a task fails or its layer is missing from the project, the layer
+    falls back to building its cache lazily.
+    """
+
+    def __init__(self):
+        self._tasks: dict[type[AbstractCodeLayer], CodeCacheLoadTask] = {}
+        self._task_count = 0
+
+    def start(self):
+        self.cancel()
+
+        for layer_class in code_layers:
+            try:
+                task = CodeCacheLoadTask(layer_class)
+            except LayerNotFoundError:
+                logger.warning("Code layer %s not found, its codes are not loaded in the background", layer_class.name)
+                continue
+            task.taskCompleted.connect(partial(self._finish, layer_class))
+            task.taskTerminated.connect(partial(self._finish, layer_class))
+            self._tasks[layer_class] = task
+            layer_class._pending_cache_load = partial(self.wait_for, layer_class)  # noqa: SLF001
+            QgsApplication.taskManager().addTask(task)
+
+        self._task_count = len(self._tasks)
+        self._show_progress()
+
+    def wait_for(self, layer_class: type[AbstractCodeLayer]):
+        """
+        Blocks until the cache of the layer is built.
+
+        Lookups are made from the main thread, so this blocks the UI. The wait is bounded by the code cache wait
+        timeout setting (30 s by default), after which the layer falls back to querying the database.
+        """
+        task = self._tasks.get(layer_class)
+        if task is None:
+            return
+
+        timeout = SettingsManager.get_code_cache_wait_timeout()
+        if not task.waitForFinished(timeout * 1000):
+            logger.warning("Timed out after %d s waiting for the codes of layer %s", timeout, layer_class.name)
+            return
+        self._finish(layer_class)
+
+    def cancel(self):
+        for layer_class, task in self._tasks.items():
+            layer_class._pending_cache_load = None  # noqa: SLF001
+            task.cancel()
+        self._tasks = {}
+        iface.statusBarIface().clearMessage()
+
+    def _finish(self, layer_class: type[AbstractCodeLayer]):
+        task = self._tasks.pop(layer_class, None)
+        if task is None:
+            return
+
+        if task.codes is not None:
+            layer_class.set_cache(task.codes, task.state)
+        else:
+            layer_class._pending_cache_load = None  # noqa: SLF001
+        self._show_progress()
+
+    def _show_progress(self):
+        if not self._tasks:
+            iface.statusBarIface().clearMessage()
+            return
+
+        loaded_count = self._task_count - len(self._tasks)
+        iface.statusBarIface().showMessage(f"Ladataan koodistoja ({loaded_count}/{self._task_count}) ...")
@@ -1,7 +1,13 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, cast
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from typing import TYPE_CHECKING, ClassVar, Iterable, Iterator, Mapping, TypeVar, cast
 
+from qgis.PyQt import sip
+
+from arho_feature_template.core.model_diff import ChangeSet, diff_models
 from arho_feature_template.project.layers.plan_layers import (
     AdditionalInformationLayer,
     DocumentLayer,
@@ -15,6 +21,7 @@ from arho_feature_template.project.layers.plan_layers import (
     RegulationGroupLayer,
     TypeOfVerbalRegulationAssociationLayer,
     get_plan_feature_layer_class_by_model,
+    plan_feature_layers,
 )
 from arho_feature_template.utils.misc_utils import (
     get_active_plan_matter_id,
@@ -30,37 +37,335 @@ if TYPE_CHECKING:
         AdditionalInformation,
         Document,
         Plan,
+        PlanBaseModel,
         PlanMatter,
         PlanObject,
         Proposition,
         Regulation,
         RegulationGroup,
     )
+    from arho_feature_template.project.layers import AbstractLayer
+    from arho_feature_template.project.layers.plan_layers import AbstractAssociationLayer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="PlanBaseModel")
+
+# Order in which the edited layers are committed so that referenced features are saved before the features
+# referring to them
+COMMIT_ORDER: list[type[AbstractLayer]] = [
+    PlanMatterLayer,
+    PlanLayer,
+    *plan_feature_layers,
+    RegulationGroupLayer,
+    RegulationGroupAssociationLayer,
+    PlanRegulationLayer,
+    PlanPropositionLayer,
+    AdditionalInformationLayer,
+    PlanThemeAssociationLayer,
+    TypeOfVerbalRegulationAssociationLayer,
+    LegalEffectAssociationLayer,
+    DocumentLayer,
+]
+
+
+class UnitOfWork:
+    """
+    Collects the edits made with `save_feature` and `delete_feature` and commits them once per layer.
+
+    Use through the `unit_of_work` context manager. When the outermost context exits, inserts and updates are
+    committed in `COMMIT_ORDER` and after them the deletes are applied and committed in the reverse order, so that
+    children are deleted before their parents without relying on cascading deletes in the database. Deletes are kept
+    out of the edit buffers until then. If committing a layer fails, the edits the unit made to that layer and to the
+    layers that were not committed yet are undone. Edits that were in the edit buffers before the unit started are
+    kept.
+    """
+
+    active: ClassVar[UnitOfWork | None] = None
+
+    def __init__(self):
+        self.layers: dict[str, QgsVectorLayer] = {}
+        self.committed = False
+        self.finished = False
+        self._undo_indexes: dict[str, int] = {}  # Undo stack index of each layer before its first edit
+        self._deletes: dict[str, tuple[str, dict[int, None]]] = {}  # Edit text and feature IDs by layer ID
+
+    def register(self, layer: QgsVectorLayer) -> None:
+        """Registers the layer before it is edited for the first time in the unit."""
+        if layer.id() not in self.layers:
+            self.layers[layer.id()] = layer
+            self._undo_indexes[layer.id()] = layer.undoStack().index()
+
+    def delete_later(self, layer: QgsVectorLayer, feature_ids: Iterable[int], delete_text: str) -> None:
+        """Deletes the features when the unit is committed, after the inserts and updates of all layers."""
+        self.layers.setdefault(layer.id(), layer)
+        _, pending_ids = self._deletes.setdefault(layer.id(), (delete_text, {}))
+        pending_ids.update(dict.fromkeys(feature_ids))
+
+    def commit(self) -> bool:
+        self.finished = True
+        commit_order = [layer_class.name for layer_class in COMMIT_ORDER]
+        layers = sorted(
+            (layer for layer in self.layers.values() if not sip.isdeleted(layer)),
+            key=lambda layer: commit_order.index(layer.name()) if layer.name() in commit_order else len(commit_order),
+        )
+
+        for i, layer in enumerate(layers):
+            if layer.isModified() and not self._commit_layer(layer):
+                self._rollback(layers[i:])
+                return False
+
+        deleting_layers = [layer for layer in reversed(layers) if self._deletes.get(layer.id())]
+        for i, layer in enumerate(deleting_layers):
+            delete_text, feature_ids = self._deletes[layer.id()]
+            if not layer.isEditable():
+                layer.startEditing()
+            # Committing the inserts and updates cleared the undo stack
+            self._undo_indexes[layer.id()] = layer.undoStack().index()
+            layer.beginEditCommand(delete_text)
+            deleted = layer.deleteFeatures(list(feature_ids))
+            layer.endEditCommand()
+            if not deleted or not self._commit_layer(layer):
+                self._rollback(deleting_layers[i:])
+                return False
+
+        self.committed = True
+        return True
+
+    def rollback(self) -> None:
+        self.finished = True
+        self._rollback([layer for layer in self.layers.values() if not sip.isdeleted(layer)])
+
+    def _commit_layer(self, layer: QgsVectorLayer) -> bool:
+        if layer.commitChanges(stopEditing=False):
+            return True
+        logger.warning("Failed to commit layer %s: %s", layer.name(), layer.commitErrors())
+        iface.messageBar().pushCritical("", f"Muutosten tallentaminen tasolle {layer.name()} epäonnistui.")
+        return False
+
+    def _rollback(self, layers: list[QgsVectorLayer]) -> None:
+        self._deletes.clear()
+        for layer in layers:
+            undo_stack = layer.undoStack()
+            if layer.isEditable() and undo_stack.index() > self._undo_indexes.get(layer.id(), undo_stack.index()):
+                undo_stack.setIndex(self._undo_indexes[layer.id()])
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Defers commits of `save_feature` and `delete_feature` until the context exits.
+
+    Nested contexts join the outermost unit of work, which commits all the collected edits. If an exception is
+    raised inside the context, all the collected edits are rolled back. A unit rolled back inside the context is
+    not committed.
+    """
+    if UnitOfWork.active is not None:
+        yield UnitOfWork.active
+        return
+
+    unit = UnitOfWork()
+    UnitOfWork.active = unit
+    try:
+        yield unit
+    except Exception:
+        UnitOfWork.active = None
+        unit.rollback()
+        raise
+    UnitOfWork.active = None
+    if not unit.finished:
+        unit.commit()
+
+
+def saved_as_unit_of_work(func):
+    """
+    Decorator for running a save function in a unit of work.
+
+    If the outermost unit of work fails to commit, the decorated function returns None.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if UnitOfWork.active is not None:
+            return func(*args, **kwargs)
+
+        with unit_of_work() as unit:
+            result = func(*args, **kwargs)
+        return result if unit.committed else None
+
+    return wrapper
 
 
 def save_feature(feature: QgsFeature, layer: QgsVectorLayer, id_: str | None, edit_text: str = "") -> bool:
+    _begin_edit(layer, edit_text)
+    success = layer.addFeature(feature) if id_ is None else layer.updateFeature(feature)
+    return _end_edit(layer, success)
+
+
+def delete_feature(feature: QgsFeature, layer: QgsVectorLayer, delete_text: str = "") -> bool:
+    if UnitOfWork.active is not None:
+        UnitOfWork.active.delete_later(layer, [feature.id()], delete_text)
+        return True
+    _begin_edit(layer, delete_text)
+    success = layer.deleteFeature(feature.id())
+    return _end_edit(layer, success)
+
+
+def add_features(features: list[QgsFeature], layer: QgsVectorLayer, edit_text: str = "") -> bool:
+    """Adds the features to the layer in one edit command and commit."""
+    if not features:
+        return True
+    _begin_edit(layer, edit_text)
+    success = layer.addFeatures(features)
+    return _end_edit(layer, success)
+
+
+def delete_features(features: list[QgsFeature], layer: QgsVectorLayer, delete_text: str = "") -> bool:
+    """Deletes the features from the layer in one edit command and commit."""
+    if not features:
+        return True
+    if UnitOfWork.active is not None:
+        UnitOfWork.active.delete_later(layer, [feature.id() for feature in features], delete_text)
+        return True
+    _begin_edit(layer, delete_text)
+    success = layer.deleteFeatures([feature.id() for feature in features])
+    return _end_edit(layer, success)
+
+
+def _begin_edit(layer: QgsVectorLayer, edit_text: str) -> None:
     if not layer.isEditable():
         layer.startEditing()
+    if UnitOfWork.active is not None:
+        UnitOfWork.active.register(layer)
     layer.beginEditCommand(edit_text)
 
-    if id_ is None:
-        layer.addFeature(feature)
-    else:
-        layer.updateFeature(feature)
 
+def _end_edit(layer: QgsVectorLayer, success: bool) -> bool:  # noqa: FBT001
     layer.endEditCommand()
+    if UnitOfWork.active is not None:
+        return success
     return layer.commitChanges(stopEditing=False)
 
 
-def delete_feature(feature: QgsFeature, layer: QgsVectorLayer, delete_text: str = "") -> bool:
-    if not layer.isEditable():
-        layer.startEditing()
-    layer.beginEditCommand(delete_text)
+def reconcile_associations(
+    layer_class: type[AbstractAssociationLayer],
+    owner_attribute: str,
+    target_attribute: str,
+    target_ids_by_owner_id: Mapping[str, Iterable[str]],
+    *,
+    remove_others: bool = True,
+) -> bool:
+    """
+    Makes the associations of the given owners match `target_ids_by_owner_id`.
+
+    The existing associations of the owners are fetched with one query and only the missing ones are added. If
+    `remove_others` is True, associations of the owners to targets not listed are deleted.
+    """
+    existing = layer_class.get_associations_by_pair(owner_attribute, target_attribute, target_ids_by_owner_id)
+
+    desired: dict[tuple[str, str], None] = {}  # Ordered set
+    for owner_id, target_ids in target_ids_by_owner_id.items():
+        for target_id in target_ids:
+            desired[(owner_id, target_id)] = None
+
+    to_add = [
+        layer_class.association_from(owner_attribute, owner_id, target_attribute, target_id)
+        for owner_id, target_id in desired
+        if (owner_id, target_id) not in existing
+    ]
+    to_delete = (
+        [feature for pair, features in existing.items() if pair not in desired for feature in features]
+        if remove_others
+        else []
+    )
 
-    layer.deleteFeature(feature.id())
+    layer = layer_class.get_from_project()
+    if not delete_features(to_delete, layer, "Assosiaatioiden poisto"):
+        iface.messageBar().pushCritical("", f"Assosiaatioiden poistaminen tasolta {layer_class.name} epäonnistui.")
+        return False
+    if not add_features(to_add, layer, "Assosiaatioiden lisäys"):
+        iface.messageBar().pushCritical("", f"Assosiaatioiden tallentaminen tasolle {layer_class.name} epäonnistui.")
+        return False
+    return True
+
+
+def remove_associations(
+    layer_class: type[AbstractAssociationLayer],
+    owner_attribute: str,
+    target_attribute: str,
+    owner_ids: Iterable[str],
+    target_ids: Iterable[str] | None = None,
+) -> bool:
+    """
+    Deletes the associations of the given owners to the given targets in one batch.
+
+    If `target_ids` is None, all associations of the owners are deleted.
+    """
+    existing = layer_class.get_associations_by_pair(owner_attribute, target_attribute, owner_ids)
+    targets = set(target_ids) if target_ids is not None else None
+    to_delete = [
+        feature
+        for (_, target_id), features in existing.items()
+        if targets is None or target_id in targets
+        for feature in features
+    ]
+
+    if not delete_features(to_delete, layer_class.get_from_project(), "Assosiaatioiden poisto"):
+        iface.messageBar().pushCritical("", f"Assosiaatioiden poistaminen tasolta {layer_class.name} epäonnistui.")
+        return False
+    return True
+
+
+def _changes_to_save(edited: PlanBaseModel, original: PlanBaseModel | None) -> ChangeSet | None:
+    """Returns the changes to save if the original of an edited model is given, None if the model is saved as is."""
+    if original is None or original.id_ is None:  # type: ignore[attr-defined]
+        return None
+    return diff_models(original, edited)
+
+
+def _needs_saving(model: PlanBaseModel, changes: ChangeSet | None) -> bool:
+    if changes is None:
+        return model.id_ is None or model.modified  # type: ignore[attr-defined]
+    return changes.needs_saving(model)
+
+
+def _children_to_save(models: Iterable[T], changes: ChangeSet | None) -> Iterator[tuple[T, ChangeSet | None]]:
+    """Yields the models that have something to save with the changes to save them with, None meaning all."""
+    for model in models:
+        if changes is None or changes.is_unmatched(model):
+            yield model, None
+        elif changes.affects(model):
+            yield model, changes
 
-    layer.endEditCommand()
-    return layer.commitChanges(stopEditing=False)
+
+def _delete_removed_models(changes: ChangeSet) -> None:
+    """Deletes the rows of the models removed from the edited tree with one query and one edit per layer."""
+    for layer_class, models in changes.deletes.items():
+        features = list(
+            layer_class.get_features_by_attribute_value("id", [model.id_ for model in models])  # type: ignore[attr-defined]
+        )
+        if not delete_features(features, layer_class.get_from_project(), "Kohteiden poisto"):
+            iface.messageBar().pushCritical("", f"Kohteiden poistaminen tasolta {layer_class.name} epäonnistui.")
+
+
+def _save_association_changes(changes: ChangeSet, owner: PlanBaseModel, owner_id: str) -> bool:
+    """Adds and removes the associations of the owner that differ from the original tree."""
+    for change in changes.associations_of(owner):
+        if change.removed and not remove_associations(
+            change.layer_class, change.owner_attribute, change.target_attribute, [owner_id], change.removed
+        ):
+            return False
+
+        to_add = [
+            change.layer_class.association_from(change.owner_attribute, owner_id, change.target_attribute, target_id)
+            for target_id in changes.target_ids(change.added)
+        ]
+        if not add_features(to_add, change.layer_class.get_from_project(), "Assosiaatioiden lisäys"):
+            iface.messageBar().pushCritical(
+                "", f"Assosiaatioiden tallentaminen tasolle {change.layer_class.name} epäonnistui."
+            )
+            return False
+    return True
 
 
 @use_wait_cursor
@@ -85,12 +390,24 @@ def save_plan_matter(plan_matter: PlanMatter) -> str | None:
 
 @use_wait_cursor
 @status_message("Tallennetaan kaavasuunnitelmaa ...")
-def save_plan(plan: Plan) -> str | None:
+@saved_as_unit_of_work
+def save_plan(plan: Plan, original: Plan | None = None) -> str | None:
+    """
+    Saves the plan with its general regulations and documents.
+
+    If the plan as it was loaded is given as `original`, only the differences to it are saved.
+    """
     plan_id = plan.id_
     if not plan.plan_matter_id:
         plan.plan_matter_id = get_active_plan_matter_id()
+    changes = _changes_to_save(plan, original)
+    if changes is not None:
+        if not changes:
+            return plan_id
+        _delete_removed_models(changes)
+
     editing = plan_id is not None
-    if plan_id is None or plan.modified:
+    if plan_id is None or _needs_saving(plan, changes):
         feature = PlanLayer.feature_from_model(plan)
         if not save_feature(
             feature=feature,
@@ -102,60 +419,58 @@ def save_plan(plan: Plan) -> str | None:
             return None
         plan_id = cast(str, feature["id"])
 
-    if editing:
-        # Check for deleted general regulations
-        for association in RegulationGroupAssociationLayer.get_dangling_associations(
-            plan.general_regulations, plan_id, PlanLayer.name
-        ):
-            if not delete_feature(
-                association,
-                RegulationGroupAssociationLayer.get_from_project(),
-                "Kaavamääräysryhmän assosiaation poisto",
-            ):
-                iface.messageBar().pushCritical("", "Kaavamääräysryhmän assosiaation poistaminen epäonnistui.")
-
-        # Check for deleted legal effects
-        for association in LegalEffectAssociationLayer.get_dangling_associations(plan_id, plan.legal_effect_ids):
-            if not delete_feature(
-                association, LegalEffectAssociationLayer.get_from_project(), "Oikeusvaikutuksen assosiaation poisto"
-            ):
-                iface.messageBar().pushCritical("", "Oikeusvaikutuksen assosiaation poistaminen epäonnistui.")
-
+    if editing and changes is None:
         # Check for documents to be deleted
         doc_layer = DocumentLayer.get_from_project()
         for doc_feature in DocumentLayer.get_documents_to_delete(plan.documents, plan_id):
             if not delete_feature(doc_feature, doc_layer, "Asiakirjan poisto"):
                 iface.messageBar().pushCritical("", "Asiakirjan poistaminen epäonnistui.")
 
-    # Save general regulations
-    if plan.general_regulations:
-        for regulation_group in plan.general_regulations:
-            group_id = save_regulation_group(regulation_group, plan_id)
-            if group_id is None:
-                continue  # Skip association saving if saving regulation group failed
-            save_regulation_group_association(group_id, PlanLayer.name, plan_id)
+    # Save general regulations and their associations
+    save_regulation_groups_and_associations(plan.general_regulations, PlanLayer.name, plan_id, plan_id, changes)
 
     # Save legal effect associations
-    for legal_effect_id in plan.legal_effect_ids:
-        save_legal_effect_association(plan_id, legal_effect_id)
+    if changes is None:
+        reconcile_associations(
+            LegalEffectAssociationLayer,
+            "plan_id",
+            "legal_effects_of_master_plan_id",
+            {plan_id: plan.legal_effect_ids},
+        )
+    else:
+        _save_association_changes(changes, plan, plan_id)
 
     # Save documents
-    for document in plan.documents:
+    for document, document_changes in _children_to_save(plan.documents, changes):
         document.plan_id = plan_id
-        save_document(document)
+        save_document(document, document_changes)
 
     return plan_id
 
 
 @use_wait_cursor
 @status_message("Tallennetaan kaavakohdetta ...")
-def save_plan_feature(plan_feature: PlanObject, plan_id: str | None = None) -> str | None:
+@saved_as_unit_of_work
+def save_plan_feature(
+    plan_feature: PlanObject, plan_id: str | None = None, original: PlanObject | None = None
+) -> str | None:
+    """
+    Saves the plan feature with its regulation groups.
+
+    If the plan feature as it was loaded is given as `original`, only the differences to it are saved.
+    """
     layer_class = get_plan_feature_layer_class_by_model(plan_feature)
     layer_name = cast(str, plan_feature.layer_name)
 
     feat_id = plan_feature.id_
+    changes = _changes_to_save(plan_feature, original)
+    if changes is not None:
+        if not changes:
+            return feat_id
+        _delete_removed_models(changes)
+
     editing = feat_id is not None
-    if feat_id is None or plan_feature.modified:
+    if feat_id is None or _needs_saving(plan_feature, changes):
         feature = layer_class.feature_from_model(plan_feature, plan_id)
         if not save_feature(
             feature=feature,
@@ -167,33 +482,70 @@ def save_plan_feature(plan_feature: PlanObject, plan_id: str | None = None) -> s
             return None
         feat_id = cast(str, feature["id"])
 
-    if editing:
-        # Check for deleted regulation groups
-        for association in RegulationGroupAssociationLayer.get_dangling_associations(
-            plan_feature.regulation_groups, feat_id, layer_name
-        ):
-            if not delete_feature(
-                association,
-                RegulationGroupAssociationLayer.get_from_project(),
-                "Kaavamääräysryhmän assosiaation poisto",
-            ):
-                iface.messageBar().pushCritical("", "Kaavamääräysryhmän assosiaation poistaminen epäonnistui.")
-
-    # Save regulation groups
-    for group in plan_feature.regulation_groups:
-        group_id = save_regulation_group(group)
-        if group_id is None:
-            continue  # Skip association saving if saving regulation group failed
-        save_regulation_group_association(group_id, layer_name, feat_id)
+    # Save regulation groups and their associations
+    save_regulation_groups_and_associations(plan_feature.regulation_groups, layer_name, feat_id, changes=changes)
+    if changes is not None:
+        _save_association_changes(changes, plan_feature, feat_id)
 
     return feat_id
 
 
+def save_regulation_groups_and_associations(
+    regulation_groups: list[RegulationGroup],
+    layer_name: str,
+    feature_id: str,
+    plan_id: str | None = None,
+    changes: ChangeSet | None = None,
+) -> None:
+    """
+    Saves the regulation groups and makes them the only groups associated with the feature.
+
+    If `changes` is given, only the changed groups are saved and the associations are left for the caller to save
+    with the other association changes of the feature.
+    """
+    group_ids = []
+    for group, group_changes in _children_to_save(regulation_groups, changes):
+        # Associations of groups that failed to save are kept if the group exists already
+        group_id = _save_regulation_group(group, plan_id, group_changes) or group.id_
+        if group_id is not None:
+            group_ids.append(group_id)
+            if changes is not None:
+                changes.set_saved_id(group, group_id)
+
+    if changes is None:
+        reconcile_associations(
+            RegulationGroupAssociationLayer,
+            RegulationGroupAssociationLayer.layer_name_to_attribute_map[layer_name],
+            "plan_regulation_group_id",
+            {feature_id: group_ids},
+        )
+
+
 @use_wait_cursor
-def save_regulation_group(regulation_group: RegulationGroup, plan_id: str | None = None) -> str | None:
+@saved_as_unit_of_work
+def save_regulation_group(
+    regulation_group: RegulationGroup, plan_id: str | None = None, original: RegulationGroup | None = None
+) -> str | None:
+    """
+    Saves the regulation group with its regulations and propositions.
+
+    If the group as it was loaded is given as `original`, only the differences to it are saved.
+    """
+    changes = _changes_to_save(regulation_group, original)
+    if changes is not None:
+        if not changes:
+            return regulation_group.id_
+        _delete_removed_models(changes)
+
+    return _save_regulation_group(regulation_group, plan_id, changes)
+
+
+def _save_regulation_group(
+    regulation_group: RegulationGroup, plan_id: str | None, changes: ChangeSet | None
+) -> str | None:
     group_id = regulation_group.id_
     editing = group_id is not None
-    if group_id is None or regulation_group.modified:
+    if group_id is None or _needs_saving(regulation_group, changes):
         feature = RegulationGroupLayer.feature_from_model(regulation_group, plan_id)
         if not save_feature(
             feature=feature,
@@ -205,7 +557,7 @@ def save_regulation_group(regulation_group: RegulationGroup, plan_id: str | None
             return None
         group_id = cast(str, feature["id"])
 
-    if editing:
+    if editing and changes is None:
         # Check for regulations to be deleted
         regulation_layer = PlanRegulationLayer.get_from_project()
         for reg_feature in PlanRegulationLayer.get_regulations_to_delete(regulation_group.regulations, group_id):
@@ -219,16 +571,14 @@ def save_regulation_group(regulation_group: RegulationGroup, plan_id: str | None
                 iface.messageBar().pushCritical("", "Kaavasuosituksen poistaminen epäonnistui.")
 
     # Save regulations
-    if regulation_group.regulations:
-        for regulation in regulation_group.regulations:
-            regulation.regulation_group_id = group_id  # Updating regulation group ID
-            save_regulation(regulation)
+    for regulation, regulation_changes in _children_to_save(regulation_group.regulations, changes):
+        regulation.regulation_group_id = group_id  # Updating regulation group ID
+        save_regulation(regulation, regulation_changes)
 
     # Save propositions
-    if regulation_group.propositions:
-        for proposition in regulation_group.propositions:
-            proposition.regulation_group_id = group_id  # Updating regulation group ID
-            save_proposition(proposition)
+    for proposition, proposition_changes in _children_to_save(regulation_group.propositions, changes):
+        proposition.regulation_group_id = group_id  # Updating regulation group ID
+        save_proposition(proposition, proposition_changes)
 
     return group_id
 
@@ -248,23 +598,23 @@ def delete_regulation_group(regulation_group: RegulationGroup, plan_id: str | No
     return True
 
 
-def save_regulation_group_association(regulation_group_id: str, layer_name: str, feature_id: str) -> bool:
-    if RegulationGroupAssociationLayer.association_exists(regulation_group_id, layer_name, feature_id):
-        return True
-    feature = RegulationGroupAssociationLayer.feature_from(regulation_group_id, layer_name, feature_id)
-    layer = RegulationGroupAssociationLayer.get_from_project()
-
-    if not save_feature(feature=feature, layer=layer, id_=None, edit_text="Kaavamääräysryhmän assosiaation lisäys"):
-        iface.messageBar().pushCritical("", "Kaavamääräysryhmän assosiaation tallentaminen epäonnistui.")
-        return False
-
-    return True
+def save_regulation_group_associations(
+    regulation_group_ids: list[str], layer_name: str, feature_ids: list[str]
+) -> bool:
+    """Associates each of the regulation groups with each of the features, keeping existing associations."""
+    return reconcile_associations(
+        RegulationGroupAssociationLayer,
+        RegulationGroupAssociationLayer.layer_name_to_attribute_map[layer_name],
+        "plan_regulation_group_id",
+        dict.fromkeys(feature_ids, regulation_group_ids),
+        remove_others=False,
+    )
 
 
-def save_regulation(regulation: Regulation) -> str | None:
+def save_regulation(regulation: Regulation, changes: ChangeSet | None = None) -> str | None:
     reg_id = regulation.id_
     editing = reg_id is not None
-    if reg_id is None or regulation.modified:
+    if reg_id is None or _needs_saving(regulation, changes):
         regulation_feature = PlanRegulationLayer.feature_from_model(regulation)
         if not save_feature(
             feature=regulation_feature,
@@ -276,7 +626,7 @@ def save_regulation(regulation: Regulation) -> str | None:
             return None
         reg_id = cast(str, regulation_feature["id"])
 
-    if editing:
+    if editing and changes is None:
         # Check for additional information to be deleted
         info_layer = AdditionalInformationLayer.get_from_project()
         for info_feature in AdditionalInformationLayer.get_additional_information_to_delete(
@@ -285,93 +635,31 @@ def save_regulation(regulation: Regulation) -> str | None:
             if not delete_feature(info_feature, info_layer, "Lisätiedon poisto"):
                 iface.messageBar().pushCritical("", "Liätiedon poistaminen epäonnistui.")
 
-        # Check for verbal regulation types to be deleted
-        for association in TypeOfVerbalRegulationAssociationLayer.get_dangling_associations(
-            reg_id, regulation.verbal_regulation_type_ids
-        ):
-            if not delete_feature(
-                association,
-                TypeOfVerbalRegulationAssociationLayer.get_from_project(),
-                "Sanallisen kaavamääräyksen lajin assosiaation poisto",
-            ):
-                iface.messageBar().pushCritical(
-                    "", "Sanallisen kaavamääräyksen lajin assosiaation poistaminen epäonnistui."
-                )
-
-        # Check for plan theme to be deleted
-        for association in PlanThemeAssociationLayer.get_dangling_regulation_associations(reg_id, regulation.theme_ids):
-            if not delete_feature(
-                association, PlanThemeAssociationLayer.get_from_project(), "Kaavoitusteeman assosiaation poisto"
-            ):
-                iface.messageBar().pushCritical("", "Kaavoitusteeman assosiaation poistaminen epäonnistui.")
-
-    for additional_information in regulation.additional_information:
+    for additional_information, info_changes in _children_to_save(regulation.additional_information, changes):
         additional_information.plan_regulation_id = reg_id
-        save_additional_information(additional_information)
-
-    for verbal_regulation_type_id in regulation.verbal_regulation_type_ids:
-        save_type_of_verbal_regulation_association(reg_id, verbal_regulation_type_id)
-
-    for plan_theme_id in regulation.theme_ids:
-        save_plan_theme_association(plan_theme_id=plan_theme_id, regulation_id=reg_id)
-
-    return reg_id
-
+        save_additional_information(additional_information, info_changes)
 
-def save_plan_theme_association(
-    plan_theme_id: str, regulation_id: str | None = None, proposition_id: str | None = None
-) -> bool:
-    if regulation_id is not None and PlanThemeAssociationLayer.regulation_association_exists(
-        plan_theme_id=plan_theme_id, plan_regulation_id=regulation_id
-    ):
-        return True
+    if changes is not None:
+        _save_association_changes(changes, regulation, reg_id)
+        return reg_id
 
-    if proposition_id is not None and PlanThemeAssociationLayer.proposition_association_exists(
-        plan_theme_id=plan_theme_id, plan_proposition_id=proposition_id
-    ):
-        return True
-    feature = PlanThemeAssociationLayer.feature_from(
-        plan_theme_id=plan_theme_id, plan_regulation_id=regulation_id, plan_proposition_id=proposition_id
+    reconcile_associations(
+        TypeOfVerbalRegulationAssociationLayer,
+        "plan_regulation_id",
+        "type_of_verbal_plan_regulation_id",
+        {reg_id: regulation.verbal_regulation_type_ids},
+    )
+    reconcile_associations(
+        PlanThemeAssociationLayer, "plan_regulation_id", "plan_theme_id", {reg_id: regulation.theme_ids}
     )
-    layer = PlanThemeAssociationLayer.get_from_project()
-
-    if not save_feature(feature=feature, layer=layer, id_=None, edit_text="Kaavoitusteeman assosiaation lisäys"):
-        iface.messageBar().pushCritical("", "Kaavoitusteeman assosiaation tallentaminen epäonnistui.")
-        return False
-
-    return True
-
-
-def save_type_of_verbal_regulation_association(regulation_id: str, verbal_regulation_type_id: str) -> bool:
-    if TypeOfVerbalRegulationAssociationLayer.association_exists(regulation_id, verbal_regulation_type_id):
-        return True
-    feature = TypeOfVerbalRegulationAssociationLayer.feature_from(regulation_id, verbal_regulation_type_id)
-    layer = TypeOfVerbalRegulationAssociationLayer.get_from_project()
-
-    if not save_feature(
-        feature=feature, layer=layer, id_=None, edit_text="Sanallisen kaavamääräyksen lajin assosiaation lisäys"
-    ):
-        iface.messageBar().pushCritical("", "Sanallisen kaavamääräyksen lajin assosiaation tallentaminen epäonnistui.")
-        return False
-
-    return True
-
-
-def save_legal_effect_association(plan_id: str, legal_effect_id: str) -> bool:
-    if LegalEffectAssociationLayer.association_exists(plan_id, legal_effect_id):
-        return True
-    feature = LegalEffectAssociationLayer.feature_from(plan_id, legal_effect_id)
-    layer = LegalEffectAssociationLayer.get_from_project()
-
-    if not save_feature(feature=feature, layer=layer, id_=None, edit_text="Oikeusvaikutuksen assosiaation lisäys"):
-        iface.messageBar().pushCritical("", "Oikeusvaikutuksen assosiaation tallentaminen epäonnistui.")
-        return False
 
-    return True
+    return reg_id
 
 
-def save_additional_information(additional_information: AdditionalInformation) -> str | None:
-    if additional_information.id_ is not None and not additional_information.modified:
+def save_additional_information(
+    additional_information: AdditionalInformation, changes: ChangeSet | None = None
+) -> str | None:
+    if not _needs_saving(additional_information, changes):
         return additional_information.id_
 
     feature = AdditionalInformationLayer.feature_from_model(additional_information)
@@ -409,37 +697,32 @@ def delete_regulation(regulation: Regulation) -> bool:
     return True
 
 
-def save_proposition(proposition: Proposition) -> str | None:
+def save_proposition(proposition: Proposition, changes: ChangeSet | None = None) -> str | None:
     prop_id = proposition.id_
-    editing = prop_id is not None
-    if proposition.id_ is not None and not proposition.modified:
+    if changes is None and proposition.id_ is not None and not proposition.modified:
         return proposition.id_
 
-    feature = PlanPropositionLayer.feature_from_model(proposition)
-    if not save_feature(
-        feature=feature,
-        layer=PlanPropositionLayer.get_from_project(),
-        id_=prop_id,
-        edit_text="Kaavasuosituksen lisäys" if prop_id is None else "Kaavasuosituksen muokkaus",
-    ):
-        iface.messageBar().pushCritical("", "Kaavasuosituksen tallentaminen epäonnistui.")
-        return None
-    prop_id = cast(str, feature["id"])
-
-    if editing:
-        # Check for plan theme to be deleted
-        for association in PlanThemeAssociationLayer.get_dangling_proposition_associations(
-            prop_id, proposition.theme_ids
+    if prop_id is None or _needs_saving(proposition, changes):
+        feature = PlanPropositionLayer.feature_from_model(proposition)
+        if not save_feature(
+            feature=feature,
+            layer=PlanPropositionLayer.get_from_project(),
+            id_=prop_id,
+            edit_text="Kaavasuosituksen lisäys" if prop_id is None else "Kaavasuosituksen muokkaus",
         ):
-            if not delete_feature(
-                association, PlanThemeAssociationLayer.get_from_project(), "Kaavoitusteeman assosiaation poisto"
-            ):
-                iface.messageBar().pushCritical("", "Kaavoitusteeman assosiaation poistaminen epäonnistui.")
+            iface.messageBar().pushCritical("", "Kaavasuosituksen tallentaminen epäonnistui.")
+            return None
+        prop_id = cast(str, feature["id"])
 
-    for plan_theme_id in proposition.theme_ids:
-        save_plan_theme_association(plan_theme_id=plan_theme_id, proposition_id=prop_id)
+    if changes is not None:
+        _save_association_changes(changes, proposition, prop_id)
+        return prop_id
 
-    return feature["id"]
+    reconcile_associations(
+        PlanThemeAssociationLayer, "plan_proposition_id", "plan_theme_id", {prop_id: proposition.theme_ids}
+    )
+
+    return prop_id
 
 
 def delete_proposition(proposition: Proposition) -> bool:
@@ -453,8 +736,8 @@ def delete_proposition(proposition: Proposition) -> bool:
     return True
 
 
-def save_document(document: Document) -> str | None:
-    if document.id_ is not None and not document.modified:
+def save_document(document: Document, changes: ChangeSet | None = None) -> str | None:
+    if not _needs_saving(document, changes):
         return document.id_
 
     feature = DocumentLayer.feature_from_model(document)
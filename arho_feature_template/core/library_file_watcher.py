@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+from typing import Iterable, Tuple, Union
+
+from qgis.PyQt.QtCore import QFileSystemWatcher, QObject, pyqtSignal
+
+from arho_feature_template.utils.signal_utils import SignalDebouncer
+
+# Delay for collecting the change notifications of a single save, editors and network drives often send several
+REPORT_DELAY_MS = 1000
+
+FileState = Union[Tuple[int, int], None]
+
+
+class LibraryFileWatcher(QObject):
+    """
+    Watches the files of user libraries and reports the files that have been changed by someone else.
+
+    The modification time and size of each file are recorded when the file is read or written by the plugin
+    (see `watch` and `mark_current`), so that notifications caused by the plugin itself can be ignored.
+    """
+
+    library_files_changed = pyqtSignal(list)
+
+    def __init__(self, parent: QObject | None = None):
+        super().__init__(parent)
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+
+        self._debouncer = SignalDebouncer(delay_ms=REPORT_DELAY_MS, parent=self)
+        self._debouncer.triggered.connect(self._report_changes)
+
+        self._file_states: dict[str, FileState] = {}
+        self._changed_paths: set[str] = set()
+        self._paused = False
+
+    def watch(self, file_paths: Iterable[str]):
+        """Sets the watched files. The current state is recorded for files that were not watched before."""
+        file_paths = set(file_paths)
+        for file_path in set(self._file_states) - file_paths:
+            self._watcher.removePath(file_path)
+            del self._file_states[file_path]
+            self._changed_paths.discard(file_path)
+
+        for file_path in file_paths - set(self._file_states):
+            self._file_states[file_path] = _file_state(file_path)
+            if os.path.exists(file_path):
+                self._watcher.addPath(file_path)
+
+    def mark_current(self, file_path: str):
+        """Records the current state of the file, for example after the plugin has written it."""
+        if file_path in self._file_states:
+            self._file_states[file_path] = _file_state(file_path)
+            self._ensure_watched(file_path)
+
+    def pause(self):
+        """Stops reporting changes until `resume` is called, changes are still collected."""
+        self._paused = True
+
+    def resume(self):
+        """Reports the files changed since they were last read or written, including those changed while paused."""
+        self._paused = False
+        self._changed_paths.update(self._file_states)
+        self._report_changes()
+
+    def clear(self):
+        self._debouncer.cancel()
+        self.watch([])
+
+    def _on_file_changed(self, file_path: str):
+        if file_path not in self._file_states:
+            return
+        self._changed_paths.add(file_path)
+        self._debouncer.restart_timer()
+
+    def _report_changes(self):
+        if self._paused:
+            return
+
+        changed_paths = []
+        for file_path in self._changed_paths:
+            # Files replaced by renaming are dropped by the watcher
+            self._ensure_watched(file_path)
+
+            state = _file_state(file_path)
+            # Missing files are not reported, the file may be in the middle of being replaced
+            if state is None or state == self._file_states[file_path]:
+                continue
+            self._file_states[file_path] = state
+            changed_paths.append(file_path)
+        self._changed_paths = set()
+
+        if changed_paths:
+            self.library_files_changed.emit(changed_paths)
+
+    def _ensure_watched(self, file_path: str):
+        if file_path not in self._watcher.files() and os.path.exists(file_path):
+            self._watcher.addPath(file_path)
+
+
+def _file_state(file_path: str) -> FileState:
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
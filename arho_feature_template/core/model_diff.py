@@ -0,0 +1,315 @@
+"""
+Structural diff of plan model trees.
+
+`diff_models` compares a model tree as it was loaded from the database with the edited copy of it and returns the
+smallest set of changes that saving the edited tree requires: the rows to insert, update and delete per layer and
+the associations to add and remove. Child models are matched by `id_`.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Union, cast
+
+from arho_feature_template.core.models import (
+    AdditionalInformation,
+    Document,
+    Plan,
+    PlanBaseModel,
+    PlanObject,
+    Proposition,
+    Regulation,
+    RegulationGroup,
+)
+from arho_feature_template.project.layers.plan_layers import (
+    AdditionalInformationLayer,
+    DocumentLayer,
+    LegalEffectAssociationLayer,
+    PlanLayer,
+    PlanPropositionLayer,
+    PlanRegulationLayer,
+    PlanThemeAssociationLayer,
+    RegulationGroupAssociationLayer,
+    RegulationGroupLayer,
+    TypeOfVerbalRegulationAssociationLayer,
+    get_plan_feature_layer_class_by_model,
+)
+
+if TYPE_CHECKING:
+    from arho_feature_template.project.layers import AbstractLayer
+    from arho_feature_template.project.layers.plan_layers import AbstractAssociationLayer
+
+# Target of an association, either an ID or a model that is saved separately
+AssociationTarget = Union[str, PlanBaseModel]
+
+
+class _ChildField(NamedTuple):
+    """Field holding child models that are saved to rows referring to the parent with `parent_attribute`."""
+
+    name: str
+    parent_attribute: str
+
+
+class _AssociationField(NamedTuple):
+    """Field holding the targets of the associations of the model, as IDs or as models saved separately."""
+
+    name: str
+    layer_class: type[AbstractAssociationLayer]
+    owner_attribute: str | None  # None if the attribute depends on the layer of the plan feature
+    target_attribute: str
+    holds_models: bool = False
+
+    def owner_attribute_of(self, model: PlanBaseModel) -> str:
+        if self.owner_attribute is not None:
+            return self.owner_attribute
+        return RegulationGroupAssociationLayer.layer_name_to_attribute_map[cast(PlanObject, model).layer_name or ""]
+
+
+@dataclass
+class AssociationChange:
+    layer_class: type[AbstractAssociationLayer]
+    owner_attribute: str
+    target_attribute: str
+    added: list[AssociationTarget] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ChangeSet:
+    """
+    Changes between an original and an edited model tree.
+
+    Models are tracked by identity, so the change set is valid only as long as the edited tree is not modified.
+    Models of the edited tree that exist in the database but are not part of the original tree (for example
+    regulation groups added from a library) can not be compared and are saved as they are, see `is_unmatched`.
+    """
+
+    inserts: defaultdict[type[AbstractLayer], list[PlanBaseModel]] = field(default_factory=lambda: defaultdict(list))
+    updates: defaultdict[type[AbstractLayer], list[PlanBaseModel]] = field(default_factory=lambda: defaultdict(list))
+    deletes: defaultdict[type[AbstractLayer], list[PlanBaseModel]] = field(default_factory=lambda: defaultdict(list))
+    associations: dict[int, list[AssociationChange]] = field(default_factory=dict)  # By `id` of the owner model
+
+    _row_changes: set[int] = field(default_factory=set, repr=False)
+    _affected: set[int] = field(default_factory=set, repr=False)
+    _unmatched: set[int] = field(default_factory=set, repr=False)
+    _saved_ids: dict[int, str] = field(default_factory=dict, repr=False)
+
+    def __bool__(self) -> bool:
+        return bool(self._affected)
+
+    def needs_saving(self, model: PlanBaseModel) -> bool:
+        """Returns True if the row of the model is inserted or updated."""
+        return id(model) in self._row_changes
+
+    def affects(self, model: PlanBaseModel) -> bool:
+        """Returns True if the model or any model below it has changes."""
+        return id(model) in self._affected
+
+    def is_unmatched(self, model: PlanBaseModel) -> bool:
+        return id(model) in self._unmatched
+
+    def associations_of(self, model: PlanBaseModel) -> list[AssociationChange]:
+        return self.associations.get(id(model), [])
+
+    def set_saved_id(self, model: PlanBaseModel, id_: str) -> None:
+        """Records the ID a model got when it was inserted, for resolving the associations targeting it."""
+        self._saved_ids[id(model)] = id_
+
+    def target_ids(self, targets: Iterable[AssociationTarget]) -> list[str]:
+        """Returns the IDs of the targets, skipping the models that did not get an ID."""
+        target_ids = []
+        for target in targets:
+            target_id = target if isinstance(target, str) else self._saved_ids.get(id(target), _id_of(target))
+            if target_id is not None:
+                target_ids.append(target_id)
+        return target_ids
+
+    def _diff_model(self, original: PlanBaseModel, edited: PlanBaseModel, ignored_fields: tuple[str, ...]) -> bool:
+        affected = False
+        row_field_names = _row_field_names(type(edited))
+        if any(
+            getattr(original, name) != getattr(edited, name) for name in row_field_names if name not in ignored_fields
+        ):
+            self.updates[_layer_class_of(edited)].append(edited)
+            self._row_changes.add(id(edited))
+            affected = True
+
+        for association in _ASSOCIATION_FIELDS.get(type(edited), ()):
+            original_targets = getattr(original, association.name)
+            edited_targets = getattr(edited, association.name)
+            if association.holds_models:
+                original_by_id = {_id_of(target): target for target in original_targets if _id_of(target) is not None}
+                added = []
+                for target in edited_targets:
+                    matched = original_by_id.get(_id_of(target))
+                    if matched is not None:
+                        affected |= self._diff_model(matched, target, ())
+                    else:
+                        self._add_new_model(target)
+                        added.append(target)
+                original_ids = cast("list[str]", list(original_by_id))
+                edited_ids = {_id_of(target) for target in edited_targets}
+            else:
+                original_ids = list(dict.fromkeys(original_targets))
+                added = [target_id for target_id in dict.fromkeys(edited_targets) if target_id not in original_ids]
+                edited_ids = set(edited_targets)
+
+            removed = [target_id for target_id in original_ids if target_id not in edited_ids]
+            if added or removed:
+                self._add_association_change(edited, association, added, removed)
+                affected = True
+
+        for child_field in _CHILD_FIELDS.get(type(edited), ()):
+            original_by_id = {
+                _id_of(child): child for child in getattr(original, child_field.name) if _id_of(child) is not None
+            }
+            kept_ids = set()
+            for child in getattr(edited, child_field.name):
+                matched = original_by_id.get(_id_of(child))
+                if matched is not None:
+                    kept_ids.add(_id_of(child))
+                    affected |= self._diff_model(matched, child, (child_field.parent_attribute,))
+                else:
+                    self._add_new_model(child)
+                    affected = True
+
+            for child_id, child in original_by_id.items():
+                if child_id not in kept_ids:
+                    self.deletes[_layer_class_of(child)].append(child)
+                    affected = True
+
+        if affected:
+            self._affected.add(id(edited))
+        return affected
+
+    def _add_new_model(self, model: PlanBaseModel) -> None:
+        """Records a model that is not part of the original tree together with the models below it."""
+        self._affected.add(id(model))
+        if _id_of(model) is not None:
+            self._unmatched.add(id(model))
+            return
+
+        self.inserts[_layer_class_of(model)].append(model)
+        self._row_changes.add(id(model))
+
+        for association in _ASSOCIATION_FIELDS.get(type(model), ()):
+            targets = getattr(model, association.name)
+            if association.holds_models:
+                for target in targets:
+                    self._add_new_model(target)
+            else:
+                targets = list(dict.fromkeys(targets))
+            if targets:
+                self._add_association_change(model, association, targets, [])
+
+        for child_field in _CHILD_FIELDS.get(type(model), ()):
+            for child in getattr(model, child_field.name):
+                self._add_new_model(child)
+
+    def _add_association_change(
+        self,
+        owner: PlanBaseModel,
+        association: _AssociationField,
+        added: list[AssociationTarget],
+        removed: list[str],
+    ) -> None:
+        self.associations.setdefault(id(owner), []).append(
+            AssociationChange(
+                association.layer_class,
+                association.owner_attribute_of(owner),
+                association.target_attribute,
+                added,
+                removed,
+            )
+        )
+
+
+def diff_models(original: PlanBaseModel, edited: PlanBaseModel) -> ChangeSet:
+    """Returns the changes that make the database match the edited tree instead of the original tree."""
+    if _id_of(original) is None or _id_of(original) != _id_of(edited):
+        msg = "Only a model loaded from the database can be compared with its edited copy"
+        raise ValueError(msg)
+
+    changes = ChangeSet()
+    changes._diff_model(original, edited, ())  # noqa: SLF001
+    return changes
+
+
+def _id_of(model: PlanBaseModel) -> str | None:
+    # All the models saved to plan layers have 'id_'
+    return getattr(model, "id_", None)
+
+
+def _row_field_names(model_class: type[PlanBaseModel]) -> tuple[str, ...]:
+    """Returns the compared fields of the model that are saved to the row of the model itself."""
+    field_names = _ROW_FIELD_NAMES.get(model_class)
+    if field_names is None:
+        saved_elsewhere = {
+            *(child_field.name for child_field in _CHILD_FIELDS.get(model_class, ())),
+            *(association.name for association in _ASSOCIATION_FIELDS.get(model_class, ())),
+        }
+        field_names = tuple(
+            _field.name
+            for _field in fields(model_class)  # type: ignore[arg-type]
+            if _field.compare and _field.name not in saved_elsewhere
+        )
+        _ROW_FIELD_NAMES[model_class] = field_names
+    return field_names
+
+
+def _layer_class_of(model: PlanBaseModel) -> type[AbstractLayer]:
+    if isinstance(model, PlanObject):
+        return get_plan_feature_layer_class_by_model(model)
+    return _LAYER_CLASSES[type(model)]
+
+
+_ROW_FIELD_NAMES: dict[type[PlanBaseModel], tuple[str, ...]] = {}
+
+_LAYER_CLASSES: dict[type[PlanBaseModel], type[AbstractLayer]] = {
+    Plan: PlanLayer,
+    RegulationGroup: RegulationGroupLayer,
+    Regulation: PlanRegulationLayer,
+    Proposition: PlanPropositionLayer,
+    AdditionalInformation: AdditionalInformationLayer,
+    Document: DocumentLayer,
+}
+
+_CHILD_FIELDS: dict[type[PlanBaseModel], tuple[_ChildField, ...]] = {
+    Plan: (_ChildField("documents", "plan_id"),),
+    RegulationGroup: (
+        _ChildField("regulations", "regulation_group_id"),
+        _ChildField("propositions", "regulation_group_id"),
+    ),
+    Regulation: (_ChildField("additional_information", "plan_regulation_id"),),
+}
+
+_ASSOCIATION_FIELDS: dict[type[PlanBaseModel], tuple[_AssociationField, ...]] = {
+    Plan: (
+        _AssociationField(
+            "general_regulations",
+            RegulationGroupAssociationLayer,
+            "plan_id",
+            "plan_regulation_group_id",
+            holds_models=True,
+        ),
+        _AssociationField(
+            "legal_effect_ids", LegalEffectAssociationLayer, "plan_id", "legal_effects_of_master_plan_id"
+        ),
+    ),
+    PlanObject: (
+        _AssociationField(
+            "regulation_groups", RegulationGroupAssociationLayer, None, "plan_regulation_group_id", holds_models=True
+        ),
+    ),
+    Regulation: (
+        _AssociationField(
+            "verbal_regulation_type_ids",
+            TypeOfVerbalRegulationAssociationLayer,
+            "plan_regulation_id",
+            "type_of_verbal_plan_regulation_id",
+        ),
+        _AssociationField("theme_ids", PlanThemeAssociationLayer, "plan_regulation_id", "plan_theme_id"),
+    ),
+    Proposition: (_AssociationField("theme_ids", PlanThemeAssociationLayer, "plan_proposition_id", "plan_theme_id"),),
+}
@@ -2,10 +2,11 @@ from __future__ import annotations
 
 import enum
 import logging
+import weakref
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from dataclasses import dataclass, field, fields
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, Any, ClassVar, Iterable, SupportsIndex, TypeVar, cast
 
 from arho_feature_template.project.layers.code_layers import (
     AdditionalInformationTypeLayer,
@@ -23,6 +24,8 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class AttributeValueDataType(str, enum.Enum):
     LOCALIZED_TEXT = "LocalizedText"
@@ -47,6 +50,15 @@ class TemplateSyntaxError(Exception):
         super().__init__(f"Invalid template syntax for {template_cls}: {message}")
 
 
+def _freeze(value: Any) -> Any:
+    """Converts the dicts and lists of a template dict into tuples so that the template dict can be hashed."""
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
 @dataclass
 class Library(ABC):
     """Describes a (template) library."""
@@ -62,6 +74,8 @@ class Library(ABC):
     description: str | None = None
     status: bool = True
     library_type: Library.LibraryType = LibraryType.CUSTOM
+    # Hash of the template dict when the library was last known to match its file, None for unsaved libraries
+    saved_hash: int | None = field(default=None, compare=False, repr=False)
 
     @classmethod
     @abstractmethod
@@ -72,6 +86,17 @@ class Library(ABC):
     def into_template_dict(self) -> dict:
         pass
 
+    def data_hash(self) -> int:
+        return hash(_freeze(self.into_template_dict()))
+
+    def mark_saved(self):
+        """Marks the current contents of the library as the contents of its file."""
+        self.saved_hash = self.data_hash()
+
+    def is_dirty(self) -> bool:
+        """Returns whether the library has changes that have not been written into its file."""
+        return self.saved_hash is None or self.data_hash() != self.saved_hash
+
 
 @dataclass
 class PlanFeatureLibrary(Library):
@@ -115,9 +140,18 @@ class PlanFeatureLibrary(Library):
 
 @dataclass
 class RegulationGroupLibrary(Library):
-    """A collection of plan regulation groups."""
+    """
+    A collection of plan regulation groups.
 
-    regulation_groups: list[RegulationGroup] = field(default_factory=list, compare=False)
+    Libraries read from template files keep the template dicts of their regulation groups in
+    `regulation_group_data` and convert them into models in `load_regulation_groups`, which reading
+    `regulation_groups` calls the first time. If the conversion fails, the error is logged and the library is marked
+    as failed with `status` False and no regulation groups.
+    """
+
+    # Template dicts of the regulation groups, until they are converted into models
+    regulation_group_data: list[dict] | None = field(default=None, compare=False, repr=False)
+    _regulation_groups: list[RegulationGroup] = field(default_factory=list, init=False, compare=False, repr=False)
 
     @classmethod
     def from_template_dict(
@@ -126,22 +160,51 @@ class RegulationGroupLibrary(Library):
         """Returns whether initialization from data was succesfull and the created RegulationGroupLibrary."""
         if data == {}:
             return RegulationGroupLibrary(library_type=library_type, file_path=file_path, status=False)
+        return RegulationGroupLibrary(
+            name=data.get("name", ""),
+            file_path=file_path,
+            version=data.get("version"),
+            description=data.get("description"),
+            library_type=library_type,
+            status=True,
+            regulation_group_data=data.get("plan_regulation_groups") or [],
+        )
+
+    @property
+    def regulation_groups(self) -> list[RegulationGroup]:
+        self.load_regulation_groups()
+        return self._regulation_groups
+
+    @regulation_groups.setter
+    def regulation_groups(self, regulation_groups: list[RegulationGroup]):
+        self._regulation_groups = regulation_groups
+        self.regulation_group_data = None
+
+    @property
+    def group_count(self) -> int:
+        """Number of regulation groups in the library, without converting them into models."""
+        if self.regulation_group_data is not None:
+            return len(self.regulation_group_data)
+        return len(self._regulation_groups)
+
+    def load_regulation_groups(self) -> bool:
+        """Converts the regulation groups into models if not done yet. Returns False if the conversion failed."""
+        if self.regulation_group_data is None:
+            return self.status
+        # The models may produce slightly different template dicts than the ones they were read from
+        is_saved = self.saved_hash is not None and not self.is_dirty()
         try:
-            return RegulationGroupLibrary(
-                name=data.get("name", ""),
-                file_path=file_path,
-                version=data.get("version"),
-                description=data.get("description"),
-                library_type=library_type,
-                status=True,
-                regulation_groups=[
-                    RegulationGroup.from_template_dict(group_data) for group_data in data["plan_regulation_groups"]
-                ]
-                if data.get("plan_regulation_groups")
-                else [],
-            )
-        except KeyError as e:
-            raise TemplateSyntaxError(str(cls), str(e)) from e
+            self._regulation_groups = [
+                RegulationGroup.from_template_dict(group_data) for group_data in self.regulation_group_data
+            ]
+        except (KeyError, TypeError, TemplateSyntaxError):
+            logger.exception("Failed to read the regulation groups of library %s", self.file_path or self.name)
+            self._regulation_groups = []
+            self.status = False
+        self.regulation_group_data = None
+        if is_saved and self.status:
+            self.mark_saved()
+        return self.status
 
     def into_template_dict(self) -> dict:
         return {
@@ -149,7 +212,10 @@ class RegulationGroupLibrary(Library):
             "file_path": self.file_path,
             "version": self.version,
             "description": self.description,
-            "plan_regulation_groups": [group.into_template_dict() for group in self.regulation_groups],
+            # Regulation groups that have not been converted into models are unchanged
+            "plan_regulation_groups": self.regulation_group_data
+            if self.regulation_group_data is not None
+            else [group.into_template_dict() for group in self.regulation_groups],
         }
 
     def into_hash_map(self) -> defaultdict[int, list]:
@@ -163,39 +229,230 @@ class RegulationGroupLibrary(Library):
         return {group.letter_code for group in self.regulation_groups if group.letter_code}
 
 
+class _ModelList(list):
+    """
+    List valued model field that invalidates the cached data hash of its owner model when mutated.
+
+    The owner is linked when it computes its data hash, since the mutations of the list do not matter before that.
+    """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, iterable: Iterable = ()):
+        super().__init__(iterable)
+        self._owner: weakref.ref[PlanBaseModel] | None = None
+
+    def _link(self, owner: PlanBaseModel):
+        if self._owner is None:
+            self._owner = weakref.ref(owner)
+
+    def _changed(self, _added_items: Iterable = ()):
+        owner = self._owner() if self._owner is not None else None
+        if owner is not None:
+            owner._invalidate_data_hash()  # noqa: SLF001
+
+    def append(self, item):
+        super().append(item)
+        self._changed((item,))
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._changed(items)
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._changed((item,))
+
+    def remove(self, item):
+        super().remove(item)
+        self._changed()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            super().__setitem__(index, value)
+            self._changed(value)
+        else:
+            super().__setitem__(index, value)
+            self._changed((value,))
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, items: Iterable) -> _ModelList:  # type: ignore[misc]  # noqa: PYI034
+        self.extend(items)
+        return self
+
+    def __imul__(self, n: SupportsIndex) -> _ModelList:  # type: ignore[misc]  # noqa: PYI034
+        super().__imul__(n)
+        self._changed()
+        return self
+
+    def __reduce_ex__(self, protocol):
+        # Copies are plain lists, the model they are assigned to wraps them again
+        return list, (list(self),)
+
+
+def _add_slots(cls: type[T]) -> type[T]:
+    """
+    Returns a copy of the dataclass that stores its fields in `__slots__` instead of an instance `__dict__`.
+
+    Backport of `dataclass(slots=True)` of Python 3.10. Methods of slotted models can not use `super()` without
+    arguments, since the class it refers to is replaced by the copy.
+    """
+    cls_dict = dict(cls.__dict__)
+    cls_fields = fields(cls)  # type: ignore[arg-type]
+    field_names = tuple(_field.name for _field in cls_fields)
+    cls_dict["__slots__"] = field_names
+    # Field metadata for `PlanBaseModel`, so that instances do not need to call `fields`
+    cls_dict["_field_names"] = field_names
+    cls_dict["_hashed_field_names"] = tuple(
+        # Hash fields unless they are marked with compare=False and don't have hash=True in metadata
+        _field.name
+        for _field in cls_fields
+        if _field.compare or _field.metadata.get("hash", False)
+    )
+    # Class attributes holding default values would conflict with the slots
+    for field_name in field_names:
+        cls_dict.pop(field_name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+
+    slotted_cls = cast("type[T]", type(cls.__name__, cls.__bases__, cls_dict))
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
+
+# Types of attribute values that can never be NULL, checked first to skip comparisons with NULL
+_NEVER_NULL_TYPES = frozenset((str, int, float, bool, _ModelList))
+
+
+def _is_null(value: Any) -> bool:
+    return value is not None and type(value) not in _NEVER_NULL_TYPES and null_to_none(value) is None
+
+
 @dataclass
 class PlanBaseModel:
+    """
+    Base class for plan data models.
+
+    Subclasses are slotted with `_add_slots` to keep large plan graphs compact in memory.
+
+    `data_hash` is cached. The cache is invalidated when a field of the model is assigned or a list field is
+    mutated, and the invalidation is propagated to the models the model is a child of. To make this work, a list
+    assigned to a field is stored as a copy that tracks its mutations: after `model.x = items`, mutate the list
+    through `model.x`, since mutating `items` no longer changes the model. Assigning the list of the model itself
+    back to it does not copy it again.
+    """
+
+    __slots__ = ("__weakref__", "_cached_data_hash", "_parents")
+    if TYPE_CHECKING:
+        # Instance slots, declared as ClassVars so that type checkers do not take them for dataclass fields
+        _cached_data_hash: ClassVar[int | None]
+        _parents: ClassVar[tuple[weakref.ref[PlanBaseModel], ...]]
+
+    # Set by `_add_slots`
+    _field_names: ClassVar[tuple[str, ...]] = ()
+    _hashed_field_names: ClassVar[tuple[str, ...]] = ()
+
+    def __new__(cls, *_args, **_kwargs):
+        # Initialize the internal slots here, so that reading them never has to handle unset slots
+        instance = super().__new__(cls)
+        object.__setattr__(instance, "_cached_data_hash", None)
+        object.__setattr__(instance, "_parents", ())
+        return instance
+
     def __post_init__(self):
         # Set all found NULLs to None
-        for _field in fields(self):
-            value = getattr(self, _field.name)
-            setattr(self, _field.name, null_to_none(value))
+        for name in self._field_names:
+            if _is_null(getattr(self, name)):
+                setattr(self, name, None)
+
+    def __setattr__(self, name: str, value: Any):
+        if isinstance(value, list) and not (isinstance(value, _ModelList) and value is getattr(self, name, None)):
+            value = _ModelList(value)
+        object.__setattr__(self, name, value)
+        if self._cached_data_hash is not None:
+            self._invalidate_data_hash()
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self._field_names}
+
+    def __setstate__(self, state: dict):
+        # Assign through __setattr__ to wrap list values
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _add_parent(self, parent: PlanBaseModel):
+        # Called when the parent computes its data hash, models that are never hashed do not track their parents
+        # A tuple, since most models have a single parent. Weak references to the same model are shared by CPython.
+        if not any(parent_ref() is parent for parent_ref in self._parents):
+            object.__setattr__(self, "_parents", (*self._parents, weakref.ref(parent)))
+
+    def _invalidate_data_hash(self):
+        # Parents can only have a cached hash if this model has one, so the propagation can stop here
+        if self._cached_data_hash is None:
+            return
+        object.__setattr__(self, "_cached_data_hash", None)
+        for parent_ref in self._parents:
+            parent = parent_ref()
+            if parent is not None:
+                parent._invalidate_data_hash()  # noqa: SLF001
 
     def data_hash(self) -> int:
-        hash_components = []
-        for _field in fields(self):
-            # Hash fields unless they are marked with compare=False and don't have hash=True in metadata
-            if not _field.compare and not _field.metadata.get("hash", False):
-                continue
+        cached_hash = self._cached_data_hash
+        if cached_hash is None:
+            cached_hash = self._compute_data_hash()
+            object.__setattr__(self, "_cached_data_hash", cached_hash)
+        return cached_hash
 
-            value = getattr(self, _field.name)
+    def _compute_data_hash(self) -> int:
+        hash_components = []
+        for name in self._hashed_field_names:
+            value = getattr(self, name)
             # Convert lists into frozensets, consider if list has PlanBaseModels
             if isinstance(value, list):
+                if isinstance(value, _ModelList):
+                    value._link(self)  # noqa: SLF001
                 if len(value) > 0 and isinstance(value[0], PlanBaseModel):
                     # value = tuple(sorted(element.data_hash() for element in value))
-                    value = frozenset(element.data_hash() for element in value)
+                    value = frozenset(self._child_data_hash(element) for element in value)
                 else:
                     # value = tuple(sorted(element for element in value))
                     value = frozenset(value)
             # Call data_hash recursively
             elif isinstance(value, PlanBaseModel):
-                value = value.data_hash()
+                value = self._child_data_hash(value)
 
             hash_components.append(value)
 
         return hash(tuple(hash_components))
 
+    def _child_data_hash(self, child: PlanBaseModel) -> int:
+        child._add_parent(self)  # noqa: SLF001
+        return child.data_hash()
+
 
+@_add_slots
 @dataclass
 class AttributeValue(PlanBaseModel):
     value_data_type: AttributeValueDataType | None = None
@@ -216,13 +473,14 @@ class AttributeValue(PlanBaseModel):
     height_reference_point: str | None = None
 
     def __post_init__(self):
-        super().__post_init__()
+        # Convert NULLs, empty strings and such to None, otherwise hash comparisons fail
+        for name in self._field_names:
+            value = getattr(self, name)
+            if value is not None and (not value or _is_null(value)):
+                setattr(self, name, None)
 
-        for _field in fields(self):
-            value = getattr(self, _field.name)
-            # Convert empty strings and such to None, otherwise hash comparisons fail
-            if not value:
-                setattr(self, _field.name, None)
+    def is_empty(self) -> bool:
+        return all(getattr(self, name) is None for name in self._field_names)
 
     @staticmethod
     def from_template_dict(data: dict, default_value: AttributeValue | None = None) -> AttributeValue:
@@ -263,6 +521,7 @@ class AttributeValue(PlanBaseModel):
         }
 
 
+@_add_slots
 @dataclass
 class AdditionalInformation(PlanBaseModel):
     additional_information_type_id: str
@@ -272,10 +531,10 @@ class AdditionalInformation(PlanBaseModel):
     id_: str | None = field(compare=False, default=None)
 
     def __post_init__(self):
-        super().__post_init__()
+        PlanBaseModel.__post_init__(self)
 
         # Replace empty AttributeValue with None to stay consistent for hashing
-        if self.value == AttributeValue():
+        if self.value is not None and self.value.is_empty():
             self.value = None
 
     @staticmethod
@@ -292,6 +551,7 @@ class AdditionalInformation(PlanBaseModel):
         }
 
 
+@_add_slots
 @dataclass
 class Regulation(PlanBaseModel):
     regulation_type_id: str
@@ -358,6 +618,7 @@ class Regulation(PlanBaseModel):
         }
 
 
+@_add_slots
 @dataclass
 class Proposition(PlanBaseModel):
     value: str | None
@@ -375,6 +636,7 @@ class Proposition(PlanBaseModel):
         }
 
 
+@_add_slots
 @dataclass
 class RegulationGroup(PlanBaseModel):
     type_code_id: str | None = None
@@ -430,6 +692,7 @@ class RegulationGroup(PlanBaseModel):
         )
 
 
+@_add_slots
 @dataclass
 class PlanObject(PlanBaseModel):
     geom: QgsGeometry | None = None  # Need to allow None for feature templates
@@ -485,6 +748,7 @@ class PlanObject(PlanBaseModel):
         )
 
 
+@_add_slots
 @dataclass
 class Plan(PlanBaseModel):
     name: str | None = None
@@ -500,6 +764,7 @@ class Plan(PlanBaseModel):
     id_: str | None = field(compare=False, default=None)
 
 
+@_add_slots
 @dataclass
 class PlanMatter(PlanBaseModel):
     name: str | None = None
@@ -514,6 +779,7 @@ class PlanMatter(PlanBaseModel):
     id_: str | None = field(compare=False, default=None)
 
 
+@_add_slots
 @dataclass(unsafe_hash=True)
 class Document(PlanBaseModel):
     name: str | None = None
@@ -0,0 +1,463 @@
+"""
+Loads the plan object and regulation group trees of a plan from the plan database with a single query.
+
+The layer based path (`models_from_features` of the layer classes) issues separate provider queries for each
+level of the tree. When all the needed layers come from the same PostgreSQL database, the tree is instead
+aggregated into JSON on the database side and the models are built from the result. The JSON values are converted
+to the types the layer fields give, so both paths build equal models.
+
+The query reads the committed rows of the database, so the layer based path is used whenever one of the layers has
+uncommitted edits or is filtered with something else than the plan filter of the plugin. It is used also for other
+sources and if the query fails.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from string import Template
+from textwrap import dedent
+from typing import TYPE_CHECKING, Any, Callable, cast
+from uuid import UUID
+
+from qgis.core import QgsDataSourceUri, QgsGeometry, QgsProviderConnectionException, QgsProviderRegistry
+from qgis.PyQt.QtCore import QDate, QDateTime, Qt, QVariant
+
+from arho_feature_template.project.layers.plan_layers import (
+    AdditionalInformationLayer,
+    PlanPropositionLayer,
+    PlanRegulationLayer,
+    PlanThemeAssociationLayer,
+    RegulationGroupAssociationLayer,
+    RegulationGroupLayer,
+    TypeOfVerbalRegulationAssociationLayer,
+    plan_feature_layers,
+)
+
+if TYPE_CHECKING:
+    from qgis.core import QgsAbstractDatabaseProviderConnection
+
+    from arho_feature_template.core.models import PlanObject, RegulationGroup
+    from arho_feature_template.project.layers import AbstractLayer
+    from arho_feature_template.project.layers.plan_layers import AbstractPlanLayer
+
+logger = logging.getLogger(__name__)
+
+REGULATION_GROUPS_CTE = Template(
+    dedent(
+        """\
+        regulations AS (
+            SELECT
+                r.plan_regulation_group_id AS group_id,
+                jsonb_agg(
+                    to_jsonb(r) || jsonb_build_object(
+                        'additional_information',
+                        COALESCE(
+                            (
+                                SELECT jsonb_agg(to_jsonb(ai))
+                                FROM $additional_information ai
+                                WHERE ai.plan_regulation_id = r.id
+                            ),
+                            '[]'::jsonb
+                        ),
+                        'theme_ids',
+                        COALESCE(
+                            (
+                                SELECT jsonb_agg(pta.plan_theme_id)
+                                FROM $plan_theme_association pta
+                                WHERE pta.plan_regulation_id = r.id
+                            ),
+                            '[]'::jsonb
+                        ),
+                        'verbal_regulation_type_ids',
+                        COALESCE(
+                            (
+                                SELECT jsonb_agg(tvra.type_of_verbal_plan_regulation_id)
+                                FROM $type_of_verbal_regulation_association tvra
+                                WHERE tvra.plan_regulation_id = r.id
+                            ),
+                            '[]'::jsonb
+                        )
+                    )
+                ) AS regulations
+            FROM
+                $plan_regulation r
+                JOIN $plan_regulation_group rg
+                    ON (rg.id = r.plan_regulation_group_id)
+            WHERE rg.plan_id = $plan_id
+            GROUP BY r.plan_regulation_group_id
+        ),
+        propositions AS (
+            SELECT
+                p.plan_regulation_group_id AS group_id,
+                jsonb_agg(
+                    to_jsonb(p) || jsonb_build_object(
+                        'theme_ids',
+                        COALESCE(
+                            (
+                                SELECT jsonb_agg(pta.plan_theme_id)
+                                FROM $plan_theme_association pta
+                                WHERE pta.plan_proposition_id = p.id
+                            ),
+                            '[]'::jsonb
+                        )
+                    )
+                ) AS propositions
+            FROM
+                $plan_proposition p
+                JOIN $plan_regulation_group rg
+                    ON (rg.id = p.plan_regulation_group_id)
+            WHERE rg.plan_id = $plan_id
+            GROUP BY p.plan_regulation_group_id
+        ),
+        regulation_groups AS (
+            SELECT
+                rg.id,
+                to_jsonb(rg) || jsonb_build_object(
+                    'regulations', COALESCE(r.regulations, '[]'::jsonb),
+                    'propositions', COALESCE(p.propositions, '[]'::jsonb)
+                ) AS regulation_group
+            FROM
+                $plan_regulation_group rg
+                LEFT JOIN regulations r
+                    ON (r.group_id = rg.id)
+                LEFT JOIN propositions p
+                    ON (p.group_id = rg.id)
+            WHERE rg.plan_id = $plan_id
+        )"""
+    )
+)
+
+REGULATION_GROUPS_QUERY = Template(
+    dedent(
+        """\
+        WITH
+        $regulation_groups_cte
+        SELECT COALESCE(jsonb_agg(regulation_group), '[]'::jsonb)::text
+        FROM regulation_groups"""
+    )
+)
+
+PLAN_OBJECTS_SELECT = Template(
+    dedent(
+        """\
+        SELECT
+            $layer_key AS layer_key,
+            to_jsonb(o) - $geometry_column_name AS plan_object,
+            $geometry AS geom,
+            COALESCE(
+                (
+                    SELECT jsonb_agg(rg.regulation_group)
+                    FROM
+                        $regulation_group_association rga
+                        JOIN regulation_groups rg
+                            ON (rg.id = rga.plan_regulation_group_id)
+                    WHERE rga.$association_column = o.id
+                ),
+                '[]'::jsonb
+            ) AS regulation_groups
+        FROM $plan_object o
+        WHERE o.plan_id = $plan_id$id_filter"""
+    )
+)
+
+PLAN_OBJECTS_QUERY = Template(
+    dedent(
+        """\
+        WITH
+        $regulation_groups_cte,
+        plan_objects AS (
+        $plan_objects_selects
+        )
+        SELECT
+            COALESCE(
+                jsonb_agg(
+                    plan_object || jsonb_build_object(
+                        'layer_key', layer_key,
+                        'geom', geom,
+                        'regulation_groups', regulation_groups
+                    )
+                ),
+                '[]'::jsonb
+            )::text
+        FROM plan_objects"""
+    )
+)
+
+
+def load_plan_objects(
+    plan_id: str, plan_object_ids: list[str] | None = None, *, with_geometries: bool = True
+) -> list[PlanObject]:
+    """
+    Loads the plan objects of the plan together with their regulation groups.
+
+    If `plan_object_ids` is given, only the plan objects with those IDs are loaded. If `with_geometries` is False,
+    the geometries are not loaded.
+    """
+    try:
+        plan_objects = _query_plan_objects(plan_id, plan_object_ids, with_geometries)
+    except QgsProviderConnectionException:
+        logger.exception("Failed to load plan objects with a single query, falling back to layer queries")
+        plan_objects = None
+
+    if plan_objects is not None:
+        return plan_objects
+
+    plan_objects = []
+    for layer_class in plan_feature_layers:
+        if plan_object_ids is None:
+            features = list(layer_class.get_model_features())
+        else:
+            features = list(layer_class.get_model_features_by_attribute_value("id", plan_object_ids))
+        plan_objects.extend(layer_class.models_from_features(features, with_geometries=with_geometries))
+    return plan_objects
+
+
+def load_regulation_groups(plan_id: str) -> list[RegulationGroup]:
+    """Loads the regulation groups of the plan together with their regulations and propositions."""
+    try:
+        regulation_groups = _query_regulation_groups(plan_id)
+    except QgsProviderConnectionException:
+        logger.exception("Failed to load regulation groups with a single query, falling back to layer queries")
+        regulation_groups = None
+
+    if regulation_groups is not None:
+        return regulation_groups
+
+    return RegulationGroupLayer.models_from_features(list(RegulationGroupLayer.get_model_features()))
+
+
+def _query_plan_objects(
+    plan_id: str,
+    plan_object_ids: list[str] | None,
+    with_geometries: bool,  # noqa: FBT001
+) -> list[PlanObject] | None:
+    layer_classes: list[type[AbstractPlanLayer]] = [*plan_feature_layers, RegulationGroupAssociationLayer]
+    plan_id_literal = _uuid_literal(plan_id)
+    if plan_id_literal is None:
+        return None
+
+    id_filter = ""
+    if plan_object_ids is not None:
+        if not plan_object_ids:
+            return []
+        id_literals = [_uuid_literal(id_) for id_ in plan_object_ids]
+        if None in id_literals:
+            return None
+        id_filter = f" AND o.id IN ({', '.join(cast('list[str]', id_literals))})"
+
+    connection = _database_connection([*layer_classes, *_regulation_group_layer_classes()], plan_id)
+    if connection is None:
+        return None
+
+    selects = []
+    for layer_key, layer_class in enumerate(plan_feature_layers):
+        uri = _data_source_uri(layer_class)
+        selects.append(
+            PLAN_OBJECTS_SELECT.substitute(
+                layer_key=layer_key,
+                geometry_column_name=_quote_literal(uri.geometryColumn()),
+                geometry=f"encode(ST_AsBinary(o.{_quote_identifier(uri.geometryColumn())}), 'hex')"
+                if with_geometries
+                else "NULL::text",
+                regulation_group_association=_quoted_table_name(RegulationGroupAssociationLayer),
+                association_column=_quote_identifier(
+                    RegulationGroupAssociationLayer.layer_name_to_attribute_map[layer_class.name]
+                ),
+                plan_object=_quoted_table_name(layer_class),
+                plan_id=plan_id_literal,
+                id_filter=id_filter,
+            )
+        )
+
+    query = PLAN_OBJECTS_QUERY.substitute(
+        regulation_groups_cte=_regulation_groups_cte(plan_id_literal),
+        plan_objects_selects="\nUNION ALL\n".join(selects),
+    )
+
+    normalizer = _RowNormalizer()
+    plan_objects = []
+    for row in _execute_json_query(connection, query):
+        geom = None
+        if with_geometries:
+            geom = QgsGeometry()
+            if row["geom"]:
+                geom.fromWkb(bytes.fromhex(row["geom"]))
+        layer_class = plan_feature_layers[row["layer_key"]]
+        regulation_groups = [
+            _regulation_group_from_row(group_row, normalizer) for group_row in row["regulation_groups"]
+        ]
+        plan_objects.append(layer_class.model_from_row(normalizer.normalize(layer_class, row), geom, regulation_groups))
+    return plan_objects
+
+
+def _query_regulation_groups(plan_id: str) -> list[RegulationGroup] | None:
+    plan_id_literal = _uuid_literal(plan_id)
+    if plan_id_literal is None:
+        return None
+    connection = _database_connection(_regulation_group_layer_classes(), plan_id)
+    if connection is None:
+        return None
+
+    query = REGULATION_GROUPS_QUERY.substitute(regulation_groups_cte=_regulation_groups_cte(plan_id_literal))
+    normalizer = _RowNormalizer()
+    return [_regulation_group_from_row(row, normalizer) for row in _execute_json_query(connection, query)]
+
+
+def _regulation_group_layer_classes() -> list[type[AbstractPlanLayer]]:
+    return [
+        RegulationGroupLayer,
+        PlanRegulationLayer,
+        PlanPropositionLayer,
+        AdditionalInformationLayer,
+        PlanThemeAssociationLayer,
+        TypeOfVerbalRegulationAssociationLayer,
+    ]
+
+
+def _regulation_groups_cte(plan_id_literal: str) -> str:
+    return REGULATION_GROUPS_CTE.substitute(
+        plan_regulation_group=_quoted_table_name(RegulationGroupLayer),
+        plan_regulation=_quoted_table_name(PlanRegulationLayer),
+        plan_proposition=_quoted_table_name(PlanPropositionLayer),
+        additional_information=_quoted_table_name(AdditionalInformationLayer),
+        plan_theme_association=_quoted_table_name(PlanThemeAssociationLayer),
+        type_of_verbal_regulation_association=_quoted_table_name(TypeOfVerbalRegulationAssociationLayer),
+        plan_id=plan_id_literal,
+    )
+
+
+def _regulation_group_from_row(row: dict[str, Any], normalizer: _RowNormalizer) -> RegulationGroup:
+    regulations = [
+        PlanRegulationLayer.model_from_row(
+            normalizer.normalize(PlanRegulationLayer, regulation_row),
+            [
+                AdditionalInformationLayer.model_from_row(normalizer.normalize(AdditionalInformationLayer, info_row))
+                for info_row in regulation_row["additional_information"]
+            ],
+            regulation_row["theme_ids"],
+            regulation_row["verbal_regulation_type_ids"],
+        )
+        for regulation_row in row["regulations"]
+    ]
+    propositions = [
+        PlanPropositionLayer.model_from_row(
+            normalizer.normalize(PlanPropositionLayer, proposition_row), proposition_row["theme_ids"]
+        )
+        for proposition_row in row["propositions"]
+    ]
+    return RegulationGroupLayer.model_from_row(
+        normalizer.normalize(RegulationGroupLayer, row), regulations, propositions
+    )
+
+
+# Converters from JSON values to the Python values of layer fields by field type
+_JSON_VALUE_CONVERTERS: dict[int, Callable[[Any], Any]] = {
+    QVariant.Int: int,
+    QVariant.LongLong: int,
+    QVariant.Double: float,
+    QVariant.DateTime: lambda value: QDateTime.fromString(value, Qt.ISODateWithMs),
+    QVariant.Date: lambda value: QDate.fromString(value, Qt.ISODate),
+}
+
+
+class _RowNormalizer:
+    """Converts the values of rows parsed from JSON to the types the fields of the layer give."""
+
+    def __init__(self):
+        self._converters_by_layer: dict[type[AbstractLayer], dict[str, Callable[[Any], Any]]] = {}
+
+    def normalize(self, layer_class: type[AbstractLayer], row: dict[str, Any]) -> dict[str, Any]:
+        converters = self._converters_by_layer.get(layer_class)
+        if converters is None:
+            converters = {
+                field.name(): _JSON_VALUE_CONVERTERS[field.type()]
+                for field in layer_class.get_from_project().fields()
+                if field.type() in _JSON_VALUE_CONVERTERS
+            }
+            self._converters_by_layer[layer_class] = converters
+
+        for name, convert in converters.items():
+            value = row.get(name)
+            if value is not None:
+                row[name] = convert(value)
+        return row
+
+
+def _database_connection(
+    layer_classes: list[type[AbstractPlanLayer]], plan_id: str
+) -> QgsAbstractDatabaseProviderConnection | None:
+    """
+    Returns a connection to the database of the given layers.
+
+    Returns None if some of the layers is not a PostgreSQL layer, the layers are not in the same database, or the
+    database does not have the same rows as the layers: some of the layers has uncommitted edits or a subset string
+    other than the plan filter of the plugin.
+    """
+    layers = [layer_class.get_from_project() for layer_class in layer_classes]
+    if any(layer.providerType() != "postgres" or layer.isModified() for layer in layers):
+        return None
+    if any(
+        layer.subsetString() not in ("", _plan_filter(layer_class, plan_id))
+        for layer_class, layer in zip(layer_classes, layers)
+    ):
+        return None
+
+    connection_infos = {QgsDataSourceUri(layer.source()).connectionInfo(False) for layer in layers}
+    if len(connection_infos) != 1:
+        return None
+
+    provider_registry = QgsProviderRegistry.instance()
+    if provider_registry is None:
+        return None
+    postgres_provider_metadata = provider_registry.providerMetadata("postgres")
+    if postgres_provider_metadata is None:
+        return None
+
+    return postgres_provider_metadata.createConnection(layers[0].source(), {})
+
+
+def _plan_filter(layer_class: type[AbstractPlanLayer], plan_id: str) -> str | None:
+    if layer_class.filter_template is None:
+        return None
+    return layer_class.filter_template.substitute(plan_id=plan_id)
+
+
+def _execute_json_query(connection: QgsAbstractDatabaseProviderConnection, query: str) -> list[dict[str, Any]]:
+    result = connection.executeSql(query)
+    if not result or not result[0] or result[0][0] is None:
+        return []
+    return json.loads(result[0][0])
+
+
+def _data_source_uri(layer_class: type[AbstractLayer]) -> QgsDataSourceUri:
+    return QgsDataSourceUri(layer_class.get_from_project().source())
+
+
+def _quoted_table_name(layer_class: type[AbstractLayer]) -> str:
+    uri = _data_source_uri(layer_class)
+    return f"{_quote_identifier(uri.schema())}.{_quote_identifier(uri.table())}"
+
+
+def _quote_identifier(identifier: str) -> str:
+    escaped = identifier.replace('"', '""')
+    return f'"{escaped}"'
+
+
+def _quote_literal(value: str) -> str:
+    # Only for names read from the data sources of the layers, values are passed with `_uuid_literal`
+    escaped = value.replace("'", "''")
+    return f"'{escaped}'"
+
+
+def _uuid_literal(value: str) -> str | None:
+    """
+    Returns the ID as a UUID literal, or None if it is not a valid UUID.
+
+    The provider connections do not support bound parameters, so IDs are written into the query only after they
+    have been parsed as UUIDs.
+    """
+    try:
+        return f"'{UUID(value)}'::uuid"
+    except (TypeError, ValueError):
+        return None
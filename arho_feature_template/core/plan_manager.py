@@ -3,8 +3,9 @@ from __future__ import annotations
 import json
 import logging
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator, Iterable, cast
+from typing import TYPE_CHECKING, Generator, Iterable, cast
 
 from qgis.core import (
     QgsExpressionContextUtils,
@@ -20,17 +21,21 @@ from qgis.PyQt.QtCore import QObject, pyqtSignal
 from qgis.PyQt.QtWidgets import QDialog
 
 from arho_feature_template import SUPPORTED_PROJECT_VERSION
+from arho_feature_template.core.code_cache_loader import CodeCacheLoader
 from arho_feature_template.core.feature_editing import (
-    delete_feature,
     delete_regulation_group,
+    remove_associations,
     save_plan,
     save_plan_feature,
     save_plan_matter,
     save_regulation_group,
-    save_regulation_group_association,
+    save_regulation_group_associations,
+    unit_of_work,
 )
 from arho_feature_template.core.lambda_service import LambdaService
+from arho_feature_template.core.library_file_watcher import LibraryFileWatcher
 from arho_feature_template.core.models import (
+    Library,
     Plan,
     PlanFeatureLibrary,
     PlanMatter,
@@ -38,6 +43,7 @@ from arho_feature_template.core.models import (
     RegulationGroup,
     RegulationGroupLibrary,
 )
+from arho_feature_template.core.plan_graph_loader import load_regulation_groups
 from arho_feature_template.core.template_manager import TemplateManager
 from arho_feature_template.exceptions import UnsavedChangesError
 from arho_feature_template.gui.dialogs.import_features_form import ImportFeaturesForm
@@ -57,11 +63,10 @@ from arho_feature_template.gui.docks.plan_features_dock import PlanObjectsDock
 from arho_feature_template.gui.docks.regulation_groups_dock import RegulationGroupsDock
 from arho_feature_template.gui.tools.inspect_plan_features_tool import InspectPlanFeatures
 from arho_feature_template.project.layers.code_layers import (
-    AdditionalInformationTypeLayer,
     PlanRegulationGroupTypeLayer,
-    PlanRegulationTypeLayer,
     PlanType,
     code_layers,
+    log_code_cache_statistics,
 )
 from arho_feature_template.project.layers.plan_layers import (
     FEATURE_LAYER_NAME_TO_CLASS_MAP,
@@ -73,7 +78,6 @@ from arho_feature_template.project.layers.plan_layers import (
     PlanTypeLayer,
     PointLayer,
     RegulationGroupAssociationLayer,
-    RegulationGroupLayer,
     plan_feature_layers,
     plan_layers,
     plan_matter_layers,
@@ -103,6 +107,9 @@ from arho_feature_template.utils.misc_utils import (
     use_wait_cursor,
 )
 
+if TYPE_CHECKING:
+    from arho_feature_template.gui.components.regulation_groups_view import RegulationGroupsView
+
 logger = logging.getLogger(__name__)
 
 QML_MAP = {
@@ -138,6 +145,7 @@ class PlanManager(QObject):
     project_loaded = pyqtSignal()
     project_cleared = pyqtSignal()
     plan_identifier_set = pyqtSignal(str)
+    regulation_group_library_reloaded = pyqtSignal(object, object)
 
     def __init__(self):
         super().__init__()
@@ -195,6 +203,13 @@ class PlanManager(QObject):
         self.lambda_service.plan_data_received.connect(self.save_exported_plan)
         self.lambda_service.plan_matter_data_received.connect(self.save_exported_plan_matter)
 
+        # Initialize code layer cache loader
+        self.code_cache_loader = CodeCacheLoader()
+
+        # Initialize watcher for reloading user libraries changed outside the plugin
+        self.library_file_watcher = LibraryFileWatcher(self)
+        self.library_file_watcher.library_files_changed.connect(self._on_library_files_changed)
+
     def initialize_from_project(self):
         self.cache_code_layers()
         self.initialize_libraries()
@@ -231,16 +246,43 @@ class PlanManager(QObject):
         if not self.check_required_layers():
             return
 
-        @use_wait_cursor
-        def _cache_code_layers():
-            PlanRegulationTypeLayer.build_cache()
-            AdditionalInformationTypeLayer.build_cache()
-
-        _cache_code_layers()
+        # Caches are built in the background, lookups wait only for the layer they need
+        self.code_cache_loader.start()
 
     def initialize_libraries(self):
         self._initialize_regulation_group_libraries()
         self._initialize_plan_feature_libraries()
+        self.library_file_watcher.watch(self._user_library_file_paths())
+
+    def _user_library_file_paths(self) -> list[str]:
+        return [
+            library.file_path
+            for library in [*self.regulation_group_libraries, *self.plan_feature_libraries]
+            if library.library_type == Library.LibraryType.CUSTOM and library.file_path
+        ]
+
+    def _on_library_files_changed(self, file_paths: list[str]):
+        """Reloads the user libraries of the changed files and updates them to the docks and open forms."""
+        for file_path in file_paths:
+            for i, library in enumerate(self.regulation_group_libraries):
+                if library.library_type == Library.LibraryType.CUSTOM and library.file_path == file_path:
+                    reloaded_library = self._read_regulation_group_library(file_path, library.library_type)
+                    self.regulation_group_libraries[i] = reloaded_library
+                    self.regulation_group_library_reloaded.emit(library, reloaded_library)
+            for i, plan_feature_library in enumerate(self.plan_feature_libraries):
+                if plan_feature_library.file_path == file_path:
+                    reloaded_plan_feature_library = self._read_plan_feature_library(file_path)
+                    self.plan_feature_libraries[i] = reloaded_plan_feature_library
+                    self.new_feature_dock.update_plan_feature_library(i, reloaded_plan_feature_library)
+
+    @contextmanager
+    def library_updates_to(self, regulation_groups_view: RegulationGroupsView) -> Generator[None, None, None]:
+        """Keeps the view up to date with reloaded regulation group libraries while in the context."""
+        self.regulation_group_library_reloaded.connect(regulation_groups_view.update_regulation_group_library)
+        try:
+            yield
+        finally:
+            self.regulation_group_library_reloaded.disconnect(regulation_groups_view.update_regulation_group_library)
 
     def _initialize_regulation_group_libraries(self):
         # Cannot initialize regulation group librarires if regulation layer is not found
@@ -249,34 +291,39 @@ class PlanManager(QObject):
 
         self.regulation_group_libraries: list[RegulationGroupLibrary] = []
         self.regulation_group_libraries = [
-            RegulationGroupLibrary.from_template_dict(
-                data=TemplateManager.read_library_config_file(file_path, "regulation_group"),
-                library_type=RegulationGroupLibrary.LibraryType.DEFAULT,
-                file_path=str(file_path),
-            )
+            self._read_regulation_group_library(file_path, RegulationGroupLibrary.LibraryType.DEFAULT)
             for file_path in get_default_regulation_group_library_config_files()
         ]
         self.regulation_group_libraries.extend(
-            RegulationGroupLibrary.from_template_dict(
-                data=TemplateManager.read_library_config_file(file_path, "regulation_group"),
-                library_type=RegulationGroupLibrary.LibraryType.CUSTOM,
-                file_path=str(file_path),
-            )
+            self._read_regulation_group_library(file_path, RegulationGroupLibrary.LibraryType.CUSTOM)
             for file_path in get_user_regulation_group_library_config_files()
         )
 
     def _initialize_plan_feature_libraries(self):
         """Make sure regulation group libraries are updated before initializing plan feature libraries."""
         self.plan_feature_libraries = [
-            PlanFeatureLibrary.from_template_dict(
-                data=TemplateManager.read_library_config_file(file_path, "plan_feature"),
-                library_type=PlanFeatureLibrary.LibraryType.CUSTOM,
-                file_path=str(file_path),
-            )
-            for file_path in get_user_plan_feature_library_config_files()
+            self._read_plan_feature_library(file_path) for file_path in get_user_plan_feature_library_config_files()
         ]
         self.new_feature_dock.initialize_plan_feature_libraries(self.plan_feature_libraries)
 
+    @staticmethod
+    def _read_regulation_group_library(
+        file_path: str | Path, library_type: RegulationGroupLibrary.LibraryType
+    ) -> RegulationGroupLibrary:
+        return RegulationGroupLibrary.from_template_dict(
+            data=TemplateManager.read_library_config_file(file_path, "regulation_group"),
+            library_type=library_type,
+            file_path=str(file_path),
+        )
+
+    @staticmethod
+    def _read_plan_feature_library(file_path: str | Path) -> PlanFeatureLibrary:
+        return PlanFeatureLibrary.from_template_dict(
+            data=TemplateManager.read_library_config_file(file_path, "plan_feature"),
+            library_type=PlanFeatureLibrary.LibraryType.CUSTOM,
+            file_path=str(file_path),
+        )
+
     def open_manage_plans(self):
         dialog = ManagePlans(self.regulation_group_libraries)
         if dialog.exec():
@@ -294,8 +341,8 @@ class PlanManager(QObject):
         import_features_form = ImportFeaturesForm(
             self.regulation_group_libraries, self.active_plan_regulation_group_library
         )
-        if import_features_form.exec_():
-            pass
+        with self.library_updates_to(import_features_form.regulation_groups_view):
+            import_features_form.exec_()
 
     @use_wait_cursor
     def update_active_plan_regulation_group_library(self):
@@ -309,6 +356,13 @@ class PlanManager(QObject):
         self._open_regulation_group_form(regulation_group)
 
     def manage_libraries(self):
+        # Libraries match their files outside of this dialog. Record their state before the user edits them.
+        for library in [*self.regulation_group_libraries, *self.plan_feature_libraries]:
+            if library.saved_hash is None:
+                library.mark_saved()
+
+        # Changed files are reloaded only after the dialog is closed, not to replace libraries under edit
+        self.library_file_watcher.pause()
         manage_libraries_form = ManageLibrariesForm(self.regulation_group_libraries, self.plan_feature_libraries)
         result = manage_libraries_form.exec_()
         # Even if user clicked cancel, we retrieve the list of updated libraries in case a library was deleted
@@ -316,28 +370,59 @@ class PlanManager(QObject):
             manage_libraries_form.regulation_group_library_widget.get_current_libraries()
         )
         updated_plan_feature_libraries = manage_libraries_form.plan_feature_library_widget.get_current_libraries()
-        if result:
-            # Rewrite all new and remaining library config files and reinitialize libraries
-            for library in updated_regulation_group_libraries:
+
+        # Write new and changed libraries into their files. If user clicked cancel, changed libraries are replaced
+        # with the libraries they were copied from, or reloaded from their files if they were added in the dialog.
+        # Unchanged libraries are kept as they are.
+        regulation_group_library_widget = manage_libraries_form.regulation_group_library_widget
+        plan_feature_library_widget = manage_libraries_form.plan_feature_library_widget
+        for i, library in enumerate(updated_regulation_group_libraries):
+            if not library.is_dirty():
+                continue
+            if result:
                 TemplateManager.write_regulation_group_template_file(
                     library.into_template_dict(), Path(library.file_path), overwrite=True
                 )
-            for library in updated_plan_feature_libraries:
+                library.mark_saved()
+                self.library_file_watcher.mark_current(library.file_path)
+            else:
+                updated_regulation_group_libraries[i] = regulation_group_library_widget.get_original_library(
+                    library
+                ) or self._read_regulation_group_library(library.file_path, library.library_type)
+        for i, library in enumerate(updated_plan_feature_libraries):
+            if not library.is_dirty():
+                continue
+            if result:
                 TemplateManager.write_plan_feature_template_file(
                     library.into_template_dict(), Path(library.file_path), overwrite=True
                 )
+                library.mark_saved()
+                self.library_file_watcher.mark_current(library.file_path)
+            else:
+                updated_plan_feature_libraries[i] = plan_feature_library_widget.get_original_library(
+                    library
+                ) or self._read_plan_feature_library(library.file_path)
+
         set_user_regulation_group_library_config_files(
             library.file_path for library in updated_regulation_group_libraries
         )
         set_user_plan_feature_library_config_files(library.file_path for library in updated_plan_feature_libraries)
-        self.initialize_libraries()
+        self.regulation_group_libraries = [
+            *manage_libraries_form.default_regulation_group_libraries,
+            *updated_regulation_group_libraries,
+        ]
+        self.plan_feature_libraries = updated_plan_feature_libraries
+        self.new_feature_dock.initialize_plan_feature_libraries(self.plan_feature_libraries)
+
+        self.library_file_watcher.watch(self._user_library_file_paths())
+        self.library_file_watcher.resume()
 
     def _open_regulation_group_form(self, regulation_group: RegulationGroup):
         regulation_group_form = PlanRegulationGroupForm(regulation_group, self.active_plan_regulation_group_library)
 
         if regulation_group_form.exec_():
             model = regulation_group_form.model
-            if save_regulation_group(model) is None:
+            if save_regulation_group(model, original=regulation_group) is None:
                 return None
             # NOTE: Should we reinitialize regulation group dock even if saving failed?
             self.update_active_plan_regulation_group_library()
@@ -355,44 +440,36 @@ class PlanManager(QObject):
             self.update_active_plan_regulation_group_library()
 
     def remove_all_regulation_groups_from_features(self, features: list[tuple[str, Generator[str]]]):
-        for feat_layer_name, feat_ids in features:
-            for feat_id in feat_ids:
-                for association in RegulationGroupAssociationLayer.get_associations_for_feature(
-                    feat_id, feat_layer_name
-                ):
-                    if not delete_feature(
-                        association,
-                        RegulationGroupAssociationLayer.get_from_project(),
-                        "Kaavamääräysryhmän assosiaation poisto",
-                    ):
-                        iface.messageBar().pushCritical("", "Kaavamääräysryhmän assosiaation poistaminen epäonnistui.")
+        with unit_of_work():
+            for feat_layer_name, feat_ids in features:
+                remove_associations(
+                    RegulationGroupAssociationLayer,
+                    RegulationGroupAssociationLayer.layer_name_to_attribute_map[feat_layer_name],
+                    "plan_regulation_group_id",
+                    feat_ids,
+                )
 
     def add_regulation_groups_to_features(
         self, groups: list[RegulationGroup], features: list[tuple[str, Generator[str]]]
     ):
-        for feat_layer_name, feat_ids in features:
-            for feat_id in feat_ids:
-                for group in groups:
-                    save_regulation_group_association(cast(str, group.id_), feat_layer_name, feat_id)
+        group_ids = [cast(str, group.id_) for group in groups]
+        with unit_of_work():
+            for feat_layer_name, feat_ids in features:
+                save_regulation_group_associations(group_ids, feat_layer_name, list(feat_ids))
 
     def remove_selected_regulation_groups_from_features(
         self, groups: list[RegulationGroup], features: list[tuple[str, Generator[str]]]
     ):
         group_ids = [cast(str, group.id_) for group in groups]
-        for feat_layer_name, feat_ids in features:
-            for feat_id in feat_ids:
-                for association in RegulationGroupAssociationLayer.get_associations_for_feature(
-                    feat_id, feat_layer_name
-                ):
-                    if association["plan_regulation_group_id"] in group_ids:  # noqa: SIM102
-                        if not delete_feature(
-                            association,
-                            RegulationGroupAssociationLayer.get_from_project(),
-                            "Kaavamääräysryhmän assosiaation poisto",
-                        ):
-                            iface.messageBar().pushCritical(
-                                "", "Kaavamääräysryhmän assosiaation poistaminen epäonnistui."
-                            )
+        with unit_of_work():
+            for feat_layer_name, feat_ids in features:
+                remove_associations(
+                    RegulationGroupAssociationLayer,
+                    RegulationGroupAssociationLayer.layer_name_to_attribute_map[feat_layer_name],
+                    "plan_regulation_group_id",
+                    feat_ids,
+                    group_ids,
+                )
 
     def toggle_identify_plan_features(self, activate: bool):  # noqa: FBT001
         if activate:
@@ -457,11 +534,12 @@ class PlanManager(QObject):
         if feature is None:
             iface.messageBar().pushWarning("", "Mikään kaavasuunnitelma ei ole avattuna.")
             return
-        plan_model = PlanLayer.model_from_feature(feature)
+        with PlanLayer.memoize_queries():
+            plan_model = PlanLayer.model_from_feature(feature)
+            attribute_form = PlanAttributeForm(plan_model, self.regulation_group_libraries)
 
-        attribute_form = PlanAttributeForm(plan_model, self.regulation_group_libraries)
         if attribute_form.exec_():
-            plan_id = save_plan(attribute_form.model)
+            plan_id = save_plan(attribute_form.model, original=plan_model)
             if plan_id is not None:
                 self.update_active_plan_regulation_group_library()
 
@@ -589,7 +667,9 @@ class PlanManager(QObject):
             self.regulation_group_libraries,
             self.active_plan_regulation_group_library,
         )
-        if attribute_form.exec_() and save_plan_feature(attribute_form.model) is not None:
+        with self.library_updates_to(attribute_form.regulation_groups_view):
+            accepted = attribute_form.exec_()
+        if accepted and save_plan_feature(attribute_form.model) is not None:
             self.update_active_plan_regulation_group_library()
 
     def edit_plan_feature(self, feature: QgsFeature, layer_name: str):
@@ -600,7 +680,9 @@ class PlanManager(QObject):
         attribute_form = PlanObjectForm(
             plan_feature, title, self.regulation_group_libraries, self.active_plan_regulation_group_library
         )
-        if attribute_form.exec_() and save_plan_feature(attribute_form.model) is not None:
+        with self.library_updates_to(attribute_form.regulation_groups_view):
+            accepted = attribute_form.exec_()
+        if accepted and save_plan_feature(attribute_form.model, original=plan_feature) is not None:
             self.update_active_plan_regulation_group_library()
 
     @use_wait_cursor
@@ -847,12 +929,19 @@ class PlanManager(QObject):
     def on_project_cleared(self):
         QgsProject.instance().cleared.disconnect(self.on_project_cleared)
 
+        log_code_cache_statistics()
         self.project_cleared.emit()
 
     def unload(self):
         # Set pan map tool as active (to deactivate our custom tools to avoid errors)
         iface.actionPan().trigger()
 
+        # Code layer caches
+        self.code_cache_loader.cancel()
+
+        # Library file watcher
+        self.library_file_watcher.clear()
+
         # Lambda service
         disconnect_signal(self.lambda_service.plan_data_received)
         disconnect_signal(self.lambda_service.plan_matter_data_received)
@@ -892,28 +981,30 @@ class PlanManager(QObject):
 
 @status_message("Haetaan kaavasuunitelman kaavamääräysryhmiä ...")
 def regulation_group_library_from_active_plan() -> RegulationGroupLibrary:
-    if get_active_plan_id():
+    plan_id = get_active_plan_id()
+    if plan_id:
         id_of_general_regulation_group_type = (
             PlanRegulationGroupTypeLayer.get_attribute_value_by_another_attribute_value(
                 "id", "value", "generalRegulations"
             )
         )
-        iterator = RegulationGroupLayer.get_features()
-        features = [
-            feat for feat in iterator if feat["type_of_plan_regulation_group_id"] != id_of_general_regulation_group_type
+        regulation_groups = [
+            group
+            for group in load_regulation_groups(plan_id)
+            if group.type_code_id != id_of_general_regulation_group_type
         ]
-        regulation_groups = RegulationGroupLayer.models_from_features(features)
     else:
         regulation_groups = []
 
-    return RegulationGroupLibrary(
+    library = RegulationGroupLibrary(
         name="Käytössä olevat kaavamääräysryhmät",
         file_path=None,
         version=None,
         description=None,
         library_type=RegulationGroupLibrary.LibraryType.ACTIVE_PLAN,
-        regulation_groups=regulation_groups,
     )
+    library.regulation_groups = regulation_groups
+    return library
 
 
 def _apply_style(layer: QgsVectorLayer) -> None:
@@ -75,6 +75,25 @@ class SettingsManager:
     def set_data_exchange_layer_enabled(cls, value: bool):  # noqa: FBT001
         cls._set("data_exchange_layer_enabled", value)
 
+    # IMPORT SETTINGS
+    @classmethod
+    def get_import_chunk_size(cls, default: int = 500) -> int:
+        return max(cls._get("import_chunk_size", default), 1)
+
+    @classmethod
+    def set_import_chunk_size(cls, value: int):
+        cls._set("import_chunk_size", value)
+
+    # CODE CACHE SETTINGS
+    @classmethod
+    def get_code_cache_wait_timeout(cls, default: int = 30) -> int:
+        """Seconds a lookup from a code layer waits for the background load of its codes."""
+        return max(cls._get("code_cache_wait_timeout", default), 1)
+
+    @classmethod
+    def set_code_cache_wait_timeout(cls, value: int):
+        cls._set("code_cache_wait_timeout", value)
+
     @classmethod
     def _migrate_keys(cls):
         # Old settings
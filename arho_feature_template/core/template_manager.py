@@ -1,61 +1,147 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
 import os
 from pathlib import Path
+from typing import Any
 
 import yaml
+from qgis.core import QgsApplication
 
 from arho_feature_template.utils.misc_utils import iface
 
+logger = logging.getLogger(__name__)
+
+# Use libyaml based loader and dumper when PyYAML has been built with libyaml
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+def _is_empty_value(value: Any) -> bool:
+    return value is None or (isinstance(value, (str, list)) and len(value) == 0)
+
+
+class _TemplateDumper(_SafeDumper):  # type: ignore[valid-type, misc]
+    """Leaves out dictionary items with None, empty string or empty list values while emitting."""
+
+
+def _represent_dict_without_empty_values(dumper: yaml.BaseDumper, data: dict) -> yaml.MappingNode:
+    return dumper.represent_mapping(
+        "tag:yaml.org,2002:map", ((key, value) for key, value in data.items() if not _is_empty_value(value))
+    )
+
+
+_TemplateDumper.add_representer(dict, _represent_dict_without_empty_values)
+
 
 class TemplateManager:
     # NOTE: Consider refactoring this class into utils
 
-    @classmethod
-    def _clean_data(cls, data: dict | list | str | float):
-        """Recursively removes keys with None, empty string, or empty-list values from a dict or list."""
-        if isinstance(data, dict):
-            cleaned_dict = {}
-            for key, value in data.items():
-                cleaned_value = cls._clean_data(value)
-                # Skip keys where the cleaned value is None, empty string, or an empty list
-                if (
-                    cleaned_value is None
-                    or cleaned_value == ""
-                    or (isinstance(cleaned_value, list) and len(cleaned_value) == 0)
-                ):
-                    continue
-                cleaned_dict[key] = cleaned_value
-            return cleaned_dict
-
-        if isinstance(data, list):
-            return [cls._clean_data(item) for item in data]
-
-        return data
+    # Parsed YAML files are cached in the user profile, see `_load_yaml`
+    PARSED_CACHE_DIR_NAME = "arho_template_cache"
+    PARSED_CACHE_FORMAT_VERSION = 2
 
     @classmethod
     def _write_to_yaml_file(cls, config_data: dict, file_path: Path, overwrite: bool):  # noqa: FBT001
         if not overwrite and os.path.exists(file_path):
             return
 
-        cleaned_data = cls._clean_data(config_data)
-
-        with file_path.open("w", encoding="utf-8") as yaml_file:
-            yaml.safe_dump(cleaned_data, yaml_file, sort_keys=False, allow_unicode=True, default_flow_style=False)
+        # Write into a temporary file first and replace the file with it, so that a failed write can not leave a
+        # half written library behind. Keys with None, empty string or empty list values are left out by the dumper.
+        tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as yaml_file:
+                yaml.dump(
+                    config_data,
+                    yaml_file,
+                    Dumper=_TemplateDumper,
+                    sort_keys=False,
+                    allow_unicode=True,
+                    default_flow_style=False,
+                )
+            os.replace(tmp_path, file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
 
     @classmethod
     def _read_from_yaml_file(cls, file_path: Path, fail_msg: str) -> dict:
-        if file_path.exists():
-            try:
-                with file_path.open(encoding="utf-8") as f:
-                    template_data = yaml.safe_load(f)
-                    return template_data if template_data is not None else {}
-            except IsADirectoryError:
-                iface.messageBar().pushCritical("", fail_msg)
-                return {}
-        else:
+        if not file_path.exists():
+            iface.messageBar().pushCritical("", fail_msg)
+            return {}
+
+        try:
+            template_data = cls._load_yaml(file_path)
+        except IsADirectoryError:
             iface.messageBar().pushCritical("", fail_msg)
             return {}
+        return template_data if template_data is not None else {}
+
+    @classmethod
+    def _load_yaml(cls, file_path: Path) -> Any:
+        """
+        Returns the parsed contents of the YAML file, using the parsed copy in the user profile when possible.
+
+        The parsed copy is used if the file content still has the same hash. Otherwise the file is parsed and the
+        parsed copy is updated. Contents that JSON can not represent as they are, such as dates, are not cached.
+        """
+        content = file_path.read_bytes()
+        content_hash = hashlib.sha256(content).hexdigest()
+        cache_path = cls._parsed_cache_path(file_path)
+        cached = cls._read_parsed_cache(cache_path)
+        if cached is not None and cached.get("sha256") == content_hash:
+            return cached["data"]
+
+        data = yaml.load(content.decode("utf-8"), Loader=_SafeLoader)  # noqa: S506
+        cls._write_parsed_cache(
+            cache_path,
+            {
+                "version": cls.PARSED_CACHE_FORMAT_VERSION,
+                "path": str(file_path),
+                "sha256": content_hash,
+                "data": data,
+            },
+        )
+        return data
+
+    @classmethod
+    def _parsed_cache_path(cls, file_path: Path) -> Path:
+        key = hashlib.sha1(str(file_path.resolve()).encode()).hexdigest()  # noqa: S324
+        return Path(QgsApplication.qgisSettingsDirPath()) / cls.PARSED_CACHE_DIR_NAME / f"{key}.json"
+
+    @classmethod
+    def _read_parsed_cache(cls, cache_path: Path) -> dict | None:
+        try:
+            with cache_path.open(encoding="utf-8") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Could not read parsed template cache %s", cache_path)
+            return None
+
+        if not isinstance(cached, dict) or cached.get("version") != cls.PARSED_CACHE_FORMAT_VERSION:
+            return None
+        return cached
+
+    @classmethod
+    def _write_parsed_cache(cls, cache_path: Path, cached: dict):
+        try:
+            serialized = json.dumps(cached, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        # Keys that are not strings would come back as strings
+        if json.loads(serialized)["data"] != cached["data"]:
+            return
+
+        tmp_path = cache_path.with_suffix(".tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(serialized, encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            logger.warning("Could not write parsed template cache %s", cache_path)
 
     # @classmethod
     # def read_regulation_group_template_file(cls, file_path: Path | str) -> dict:
@@ -100,9 +100,9 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
         # Reference to the original library list
         self.libraries = libraries
 
-        # Make a deep copy of the given library list so that modifications will only be saved when user
-        # succesfully clicks Ok
-        self.updated_libraries = copy.deepcopy(libraries)
+        # The libraries are edited as shallow copies so that modifications will only be saved when user
+        # succesfully clicks Ok. Maps ids of the copies to the original libraries.
+        self._original_libraries: dict[int, Library] = {}
 
         # SIGNALS
         self.library_selection.currentIndexChanged.connect(self._on_library_selection_changed)
@@ -134,7 +134,7 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
 
         # Initialize existing libraries, selection and widgets
         for library in self.libraries:
-            self._add_library(library)
+            self._add_library(self._copy_for_editing(library))
 
         self.library_details_groupbox.setCollapsed(False)
         if self.library_selection.count() != 0:
@@ -189,6 +189,8 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
             library_type=Library.LibraryType.CUSTOM,
             file_path=str(file_path),
         )
+        loaded_library.mark_saved()
+        self._original_libraries.pop(id(self.active_library), None)
         self.library_selection.setItemData(self.library_selection.currentIndex(), loaded_library, DATA_ROLE)
         self._change_active_library(loaded_library)
 
@@ -248,6 +250,19 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
 
         self._update_template_view()
 
+    def _copy_for_editing(self, library: Library) -> Library:
+        """
+        Returns a shallow copy of the library. The elements of the copy are shared with the original library: edits
+        replace the element list of the copy, and the element forms are given a copy of the edited element.
+        """
+        library_copy = copy.copy(library)
+        self._original_libraries[id(library_copy)] = library
+        return library_copy
+
+    def get_original_library(self, library: Library) -> Library | None:
+        """Returns the unmodified library the given library was copied from, or None for new and imported ones."""
+        return self._original_libraries.get(id(library))
+
     def _add_library(self, library: Library):
         self.library_selection.addItem(library.name, library)
         self.library_selection.setCurrentIndex(self.library_selection.count() - 1)
@@ -279,6 +294,7 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
                 file_path=str(file_path),
             )
             if library.status:
+                library.mark_saved()
                 self._add_library(library)
             else:
                 QMessageBox.critical(
@@ -306,16 +322,8 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
             self._delete_library(self.active_library)
 
     def _delete_library(self, library: Library):
-        if library.file_path is not None and id(library) in [id(lib) for lib in self.libraries]:
-            # TemplateManager.delete_template_file(library.file_path)
-
-            # Find the correct library from the list of updated libraries
-            # We have to find the correct library like this because the library instances are
-            # different in the original list and the copied list
-            for lib in self.updated_libraries:
-                if lib.file_path == library.file_path:
-                    self.updated_libraries.remove(lib)
-
+        # TemplateManager.delete_template_file(library.file_path)
+        self._original_libraries.pop(id(library), None)
         self.library_selection.removeItem(self.library_selection.currentIndex())
 
     def _is_new_library(self, library: Library) -> bool:
@@ -403,9 +411,10 @@ class LibaryDisplayWidget(QWidget, FormClass):  # type: ignore
                 if plan_feature_layer == element.layer_name:
                     title = f"Muokkaa kaavakohdepohjaa ({plan_feature_type})"
                     break
-            form = PlanObjectForm(element, title, self.regulation_group_libraries)
+            # Elements are shared with the original library, so the form gets a copy of the element
+            form = PlanObjectForm(copy.deepcopy(element), title, self.regulation_group_libraries)
         elif self.library_type_class is RegulationGroupLibrary:
-            form = PlanRegulationGroupForm(element, None)
+            form = PlanRegulationGroupForm(copy.deepcopy(element), None)
             form.setWindowTitle("Muokkaa kaavamääräysryhmäpohjaa")
         else:
             return
@@ -28,7 +28,7 @@ from arho_feature_template.project.layers.code_layers import (
     PlanTypeLayer,
 )
 from arho_feature_template.project.layers.plan_layers import PlanMatterLayer
-from arho_feature_template.utils.misc_utils import LANGUAGE, disconnect_signal, get_active_plan_matter_id
+from arho_feature_template.utils.misc_utils import LANGUAGE, disconnect_signal, get_active_plan_matter_id, iface
 
 if TYPE_CHECKING:
     from collections import defaultdict
@@ -193,6 +193,9 @@ class RegulationGroupsView(QGroupBox, FormClass):  # type: ignore
         self.template_categories.clear()
 
         library = self.regulation_group_libraries[i]
+        if not library.load_regulation_groups():
+            iface.messageBar().pushCritical("", f"Kaavamääräyskirjaston {library.name} lukeminen epäonnistui.")
+            return
         for group in library.regulation_groups:
             category = group.category
 
@@ -214,6 +217,21 @@ class RegulationGroupsView(QGroupBox, FormClass):  # type: ignore
                 str(group), group, self.template_categories[category]
             )
 
+    def update_regulation_group_library(
+        self, library: RegulationGroupLibrary, reloaded_library: RegulationGroupLibrary
+    ):
+        """Replaces a library with its reloaded version. Unreadable reloaded libraries are not shown."""
+        if not reloaded_library.status:
+            return
+
+        for i, existing_library in enumerate(self.regulation_group_libraries):
+            if existing_library is library:
+                self.regulation_group_libraries[i] = reloaded_library
+                self.plan_regulation_group_libraries_combobox.setItemText(i, reloaded_library.name)
+                if i == self.plan_regulation_group_libraries_combobox.currentIndex():
+                    self.show_regulation_group_library(i)
+                return
+
     def update_matching_groups(self, regulation_group_widget: RegulationGroupWidget):
         matching_groups = self.find_matching_groups(regulation_group_widget.into_model())
         regulation_group_widget.setup_linking_to_matching_groups(matching_groups)
@@ -1,24 +1,35 @@
 from __future__ import annotations
 
+import logging
 from importlib import resources
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, cast
 
 from qgis.core import (
+    QgsApplication,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
-    QgsFeature,
+    QgsFeatureRequest,
     QgsFieldProxyModel,
+    QgsFields,
     QgsGeometry,
     QgsMapLayerProxyModel,
     QgsProject,
+    QgsTask,
     QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
     QgsWkbTypes,
 )
 from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QCheckBox, QDialog, QDialogButtonBox, QProgressBar
 
-from arho_feature_template.core.feature_editing import save_plan_feature, save_regulation_group
+from arho_feature_template.core.feature_editing import (
+    add_features,
+    save_regulation_group,
+    save_regulation_group_associations,
+    unit_of_work,
+)
 from arho_feature_template.core.models import PlanObject, RegulationGroupLibrary
+from arho_feature_template.core.settings_manager import SettingsManager
 from arho_feature_template.gui.components.regulation_groups_view import RegulationGroupsView
 from arho_feature_template.project.layers.code_layers import (
     PlanRegulationGroupTypeLayer,
@@ -27,10 +38,11 @@ from arho_feature_template.project.layers.code_layers import (
 )
 from arho_feature_template.project.layers.plan_layers import (
     PlanLayer,
+    get_plan_feature_layer_class_by_layer_name,
     plan_feature_layers,
     plan_layers,
 )
-from arho_feature_template.utils.misc_utils import iface, use_wait_cursor
+from arho_feature_template.utils.misc_utils import get_active_plan_id, iface
 
 if TYPE_CHECKING:
     from qgis.gui import QgsFieldComboBox, QgsMapLayerComboBox
@@ -38,9 +50,14 @@ if TYPE_CHECKING:
     from arho_feature_template.gui.components.code_combobox import CodeComboBox
 
 
+logger = logging.getLogger(__name__)
+
 ui_path = resources.files(__package__) / "import_features_form.ui"
 FormClass, _ = uic.loadUiType(ui_path)
 
+# Share of the progress of a batch used for reading and preparing its source features, the rest is used for saving
+PREPARATION_PROGRESS_SHARE = 0.5
+
 
 class ImportFeaturesForm(QDialog, FormClass):  # type: ignore
     def __init__(
@@ -70,6 +87,12 @@ class ImportFeaturesForm(QDialog, FormClass):  # type: ignore
         self.process_button_box.rejected.connect(self.reject)
 
         self.target_crs: QgsCoordinateReferenceSystem | None = None
+        self._import_task: PrepareImportFeaturesTask | None = None
+        self._import_cancelled = False
+        self._regulation_group_ids: list[str] = []
+        self._import_total_count = 0
+        self._import_success_count = 0
+        self._import_failed_count = 0
 
         # Source layer initialization
         # Exclude all project layers from valid source layers
@@ -137,7 +160,14 @@ class ImportFeaturesForm(QDialog, FormClass):  # type: ignore
         target_type = QgsWkbTypes.geometryType(self.target_layer.wkbType())
         return source_type == target_type
 
-    @use_wait_cursor
+    def reject(self):
+        if self._import_task is not None:
+            # Cancel the running import instead of closing the dialog
+            self._import_cancelled = True
+            self._import_task.cancel()
+            return
+        super().reject()
+
     def import_features(self):
         self.progress_bar.setValue(0)
 
@@ -147,72 +177,258 @@ class ImportFeaturesForm(QDialog, FormClass):  # type: ignore
         if not self.target_crs:
             self.target_crs = PlanLayer.get_from_project().crs()
 
-        source_features = list(self.get_source_features(self.source_layer))
-
-        if not source_features:
+        feature_ids = self.source_layer.selectedFeatureIds() if self.selected_features_only.isChecked() else None
+        if feature_ids is not None and not feature_ids:
             iface.messageBar().pushInfo("", "Yhtään kohdetta ei tuotu.")
             return
 
-        # Create and add new plan features
-        self.create_and_save_plan_features(source_features)
+        self.process_button_box.button(QDialogButtonBox.Ok).setEnabled(False)
+        self._import_cancelled = False
+        self._regulation_group_ids = self.save_regulation_groups()
 
-    def get_source_features(self, source_layer: QgsVectorLayer) -> list[QgsFeature]:
-        return (
-            source_layer.selectedFeatures() if self.selected_features_only.isChecked() else source_layer.getFeatures()
+        source_fields = [
+            field for field in (self.name_selection.currentField(), self.description_selection.currentField()) if field
+        ]
+        task = PrepareImportFeaturesTask.for_layer(
+            self.source_layer, feature_ids, source_fields, self.target_crs, SettingsManager.get_import_chunk_size()
         )
-
-    def create_and_save_plan_features(self, source_features: list[QgsFeature]):
-        crs_mismatch = self.source_layer.crs() != self.target_crs
-        transform = QgsCoordinateTransform(
-            self.source_layer.crs(), PlanLayer.get_from_project().crs(), QgsProject.instance()
+        self._import_total_count = task.feature_count
+        self._import_success_count = 0
+        self._import_failed_count = 0
+        self._start_import_task(task)
+
+    def _start_import_task(self, task: PrepareImportFeaturesTask):
+        self._import_task = task
+        batch_count = min(task.batch_size, self._import_total_count - self._imported_count)
+        task.progressChanged.connect(
+            lambda progress: self._set_import_progress(
+                self._imported_count + progress / 100 * batch_count * PREPARATION_PROGRESS_SHARE
+            )
         )
+        task.taskCompleted.connect(self._on_import_task_completed)
+        task.taskTerminated.connect(self._on_import_task_terminated)
+        QgsApplication.taskManager().addTask(task)
 
-        def _check_geom(geometry: QgsGeometry):
-            if crs_mismatch:
-                geometry.transform(transform)
+    @property
+    def _imported_count(self) -> int:
+        return self._import_success_count + self._import_failed_count
 
-            if not geometry.isMultipart():
-                geometry.convertToMultiType()
-            return geometry
+    def _set_import_progress(self, imported_count: float):
+        if self._import_total_count > 0:
+            self.progress_bar.setValue(min(int(100 * imported_count / self._import_total_count), 100))
 
-        type_of_underground_id = self.feature_type_of_underground_selection.value()
-        source_layer_name_field = self.name_selection.currentField()
-        source_layer_description_field = self.description_selection.currentField()
+    def save_regulation_groups(self) -> list[str]:
+        """Saves the selected regulation groups for the target layer and returns their IDs."""
         regulation_groups = self.regulation_groups_view.into_model()
         target_layer_id = PlanRegulationGroupTypeLayer.get_id_by_feature_layer_name(self.target_layer_name)
+        group_ids = []
         for group in regulation_groups:
             # Assign feature layer type for each group based on target layer (will overwrite type_code_id for
             # existing regulation groups)
-            group.type_code_id = target_layer_id
-            # If the group is not yet in DB, save it now to get an ID and use the same group object for each
-            # plan feature
-            if group.id_ is None:
-                id_ = save_regulation_group(group)
-                group.id_ = id_
-                group.modified = False
-
-        # Save plan features and track progress
-        total_count = len(source_features)
-        failed_count = 0
-        success_count = 0
-        for i, feature in enumerate(source_features):
-            model = PlanObject(
-                geom=_check_geom(feature.geometry()),
-                type_of_underground_id=type_of_underground_id,
-                layer_name=self.target_layer_name,
-                name=feature[source_layer_name_field] if source_layer_name_field else None,
-                description=feature[source_layer_description_field] if source_layer_description_field else None,
-                regulation_groups=regulation_groups,
-            )
-            self.progress_bar.setValue(int((i + 1) / total_count * 100))
-            if save_plan_feature(model):
-                success_count += 1
-            else:
-                failed_count += 1
+            if group.type_code_id != target_layer_id:
+                group.type_code_id = target_layer_id
+                group.modified = True
+            id_ = save_regulation_group(group)
+            if id_ is not None:
+                group_ids.append(id_)
+        return group_ids
+
+    def _on_import_task_completed(self):
+        task = cast(PrepareImportFeaturesTask, self._import_task)
+        self._import_task = None
+        # The exact count is known once the IDs of the source features have been read
+        self._import_total_count = self._imported_count + len(task.prepared_features) + len(task.remaining_feature_ids)
+        self.create_and_save_plan_features(task.prepared_features)
+
+        next_task = task.next_batch_task()
+        if next_task is not None and not self._import_cancelled:
+            self._start_import_task(next_task)
+        else:
+            self._finish_import()
 
-        self.progress_bar.setValue(100)
+    def _on_import_task_terminated(self):
+        task = cast(PrepareImportFeaturesTask, self._import_task)
+        self._import_task = None
+        if self._import_cancelled:
+            self._finish_import()
+            return
 
-        if failed_count == 0:
+        self.process_button_box.button(QDialogButtonBox.Ok).setEnabled(True)
+        self.progress_bar.setValue(0)
+        iface.messageBar().pushCritical("", f"Kaavakohteiden tuonti epäonnistui: {task.error}")
+
+    def _finish_import(self):
+        self.process_button_box.button(QDialogButtonBox.Ok).setEnabled(True)
+        if self._import_cancelled:
+            self.progress_bar.setValue(0)
+            iface.messageBar().pushInfo(
+                "",
+                "Kaavakohteiden tuonti keskeytettiin. "
+                f"Tuotiin {self._import_success_count}/{self._import_total_count} kaavakohdetta.",
+            )
+        elif self._imported_count == 0:
+            iface.messageBar().pushInfo("", "Yhtään kohdetta ei tuotu.")
+        elif self._import_failed_count == 0:
+            self.progress_bar.setValue(100)
             iface.messageBar().pushSuccess("", "Kaavakohteet tuotiin onnistuneesti.")
         else:
-            iface.messageBar().pushInfo("", f"Osa kaavakohteista tuotiin epäonnistuneesti ({failed_count}).")
+            self.progress_bar.setValue(100)
+            iface.messageBar().pushInfo(
+                "", f"Osa kaavakohteista tuotiin epäonnistuneesti ({self._import_failed_count})."
+            )
+
+    def create_and_save_plan_features(self, prepared_features: list[tuple[QgsGeometry, dict[str, Any]]]):
+        """
+        Saves a batch of prepared features and the associations of their regulation groups in one unit of work.
+
+        Features without a geometry cannot be added to the target layer, so they are skipped and counted as failed.
+        """
+        feature_count = len(prepared_features)
+        prepared_features = [
+            (geometry, attributes) for geometry, attributes in prepared_features if not geometry.isNull()
+        ]
+        self._import_failed_count += feature_count - len(prepared_features)
+        if not prepared_features:
+            self._set_import_progress(self._imported_count)
+            return
+
+        layer_class = get_plan_feature_layer_class_by_layer_name(self.target_layer_name)
+        layer = layer_class.get_from_project()
+        plan_id = get_active_plan_id()
+        type_of_underground_id = self.feature_type_of_underground_selection.value()
+        source_layer_name_field = self.name_selection.currentField()
+        source_layer_description_field = self.description_selection.currentField()
+
+        features = [
+            layer_class.feature_from_model(
+                PlanObject(
+                    geom=geometry,
+                    type_of_underground_id=type_of_underground_id,
+                    layer_name=self.target_layer_name,
+                    name=attributes.get(source_layer_name_field),
+                    description=attributes.get(source_layer_description_field),
+                ),
+                plan_id,
+            )
+            for geometry, attributes in prepared_features
+        ]
+        with unit_of_work() as unit:
+            saved = add_features(features, layer, "Kaavakohteiden tuonti") and (
+                not self._regulation_group_ids
+                or save_regulation_group_associations(
+                    self._regulation_group_ids,
+                    self.target_layer_name,
+                    [feature["id"] for feature in features],
+                )
+            )
+            if not saved:
+                unit.rollback()
+
+        if saved and unit.committed:
+            self._import_success_count += len(features)
+        else:
+            self._import_failed_count += len(features)
+        self._set_import_progress(self._imported_count)
+
+
+class PrepareImportFeaturesTask(QgsTask):
+    """
+    Reads a batch of the features to import from the source layer in a background thread.
+
+    Geometries are transformed to the target CRS and converted to multi type. The results are stored in
+    `prepared_features` as tuples of geometry and a dictionary of the requested attribute values. A task reads at
+    most `batch_size` features, `next_batch_task` returns the task reading the next batch. This way each batch can
+    be saved before the next one is read, and the whole source is never held in memory at once.
+    """
+
+    def __init__(
+        self,
+        source: QgsVectorLayerFeatureSource,
+        source_fields: QgsFields,
+        feature_ids: list[int] | None,
+        feature_count: int,
+        fields: list[str],
+        transform: QgsCoordinateTransform | None,
+        batch_size: int,
+    ):
+        super().__init__("Kaavakohteiden tuonti", QgsTask.CanCancel)
+        self.source = source
+        self.source_fields = source_fields
+        self.feature_ids = feature_ids  # None for all features of the source, read when the task runs
+        self.feature_count = feature_count
+        self.fields = fields
+        self.transform = transform
+        self.batch_size = batch_size
+
+        self.prepared_features: list[tuple[QgsGeometry, dict[str, Any]]] = []
+        self.remaining_feature_ids: list[int] = []
+        self.error: str | None = None
+
+    @classmethod
+    def for_layer(
+        cls,
+        source_layer: QgsVectorLayer,
+        feature_ids: list[int] | None,
+        fields: list[str],
+        target_crs: QgsCoordinateReferenceSystem,
+        batch_size: int,
+    ) -> PrepareImportFeaturesTask:
+        """Returns the task reading the first batch of the features, or of all features if `feature_ids` is None."""
+        transform = (
+            QgsCoordinateTransform(source_layer.crs(), target_crs, QgsProject.instance())
+            if source_layer.crs() != target_crs
+            else None
+        )
+        return cls(
+            QgsVectorLayerFeatureSource(source_layer),
+            source_layer.fields(),
+            feature_ids,
+            len(feature_ids) if feature_ids is not None else source_layer.featureCount(),
+            fields,
+            transform,
+            batch_size,
+        )
+
+    def next_batch_task(self) -> PrepareImportFeaturesTask | None:
+        """Returns the task reading the next batch of the features, or None if all features have been read."""
+        if not self.remaining_feature_ids:
+            return None
+        return PrepareImportFeaturesTask(
+            self.source,
+            self.source_fields,
+            self.remaining_feature_ids,
+            len(self.remaining_feature_ids),
+            self.fields,
+            self.transform,
+            self.batch_size,
+        )
+
+    def run(self) -> bool:
+        try:
+            feature_ids = self.feature_ids if self.feature_ids is not None else self._read_feature_ids()
+            batch_ids = feature_ids[: self.batch_size]
+            self.remaining_feature_ids = feature_ids[self.batch_size :]
+
+            request = QgsFeatureRequest().setFilterFids(batch_ids)
+            request.setSubsetOfAttributes(self.fields, self.source_fields)
+            for i, feature in enumerate(self.source.getFeatures(request)):
+                if self.isCanceled():
+                    return False
+
+                geometry = feature.geometry()
+                if self.transform is not None:
+                    geometry.transform(self.transform)
+                if not geometry.isMultipart():
+                    geometry.convertToMultiType()
+                self.prepared_features.append((geometry, {field: feature[field] for field in self.fields}))
+                self.setProgress(100 * (i + 1) / len(batch_ids))
+        except Exception as e:
+            logger.exception("Failed to prepare the features to import")
+            self.error = str(e) or type(e).__name__
+            return False
+
+        return not self.isCanceled()
+
+    def _read_feature_ids(self) -> list[int]:
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+        return [feature.id() for feature in self.source.getFeatures(request)]
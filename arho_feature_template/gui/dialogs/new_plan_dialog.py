@@ -90,7 +90,7 @@ class NewPlanDialog(QDialog, FormClass):  # type: ignore
             if self.previously_in_edit_mode:
                 self.plan_layer.rollBack()
             layer.setSubsetString(f"\"plan_matter_id\"='{active_plan_matter_id}'")  # set temporary filter
-            plans = PlanLayer.models_from_features(list(PlanLayer.get_features()))
+            plans = PlanLayer.models_from_features(list(PlanLayer.get_model_features()))
         finally:
             layer.setSubsetString(original_filter)  # restore filter
         return plans
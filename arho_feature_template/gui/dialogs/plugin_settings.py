@@ -24,6 +24,8 @@ class ArhoOptionsPage(QgsOptionsPageWidget, FormClass):  # type: ignore
         self.port: QgsSpinBox
         self.lambda_address: QLineEdit
         self.data_exchange_layer_enabled: QCheckBox
+        self.import_chunk_size: QgsSpinBox
+        self.code_cache_wait_timeout: QgsSpinBox
 
         # INIT
         self.load_settings()
@@ -33,6 +35,8 @@ class ArhoOptionsPage(QgsOptionsPageWidget, FormClass):  # type: ignore
         SettingsManager.set_proxy_port(self.port.value())
         SettingsManager.set_lambda_url(self.lambda_address.text())
         SettingsManager.set_data_exchange_layer_enabled(self.data_exchange_layer_enabled.isChecked())
+        SettingsManager.set_import_chunk_size(self.import_chunk_size.value())
+        SettingsManager.set_code_cache_wait_timeout(self.code_cache_wait_timeout.value())
 
         SettingsManager.finish()
 
@@ -41,6 +45,8 @@ class ArhoOptionsPage(QgsOptionsPageWidget, FormClass):  # type: ignore
         self.port.setValue(SettingsManager.get_proxy_port() or 0)
         self.lambda_address.setText(SettingsManager.get_lambda_url())
         self.data_exchange_layer_enabled.setChecked(SettingsManager.get_data_exchange_layer_enabled())
+        self.import_chunk_size.setValue(SettingsManager.get_import_chunk_size())
+        self.code_cache_wait_timeout.setValue(SettingsManager.get_code_cache_wait_timeout())
 
 
 class ArhoOptionsPageFactory(QgsOptionsWidgetFactory):
@@ -57,6 +57,18 @@ class NewFeatureDock(QgsDockWidget, DockClass):  # type: ignore
         self.library_selection.addItems([library.name for library in self.plan_feature_libraries])
         self.set_active_plan_feature_library(0)
 
+    def update_plan_feature_library(self, index: int, library: PlanFeatureLibrary):
+        """Replaces the library at the given index with a reloaded one, keeping the library selection."""
+        if not self.plan_feature_libraries or index >= len(self.plan_feature_libraries):
+            return
+
+        self.plan_feature_libraries[index] = library
+        self.library_selection.setItemText(index, library.name)
+        if index == self.library_selection.currentIndex():
+            self.clear_template_selection()
+            self.set_active_plan_feature_library(index)
+            self.filter_plan_feature_templates()
+
     def on_active_feature_type_changed(self, feature_name: str, layer_name: str):
         self.active_feature_type = feature_name if feature_name else None
         self.active_feature_layer = layer_name if layer_name else None
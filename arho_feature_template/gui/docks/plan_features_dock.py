@@ -1,10 +1,20 @@
 from __future__ import annotations
 
 from contextlib import suppress
+from dataclasses import replace
 from importlib import resources
-from typing import TYPE_CHECKING, Iterable, cast
-
-from qgis.core import Qgis, QgsApplication, QgsFeature, QgsProject, QgsVectorLayer
+from typing import TYPE_CHECKING, Any, Iterable, cast
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
 from qgis.gui import QgsDockWidget, QgsFilterLineEdit
 from qgis.PyQt import uic
 from qgis.PyQt.QtCore import (
@@ -15,14 +25,17 @@ from qgis.PyQt.QtCore import (
     QRegularExpression,
     QSortFilterProxyModel,
     Qt,
+    pyqtSignal,
 )
 from qgis.PyQt.QtGui import QStandardItem, QStandardItemModel
 from qgis.PyQt.QtWidgets import QMenu, QPushButton, QTableView
 
 from arho_feature_template.core.feature_editing import save_plan_feature
+from arho_feature_template.core.plan_graph_loader import load_plan_objects
 from arho_feature_template.exceptions import LayerNotFoundError
 from arho_feature_template.gui.dialogs.plan_feature_form import PlanObjectForm
 from arho_feature_template.project.layers.plan_layers import (
+    FeatureGeometry,
     LandUseAreaLayer,
     LineLayer,
     OtherAreaLayer,
@@ -31,19 +44,25 @@ from arho_feature_template.project.layers.plan_layers import (
     get_plan_feature_layer_class_by_model,
     plan_feature_layers,
 )
-from arho_feature_template.utils.misc_utils import iface
-from arho_feature_template.utils.project_utils import get_vector_layer_from_project
+from arho_feature_template.utils.misc_utils import get_active_plan_id, iface
 
 ui_path = resources.files(__package__) / "plan_features_dock.ui"
 FormClass, _ = uic.loadUiType(ui_path)
 
 if TYPE_CHECKING:
+    from qgis.core import QgsGeometry
+
     from arho_feature_template.core.models import PlanObject
     from arho_feature_template.core.plan_manager import PlanManager
 
 DATA_COLUMN = 0
 PLAN_OBJECT_TYPE_COLUMN = 1
 DATA_ROLE = Qt.UserRole
+# Rows are first populated without regulation groups, hydrated rows hold them too. Geometries are never held by the
+# rows but fetched from the layer when needed, see `_geometry_from_index`.
+HYDRATED_ROLE = Qt.UserRole + 1
+POPULATION_CHUNK_SIZE = 200
+POPULATION_ATTRIBUTES = ["id", "name", "description", "type_of_underground_id", "plan_id"]
 LAYER_NAME_TO_FEATURE_TYPE = {
     LineLayer.name: "Viiva",
     OtherAreaLayer.name: "Osa-alue",
@@ -89,6 +108,52 @@ class PlanObjectsDockFilterProxyModel(QSortFilterProxyModel):
         return text_match and type_match
 
 
+class PopulatePlanObjectsTask(QgsTask):
+    """
+    Reads the plan objects of the active plan from the plan feature layers in a background thread.
+
+    Only the attributes needed for the table rows are read. The rows are emitted in chunks with `rows_loaded` as
+    tuples of layer name, attribute values and QGIS feature ID.
+    """
+
+    rows_loaded = pyqtSignal(list)
+
+    def __init__(self, plan_id: str):
+        super().__init__("Kaavakohteiden lataus", QgsTask.CanCancel)
+        self.sources: list[tuple[str, QgsVectorLayerFeatureSource, QgsFeatureRequest]] = []
+        self.feature_count = 0
+        for layer_class in plan_feature_layers:
+            layer = layer_class.get_from_project()
+            request = QgsFeatureRequest()
+            request.setFilterExpression(layer_class.create_filter_expression("plan_id", plan_id))
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(POPULATION_ATTRIBUTES, layer.fields())
+            self.sources.append((layer.name(), QgsVectorLayerFeatureSource(layer), request))
+            self.feature_count += layer.featureCount()
+
+    def run(self) -> bool:
+        chunk: list[tuple[str, dict[str, Any], int]] = []
+        read_count = 0
+        for layer_name, source, request in self.sources:
+            for feature in source.getFeatures(request):
+                if self.isCanceled():
+                    return False
+
+                chunk.append(
+                    (layer_name, {attribute: feature[attribute] for attribute in POPULATION_ATTRIBUTES}, feature.id())
+                )
+                read_count += 1
+                if len(chunk) >= POPULATION_CHUNK_SIZE:
+                    self.rows_loaded.emit(chunk)
+                    chunk = []
+                    if self.feature_count > 0:
+                        self.setProgress(min(100, 100 * read_count / self.feature_count))
+
+        if chunk:
+            self.rows_loaded.emit(chunk)
+        return True
+
+
 class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
     def __init__(self, plan_manager_ref: PlanManager, parent=None):
         super().__init__(parent)
@@ -112,6 +177,7 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
         # table select -> trigger map select -> trigger table select.. etc.)
         self._syncing_selections = False
         self._initialized = False
+        self._population_task: PopulatePlanObjectsTask | None = None
 
         self.model = QStandardItemModel()
         self.model.setColumnCount(3)
@@ -152,6 +218,8 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
             vector_layer.committedAttributeValuesChanges.connect(self._on_feat_attributes_changed)
 
     def unload(self) -> None:
+        self._cancel_population()
+
         # Disconnect signals
         self.table.doubleClicked.disconnect(self._open_form)
         self.selection_model.selectionChanged.disconnect(self._on_table_selection_changed)
@@ -169,15 +237,42 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
                 vector_layer.committedAttributeValuesChanges.disconnect(self._on_feat_attributes_changed)
 
     def create_plan_feature_view(self):
+        self._cancel_population()
+
         # Clear table
         self.model.setRowCount(0)
 
-        # Add all plan features to table view
-        # Idea: add `get_models` method for all layer classes
-        for layer in plan_feature_layers:
-            features = list(layer.get_features())
-            for plan_feature_model, feature in zip(layer.models_from_features(features), features):
-                self._add_plan_feature_to_view(plan_feature_model, feature.id())
+        plan_id = get_active_plan_id()
+        if not plan_id:
+            return
+
+        # Rows are added in chunks as the task reads them, see `_on_population_rows_loaded`
+        self._population_task = PopulatePlanObjectsTask(plan_id)
+        self._population_task.rows_loaded.connect(self._on_population_rows_loaded)
+        self._population_task.taskCompleted.connect(self._on_population_finished)
+        self._population_task.taskTerminated.connect(self._on_population_finished)
+        QgsApplication.taskManager().addTask(self._population_task)
+
+    def _cancel_population(self):
+        if self._population_task is not None:
+            self._population_task.cancel()
+            self._population_task = None
+
+    def _on_population_rows_loaded(self, rows: list[tuple[str, dict[str, Any], int]]):
+        # Chunks of a cancelled task can still be queued when the plan has been changed
+        if self.sender() is not self._population_task:
+            return
+
+        for layer_name, row, feat_id in rows:
+            layer = get_plan_feature_layer_class_by_layer_name(layer_name)
+            self._add_plan_feature_to_view(layer.model_from_row(row, None, []), feat_id, hydrated=False)
+
+    def _on_population_finished(self):
+        if self.sender() is not self._population_task:
+            return
+
+        self._population_task = None
+        self.update_selected_rows()
 
     def update_selected_rows(self):
         self.selection_model.clearSelection()
@@ -189,8 +284,8 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
                 proxy_index = self.filter_proxy_model.index(row, 0)
                 self.selection_model.select(proxy_index, QItemSelectionModel.Select | QItemSelectionModel.Rows)
 
-    def _add_plan_feature_to_view(self, plan_feature_model: PlanObject, feat_id: int):
-        self.model.appendRow(self._plan_feature_into_items(plan_feature_model, feat_id))
+    def _add_plan_feature_to_view(self, plan_feature_model: PlanObject, feat_id: int, *, hydrated: bool = True):
+        self.model.appendRow(self._plan_feature_into_items(plan_feature_model, feat_id, hydrated=hydrated))
 
     def _remove_plan_feature_from_view(self, row: int):
         self.model.removeRow(row)
@@ -216,14 +311,19 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
 
         self.update_selected_rows()
 
-    def _update_row(self, row: int, plan_feature_model: PlanObject):
+    def _update_row(self, row: int, plan_feature_model: PlanObject, *, hydrated: bool = True):
+        if plan_feature_model.geom is not None:
+            plan_feature_model = replace(plan_feature_model, geom=None)
         self.model.item(row, 0).setText(plan_feature_model.name or "")
         self.model.item(row, 2).setText(plan_feature_model.description or "")
         # Feat ID remains the same
         feat_id = self.model.item(row, DATA_COLUMN).data(DATA_ROLE)[1]
         self.model.item(row, DATA_COLUMN).setData((plan_feature_model, feat_id), DATA_ROLE)
+        self.model.item(row, DATA_COLUMN).setData(hydrated, HYDRATED_ROLE)
 
-    def _plan_feature_into_items(self, plan_feature_model: PlanObject, feat_id: int) -> list[QStandardItem]:
+    def _plan_feature_into_items(
+        self, plan_feature_model: PlanObject, feat_id: int, *, hydrated: bool = True
+    ) -> list[QStandardItem]:
         items = [
             QStandardItem(plan_feature_model.name or ""),
             QStandardItem(LAYER_NAME_TO_FEATURE_TYPE.get(plan_feature_model.layer_name or "", "")),
@@ -232,6 +332,7 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
 
         # Set the whole PlanObject model and QGIS feature ID as data tuple
         items[DATA_COLUMN].setData((plan_feature_model, feat_id), DATA_ROLE)
+        items[DATA_COLUMN].setData(hydrated, HYDRATED_ROLE)
         return items
 
     def _data_from_index(self, proxy_index: QModelIndex) -> tuple[PlanObject, int] | None:
@@ -244,6 +345,33 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
         data = self._data_from_index(proxy_index)
         return data[0] if data else None
 
+    def _geometry_from_index(self, proxy_index: QModelIndex) -> FeatureGeometry | None:
+        data = self._data_from_index(proxy_index)
+        if not data:
+            return None
+        plan_feature_model, feat_id = data
+        return FeatureGeometry(get_plan_feature_layer_class_by_model(plan_feature_model), feat_id)
+
+    def _hydrated_plan_feature_from_index(self, proxy_index: QModelIndex) -> PlanObject | None:
+        """Returns the model of the row with its regulation groups, loading them if not loaded yet."""
+        row_items = self._row_items_from_index(proxy_index)
+        if len(row_items) == 0:
+            return None
+
+        item = row_items[DATA_COLUMN]
+        plan_feature_model, feat_id = item.data(DATA_ROLE)
+        if item.data(HYDRATED_ROLE):
+            return plan_feature_model
+
+        plan_objects = load_plan_objects(
+            cast(str, plan_feature_model.plan_id), [cast(str, plan_feature_model.id_)], with_geometries=False
+        )
+        if not plan_objects:
+            return None
+        item.setData((plan_objects[0], feat_id), DATA_ROLE)
+        item.setData(True, HYDRATED_ROLE)
+        return plan_objects[0]
+
     def _row_items_from_index(self, proxy_index: QModelIndex) -> list[QStandardItem]:
         if not proxy_index.isValid():
             return []
@@ -261,10 +389,15 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
         return None
 
     def _open_form(self, index: QModelIndex):
-        plan_feature_model = self._plan_feature_from_index(index)
-        if not plan_feature_model:
+        plan_feature_model = self._hydrated_plan_feature_from_index(index)
+        feature_geometry = self._geometry_from_index(index)
+        if not plan_feature_model or not feature_geometry:
             iface.messageBar().pushWarning("", "Kaavakohdetta ei löydetty.")
             return
+        geometry = self._load_geometry(feature_geometry)
+        if geometry is None:
+            return
+        plan_feature_model = replace(plan_feature_model, geom=geometry)
 
         form = PlanObjectForm(
             plan_feature=plan_feature_model,
@@ -272,18 +405,21 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
             regulation_group_libraries=self.plan_manager_ref.regulation_group_libraries,
             active_plan_regulation_groups_library=self.plan_manager_ref.active_plan_regulation_group_library,
         )
-        if form.exec():
+        with self.plan_manager_ref.library_updates_to(form.regulation_groups_view):
+            accepted = form.exec()
+        if accepted:
             updated_plan_feature_model = form.model
-            if save_plan_feature(updated_plan_feature_model) is not None:
-                # Update table row if saving was succesfull
+            if save_plan_feature(updated_plan_feature_model, original=plan_feature_model) is not None:
+                # Update table row if saving was succesfull. The saved model does not know the IDs of the
+                # inserted regulations etc., so it is reloaded before it is edited again.
                 model_index = self.filter_proxy_model.mapToSource(index)
                 row = model_index.row()
-                self._update_row(row, updated_plan_feature_model)
+                self._update_row(row, updated_plan_feature_model, hydrated=False)
 
     def _open_context_menu(self, pos: QPoint):
         index = self.table.indexAt(pos)
-        plan_feature_model = self._plan_feature_from_index(index)
-        if not plan_feature_model:
+        feature_geometry = self._geometry_from_index(index)
+        if not feature_geometry:
             return
 
         menu = QMenu()
@@ -293,43 +429,55 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
         menu.addAction(
             QgsApplication.getThemeIcon("mActionZoomTo.svg"),
             "Zoomaa kohteeseen",
-            lambda: self._on_zoom_to_feature(plan_feature_model),
+            lambda: self._on_zoom_to_feature(feature_geometry),
         )
         menu.addAction(
             QgsApplication.getThemeIcon("mActionPanTo.svg"),
             "Vieritä kohteeseen",
-            lambda: self._on_pan_to_feature(plan_feature_model),
+            lambda: self._on_pan_to_feature(feature_geometry),
         )
         menu.addAction(
             QgsApplication.getThemeIcon("mActionHighlightFeature.svg"),
             "Väläytä kohdetta",
-            lambda: self._on_highlight_feature(plan_feature_model),
+            lambda: self._on_highlight_feature(feature_geometry),
         )
         menu.exec_(self.table.viewport().mapToGlobal(pos))
 
-    def _on_zoom_to_feature(self, plan_feature_model: PlanObject):
-        layer_class = get_plan_feature_layer_class_by_model(plan_feature_model)
-        feat = layer_class.feature_from_model(plan_feature_model)
+    def _load_geometry(self, feature_geometry: FeatureGeometry) -> QgsGeometry | None:
+        geometry = feature_geometry.load()
+        if geometry is None:
+            iface.messageBar().pushWarning("", "Kaavakohteen geometriaa ei löydetty.")
+        return geometry
+
+    def _on_zoom_to_feature(self, feature_geometry: FeatureGeometry):
+        geometry = self._load_geometry(feature_geometry)
+        if geometry is None:
+            return
 
-        iface.mapCanvas().setExtent(feat.geometry().boundingBox().buffered(1000))
+        iface.mapCanvas().setExtent(geometry.boundingBox().buffered(1000))
         iface.mapCanvas().redrawAllLayers()
 
-    def _on_pan_to_feature(self, plan_feature_model: PlanObject):
-        layer_class = get_plan_feature_layer_class_by_model(plan_feature_model)
-        feat = layer_class.feature_from_model(plan_feature_model)
+    def _on_pan_to_feature(self, feature_geometry: FeatureGeometry):
+        geometry = self._load_geometry(feature_geometry)
+        if geometry is None:
+            return
 
-        iface.mapCanvas().setCenter(feat.geometry().centroid().asPoint())
+        iface.mapCanvas().setCenter(geometry.centroid().asPoint())
         iface.mapCanvas().redrawAllLayers()
 
-    def _on_highlight_feature(self, plan_feature_model: PlanObject):
-        iface.mapCanvas().flashGeometries(geometries=[plan_feature_model.geom])
+    def _on_highlight_feature(self, feature_geometry: FeatureGeometry):
+        geometry = self._load_geometry(feature_geometry)
+        if geometry is None:
+            return
+
+        iface.mapCanvas().flashGeometries(geometries=[geometry])
         iface.mapCanvas().redrawAllLayers()
 
     def _on_feats_added(self, layer_id: str, added_features: Iterable[QgsFeature]):
         vector_layer: QgsVectorLayer = QgsProject.instance().mapLayer(layer_id)
         layer = get_plan_feature_layer_class_by_layer_name(vector_layer.name())
         features = list(added_features)
-        for plan_feature_model, feat in zip(layer.models_from_features(features), features):
+        for plan_feature_model, feat in zip(layer.models_from_features(features, with_geometries=False), features):
             self._add_plan_feature_to_view(plan_feature_model, feat.id())
 
     def _on_feats_removed(self, layer_id: int, feature_ids: Iterable[int]):
@@ -356,7 +504,7 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
         vector_layer: QgsVectorLayer = QgsProject.instance().mapLayer(layer_id)
         layer = get_plan_feature_layer_class_by_layer_name(vector_layer.name())
         features = [vector_layer.getFeature(feat_id) for feat_id in changed_attribute_values_map]
-        for plan_feature_model in layer.models_from_features(features):
+        for plan_feature_model in layer.models_from_features(features, with_geometries=False):
             row = self._find_row_by_plan_feature_id(cast(str, plan_feature_model.id_))
             if row:
                 self._update_row(row, plan_feature_model)
@@ -396,7 +544,7 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
                     continue
                 plan_feature = data[0]
                 feat_id = data[1]
-                layer = get_vector_layer_from_project(cast(str, plan_feature.layer_name))
+                layer = get_plan_feature_layer_class_by_model(plan_feature).get_from_project()
                 layer.selectByIds([feat_id], Qgis.SelectBehavior.AddToSelection)
                 self.selected_plan_feature_ids.add(cast(str, plan_feature.id_))
 
@@ -407,7 +555,7 @@ class PlanObjectsDock(QgsDockWidget, FormClass):  # type: ignore
                     continue
                 plan_feature = data[0]
                 feat_id = data[1]
-                layer = get_vector_layer_from_project(cast(str, plan_feature.layer_name))
+                layer = get_plan_feature_layer_class_by_model(plan_feature).get_from_project()
                 layer.deselect(feat_id)
                 self.selected_plan_feature_ids.discard(cast(str, plan_feature.id_))
         finally:
@@ -1,39 +1,149 @@
 from __future__ import annotations
 
 from abc import ABC
-from typing import TYPE_CHECKING, Any, ClassVar, Generator, cast
+from contextlib import contextmanager, suppress
+from typing import TYPE_CHECKING, Any, ClassVar, Generator, Hashable, Iterator, cast
 
-from qgis.core import QgsFeatureRequest, QgsProject, QgsVectorLayer
+from qgis.core import QgsExpression, QgsFeature, QgsFeatureRequest, QgsProject, QgsVectorLayer
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import NULL
 
+from arho_feature_template.exceptions import LayerNotFoundError
+from arho_feature_template.utils.misc_utils import nulls_to_none
 from arho_feature_template.utils.project_utils import get_vector_layer_from_project
 
 if TYPE_CHECKING:
-    from qgis.core import QgsFeature
+    from collections.abc import Iterable
+
+    from qgis.core import QgsFields, QgsMapLayer
+
+# Value lists longer than this are split into several filter expressions whose results are merged. Very long
+# IN lists are slow to parse and may not be compiled to provider side SQL.
+MAX_FILTER_VALUES = 1000
+
+
+class LayerRegistry:
+    """
+    Keeps the project layer handles of the layer classes.
+
+    Each layer is looked up from the project by name once and the handle is reused until the project's layers
+    change (layers added or removed, project cleared) or the layer is renamed.
+    """
+
+    _layers: ClassVar[dict[type[AbstractLayer], QgsVectorLayer]] = {}
+    _project: ClassVar[QgsProject | None] = None
+
+    @classmethod
+    def get(cls, layer_class: type[AbstractLayer]) -> QgsVectorLayer:
+        cls._connect_project()
+        layer = cls._layers.get(layer_class)
+        # A renamed layer is no longer the layer of the class, so it is looked up again by name
+        if layer is not None and not sip.isdeleted(layer) and layer.name() == layer_class.name:
+            return layer
+
+        layer = get_vector_layer_from_project(layer_class.name)
+        cls._layers[layer_class] = layer
+        return layer
+
+    @classmethod
+    def clear(cls, *_args) -> None:
+        cls._layers = {}
+        AbstractLayer.reset_attribute_indexes()
+
+    @classmethod
+    def _connect_project(cls) -> None:
+        project = QgsProject.instance()
+        if project is cls._project:
+            return
+        cls.clear()
+        if project is not None:
+            project.layersAdded.connect(cls._on_layers_added)
+            project.layersWillBeRemoved.connect(cls._on_layers_will_be_removed)
+            project.cleared.connect(cls.clear)
+        cls._project = project
+
+    @classmethod
+    def _on_layers_added(cls, layers: list[QgsMapLayer]) -> None:
+        # A new layer with the same name may take precedence over the cached one, so rebind on next access
+        added_names = {layer.name() for layer in layers}
+        cls._layers = {
+            layer_class: layer for layer_class, layer in cls._layers.items() if layer_class.name not in added_names
+        }
+
+    @classmethod
+    def _on_layers_will_be_removed(cls, layer_ids: list[str]) -> None:
+        removed_ids = set(layer_ids)
+        AbstractLayer.reset_attribute_indexes(removed_ids)
+        cls._layers = {
+            layer_class: layer
+            for layer_class, layer in cls._layers.items()
+            if not sip.isdeleted(layer) and layer.id() not in removed_ids
+        }
 
 
 class AbstractLayer(ABC):
     name: ClassVar[str]
 
+    # Opt-in in-memory index for lookups by ID and by the attributes listed in `indexed_attributes`.
+    # The index is built lazily for the features currently visible on the layer and invalidated when
+    # the layer's features are committed or its filter changes. The index belongs to the layer object it was
+    # built from, a layer recreated with the same ID (for example when the project is reloaded) gets a new one.
+    use_attribute_index: ClassVar[bool] = False
+    indexed_attributes: ClassVar[tuple[str, ...]] = ()
+    _features_by_id: ClassVar[dict[str, QgsFeature] | None] = None
+    _ids_by_attribute_value: ClassVar[dict[str, dict[str | None, list[str]]]] = {}
+    _indexed_layer: ClassVar[QgsVectorLayer | None] = None
+
+    # Attributes read by the model builders of the layer (None reads all attributes) and whether they read the
+    # geometry. Used by `get_model_features` and `get_model_features_by_attribute_value`.
+    model_attributes: ClassVar[tuple[str, ...] | None] = None
+    model_needs_geometry: ClassVar[bool] = False
+
+    # Results of attribute value queries, shared by all layer classes while `memoize_queries` is active
+    _query_memo: ClassVar[dict[Hashable, list[Any]] | None] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._features_by_id = None
+        cls._ids_by_attribute_value = {}
+        cls._indexed_layer = None
+
     @classmethod
     def exists(cls) -> bool:
-        project = QgsProject.instance()
-        if not project:
+        try:
+            LayerRegistry.get(cls)
+        except LayerNotFoundError:
             return False
-
-        layers = project.mapLayersByName(cls.name)
-        if not layers:
-            return False
-
-        return bool([layer for layer in layers if isinstance(layer, QgsVectorLayer)])
+        return True
 
     @classmethod
     def get_from_project(cls) -> QgsVectorLayer:
-        return get_vector_layer_from_project(cls.name)
+        return LayerRegistry.get(cls)
 
     @classmethod
     def get_features(cls):
         return cls.get_from_project().getFeatures()
 
+    @classmethod
+    def get_model_features(cls) -> Generator[QgsFeature]:
+        """Returns the features of the layer with only the attributes and geometry its model builders need."""
+        layer = cls.get_from_project()
+        request = QgsFeatureRequest()
+        if not cls.model_needs_geometry:
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+        if cls.model_attributes is not None:
+            request.setSubsetOfAttributes(list(cls.model_attributes), layer.fields())
+        yield from layer.getFeatures(request)
+
+    @classmethod
+    def get_model_features_by_attribute_value(
+        cls, attribute: str, value: str | list | tuple | set | None
+    ) -> Generator[QgsFeature]:
+        """Same as `get_features_by_attribute_value` with the attributes and geometry of `get_model_features`."""
+        return cls.get_features_by_attribute_value(
+            attribute, value, no_geometries=not cls.model_needs_geometry, attributes=cls.model_attributes
+        )
+
     @classmethod
     def get_selected_features(cls, no_geometries: bool = True) -> Generator[QgsFeature]:  # noqa: FBT001, FBT002
         layer = cls.get_from_project()
@@ -51,18 +161,63 @@ class AbstractLayer(ABC):
         for feature in layer.getSelectedFeatures(request):
             yield feature["id"]
 
+    @classmethod
+    def get_fids_by_id(cls) -> dict[str, int]:
+        """Returns QGIS feature IDs of the features on the layer keyed by the 'id' attribute."""
+        layer = cls.get_from_project()
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(["id"], layer.fields())
+        return {feature["id"]: feature.id() for feature in layer.getFeatures(request)}
+
     @classmethod
     def get_features_by_attribute_value(
         cls,
         attribute: str,
         value: str | list | tuple | set | None,
         no_geometries: bool = True,  # noqa: FBT001, FBT002
+        attributes: Iterable[str] | None = None,
+    ) -> Generator[QgsFeature]:
+        """
+        Returns the features whose attribute matches the value.
+
+        If `attributes` is given, only those attributes are fetched and the other attributes of the returned
+        features are NULL.
+        """
+        attributes = tuple(attributes) if attributes is not None else None
+        memo = AbstractLayer._query_memo
+        if memo is None:
+            yield from cls._query_features_by_attribute_value(attribute, value, no_geometries, attributes)
+            return
+
+        key = (cls, "features", attribute, cls._memo_key(value), no_geometries, attributes)
+        if key not in memo:
+            memo[key] = list(cls._query_features_by_attribute_value(attribute, value, no_geometries, attributes))
+        yield from (QgsFeature(feature) for feature in memo[key])
+
+    @classmethod
+    def _query_features_by_attribute_value(
+        cls,
+        attribute: str,
+        value: str | list | tuple | set | None,
+        no_geometries: bool,  # noqa: FBT001
+        attributes: tuple[str, ...] | None,
     ) -> Generator[QgsFeature]:
         layer = cls.get_from_project()
-        request = QgsFeatureRequest().setFilterExpression(cls.create_filter_expression(attribute, value))
-        if no_geometries:
-            request.setFlags(QgsFeatureRequest.NoGeometry)
-        yield from layer.getFeatures(request)
+        if no_geometries and cls._can_use_attribute_index(layer, attribute):
+            features = cls._indexed_features(layer, attribute, value)
+            if attributes is None:
+                yield from (QgsFeature(feature) for feature in features)
+            else:
+                yield from cls._with_attribute_subset(features, layer.fields(), attributes)
+            return
+
+        for expression in cls.create_filter_expressions(attribute, value):
+            request = QgsFeatureRequest().setFilterExpression(expression)
+            if no_geometries:
+                request.setFlags(QgsFeatureRequest.NoGeometry)
+            if attributes is not None:
+                request.setSubsetOfAttributes(list(attributes), layer.fields())
+            yield from layer.getFeatures(request)
 
     @classmethod
     def get_feature_by_attribute_value(
@@ -77,15 +232,37 @@ class AbstractLayer(ABC):
     @classmethod
     def get_attribute_values_by_another_attribute_value(
         cls, target_attribute: str, filter_attribute: str, filter_value: str | list | tuple | set | None
+    ) -> Generator[Any]:
+        memo = AbstractLayer._query_memo
+        if memo is None:
+            yield from cls._query_attribute_values_by_another_attribute_value(
+                target_attribute, filter_attribute, filter_value
+            )
+            return
+
+        key = (cls, "values", target_attribute, filter_attribute, cls._memo_key(filter_value))
+        if key not in memo:
+            memo[key] = list(
+                cls._query_attribute_values_by_another_attribute_value(target_attribute, filter_attribute, filter_value)
+            )
+        yield from memo[key]
+
+    @classmethod
+    def _query_attribute_values_by_another_attribute_value(
+        cls, target_attribute: str, filter_attribute: str, filter_value: str | list | tuple | set | None
     ) -> Generator[Any]:
         layer = cls.get_from_project()
-        expression = cls.create_filter_expression(filter_attribute, filter_value)
+        if cls._can_use_attribute_index(layer, filter_attribute):
+            for feature in cls._indexed_features(layer, filter_attribute, filter_value):
+                yield feature[target_attribute]
+            return
 
-        request = QgsFeatureRequest().setFilterExpression(expression)
-        request.setSubsetOfAttributes([target_attribute], layer.fields())
-        request.setFlags(QgsFeatureRequest.NoGeometry)
-        for feature in layer.getFeatures(request):
-            yield feature[target_attribute]
+        for expression in cls.create_filter_expressions(filter_attribute, filter_value):
+            request = QgsFeatureRequest().setFilterExpression(expression)
+            request.setSubsetOfAttributes([target_attribute], layer.fields())
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            for feature in layer.getFeatures(request):
+                yield feature[target_attribute]
 
     @classmethod
     def get_attribute_value_by_another_attribute_value(
@@ -109,12 +286,184 @@ class AbstractLayer(ABC):
 
     @classmethod
     def create_filter_expression(cls, attribute: str, value: str | list | tuple | set | None) -> str:
+        column = QgsExpression.quotedColumnRef(attribute)
         if value is None:
-            expression = f'"{attribute}" IS NULL'
+            expression = f"{column} IS NULL"
         elif isinstance(value, str):
-            expression = f"\"{attribute}\"='{value}'"
+            expression = f"{column}={QgsExpression.quotedString(value)}"
         elif isinstance(value, (list, tuple, set)):
-            quoted_values = [f"'{val}'" for val in value]
-            expression = f'"{attribute}" IN ({", ".join(map(str, quoted_values))})'
+            quoted_values = [QgsExpression.quotedString(str(val)) for val in value]
+            expression = f"{column} IN ({', '.join(quoted_values)})"
 
         return expression
+
+    @classmethod
+    def create_filter_expressions(cls, attribute: str, value: str | list | tuple | set | None) -> list[str]:
+        """
+        Returns the filter expressions matching the value, splitting value lists into chunks of `MAX_FILTER_VALUES`.
+
+        Duplicate values are dropped so that the results of the expressions do not overlap. An empty value list
+        gives no expressions.
+        """
+        if not isinstance(value, (list, tuple, set)):
+            return [cls.create_filter_expression(attribute, value)]
+
+        values = list(dict.fromkeys(value))
+        return [
+            cls.create_filter_expression(attribute, values[i : i + MAX_FILTER_VALUES])
+            for i in range(0, len(values), MAX_FILTER_VALUES)
+        ]
+
+    @staticmethod
+    def rows_from_features(features: Iterable[QgsFeature]) -> list[dict[str, Any]]:
+        """
+        Returns the attributes of the features as dicts with NULLs converted to None.
+
+        The features must come from the same layer, since the field names are resolved only from the first one.
+        """
+        rows = []
+        field_names = None
+        for feature in features:
+            if field_names is None:
+                field_names = feature.fields().names()
+            rows.append(dict(zip(field_names, nulls_to_none(feature.attributes()))))
+        return rows
+
+    @staticmethod
+    @contextmanager
+    def memoize_queries() -> Iterator[None]:
+        """
+        Memoizes attribute value queries of all layers for the duration of the context.
+
+        Meant for read-only work such as building models and opening forms, where the same lookups are
+        repeated many times. Nested contexts share the memo of the outermost one.
+        """
+        if AbstractLayer._query_memo is not None:
+            yield
+            return
+
+        AbstractLayer._query_memo = {}
+        try:
+            yield
+        finally:
+            AbstractLayer._query_memo = None
+
+    @staticmethod
+    def _memo_key(value: str | list | tuple | set | None) -> Hashable:
+        if isinstance(value, set):
+            return frozenset(value)
+        if isinstance(value, (list, tuple)):
+            return tuple(value)
+        return value
+
+    @classmethod
+    def invalidate_attribute_index(cls, *_args) -> None:
+        """Drops the attribute index. Connected to the layer signals that signify changed layer content."""
+        cls._features_by_id = None
+        cls._ids_by_attribute_value = {}
+
+    @classmethod
+    def reset_attribute_index(cls) -> None:
+        """Drops the attribute index and disconnects it from the layer it was built from."""
+        layer = cls._indexed_layer
+        if layer is not None and not sip.isdeleted(layer):
+            for signal in cls._invalidating_signals(layer):
+                with suppress(TypeError):
+                    signal.disconnect(cls.invalidate_attribute_index)
+        cls._indexed_layer = None
+        cls.invalidate_attribute_index()
+
+    @staticmethod
+    def reset_attribute_indexes(layer_ids: set[str] | None = None) -> None:
+        """Resets the attribute indexes of all layer classes, or of those indexing one of the given layers."""
+        layer_classes = AbstractLayer.__subclasses__()
+        while layer_classes:
+            layer_class = layer_classes.pop()
+            layer_classes.extend(layer_class.__subclasses__())
+
+            layer = layer_class.__dict__.get("_indexed_layer")
+            if layer is None:
+                continue
+            if layer_ids is None or sip.isdeleted(layer) or layer.id() in layer_ids:
+                layer_class.reset_attribute_index()
+
+    @staticmethod
+    def _invalidating_signals(layer: QgsVectorLayer) -> list:
+        return [
+            layer.committedFeaturesAdded,
+            layer.committedFeaturesRemoved,
+            layer.committedAttributeValuesChanges,
+            layer.subsetStringChanged,
+        ]
+
+    @classmethod
+    def _can_use_attribute_index(cls, layer: QgsVectorLayer, attribute: str) -> bool:
+        # Uncommitted edits are not in the index, so the provider is queried while the edit buffer has changes
+        return (
+            cls.use_attribute_index
+            and (attribute == "id" or attribute in cls.indexed_attributes)
+            and not layer.isModified()
+        )
+
+    @classmethod
+    def _is_indexed_layer(cls, layer: QgsVectorLayer) -> bool:
+        return cls._indexed_layer is layer and not sip.isdeleted(layer)
+
+    @classmethod
+    def _build_attribute_index(cls, layer: QgsVectorLayer) -> None:
+        if not cls._is_indexed_layer(layer):
+            cls.reset_attribute_index()
+            for signal in cls._invalidating_signals(layer):
+                signal.connect(cls.invalidate_attribute_index)
+            cls._indexed_layer = layer
+
+        features_by_id: dict[str, QgsFeature] = {}
+        ids_by_attribute_value: dict[str, dict[str | None, list[str]]] = {
+            attribute: {} for attribute in cls.indexed_attributes
+        }
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        for feature in layer.getFeatures(request):
+            id_ = feature["id"]
+            features_by_id[id_] = feature
+            for attribute, ids_by_value in ids_by_attribute_value.items():
+                ids_by_value.setdefault(cls._index_key(feature[attribute]), []).append(id_)
+
+        cls._features_by_id = features_by_id
+        cls._ids_by_attribute_value = ids_by_attribute_value
+
+    @classmethod
+    def _indexed_features(
+        cls, layer: QgsVectorLayer, attribute: str, value: str | list | tuple | set | None
+    ) -> Iterable[QgsFeature]:
+        if cls._features_by_id is None or not cls._is_indexed_layer(layer):
+            cls._build_attribute_index(layer)
+        features_by_id = cast(dict, cls._features_by_id)
+
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        # Each feature is returned once like from the provider query, even if its value is listed several times
+        keys = list(dict.fromkeys(cls._index_key(val) for val in values))
+        if attribute == "id":
+            return [features_by_id[key] for key in keys if key in features_by_id]
+
+        ids_by_value = cls._ids_by_attribute_value[attribute]
+        return [features_by_id[id_] for key in keys for id_ in ids_by_value.get(key, [])]
+
+    @staticmethod
+    def _with_attribute_subset(
+        features: Iterable[QgsFeature], fields: QgsFields, attributes: tuple[str, ...]
+    ) -> Generator[QgsFeature]:
+        """Returns copies of the features with the attributes not in `attributes` set to NULL, like a subset request."""
+        indexes = {fields.lookupField(attribute) for attribute in attributes}
+        for feature in features:
+            subset_feature = QgsFeature(feature)
+            subset_feature.setAttributes(
+                [value if i in indexes else NULL for i, value in enumerate(feature.attributes())]
+            )
+            yield subset_feature
+
+    @staticmethod
+    def _index_key(value: Any) -> str | None:
+        # Filter expressions compare values as quoted strings, so the index does the same
+        if value is None or value == NULL:
+            return None
+        return str(value)
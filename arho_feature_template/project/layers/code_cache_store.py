@@ -0,0 +1,122 @@
+"""
+Persists the code layer caches in the user profile so that they can be reused across QGIS sessions.
+
+The codes of all layers from the same database connection and schema are stored in one JSON file together with
+the state of the layer (row count and latest `modified_at`) at the time the codes were read. Comparing the stored
+state with the current state tells whether the stored codes are up to date, and the stored `modified_at` works as
+a watermark for fetching only the rows modified since.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from qgis.core import QgsApplication, QgsDataSourceUri
+from qgis.PyQt.QtCore import NULL, QDateTime, Qt
+
+from arho_feature_template.utils.misc_utils import null_to_none
+
+if TYPE_CHECKING:
+    from qgis.core import QgsVectorLayer
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = "arho_code_cache"
+CACHE_FORMAT_VERSION = 1
+WATERMARK_ATTRIBUTE = "modified_at"
+
+# Layers of the same database share a cache file
+_file_lock = threading.Lock()
+
+
+def read_cached_codes(layer: QgsVectorLayer) -> tuple[dict[str, dict[str, Any]], dict[str, Any]] | None:
+    """Returns the stored codes of the layer and the state of the layer they were read in, or None."""
+    stored = _read_cache_file(cache_file_path(layer)).get(_layer_key(layer))
+    if not stored:
+        return None
+
+    codes = {
+        id_: {attribute: NULL if value is None else value for attribute, value in attributes.items()}
+        for id_, attributes in stored["codes"].items()
+    }
+    return codes, stored["state"]
+
+
+def write_cached_codes(layer: QgsVectorLayer, codes: dict[str, dict[str, Any]], state: dict[str, Any]) -> None:
+    """Stores the codes of the layer together with the state of the layer they were read in."""
+    entry = {
+        "state": state,
+        "codes": {
+            id_: {attribute: null_to_none(value) for attribute, value in attributes.items()}
+            for id_, attributes in codes.items()
+        },
+    }
+    try:
+        json.dumps(entry)
+    except (TypeError, ValueError):
+        logger.warning("Codes of layer %s can not be stored to the code cache", layer.name())
+        return
+
+    path = cache_file_path(layer)
+    with _file_lock:
+        data = _read_cache_file(path)
+        data[_layer_key(layer)] = entry
+        _write_cache_file(path, data)
+
+
+def layer_state(layer: QgsVectorLayer) -> dict[str, Any]:
+    """Returns the row count and the latest `modified_at` of the layer, both cheap to query from the provider."""
+    watermark = None
+    field_index = layer.fields().indexOf(WATERMARK_ATTRIBUTE)
+    if field_index >= 0:
+        value = layer.maximumValue(field_index)
+        if isinstance(value, QDateTime):
+            watermark = value.toString(Qt.ISODateWithMs)
+        elif value is not None and value != NULL:
+            watermark = str(value)
+    return {"count": layer.featureCount(), "watermark": watermark}
+
+
+def cache_file_path(layer: QgsVectorLayer) -> Path:
+    uri = QgsDataSourceUri(layer.source())
+    key = hashlib.sha1(  # noqa: S324
+        f"{layer.providerType()}|{uri.connectionInfo(False)}|{uri.schema()}".encode()
+    ).hexdigest()
+    return Path(QgsApplication.qgisSettingsDirPath()) / CACHE_DIR_NAME / f"{key}.json"
+
+
+def _layer_key(layer: QgsVectorLayer) -> str:
+    uri = QgsDataSourceUri(layer.source())
+    return uri.table() or layer.name()
+
+
+def _read_cache_file(path: Path) -> dict[str, Any]:
+    try:
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        logger.warning("Could not read code cache file %s", path)
+        return {}
+
+    if data.get("version") != CACHE_FORMAT_VERSION:
+        return {}
+    return data.get("layers", {})
+
+
+def _write_cache_file(path: Path, layers: dict[str, Any]) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_FORMAT_VERSION, "layers": layers}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Could not write code cache file %s", path)
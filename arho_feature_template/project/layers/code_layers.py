@@ -3,17 +3,27 @@ from __future__ import annotations
 import enum
 import logging
 import os
+from contextlib import suppress
+from dataclasses import dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, ClassVar, cast
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Hashable, cast
 
 import yaml
+from qgis.core import QgsExpression, QgsFeatureRequest
+from qgis.PyQt.QtCore import NULL
 
 from arho_feature_template.exceptions import ConfigSyntaxError, LayerNameNotFoundError
 from arho_feature_template.project.layers import AbstractLayer
+from arho_feature_template.project.layers.code_cache_store import (
+    WATERMARK_ATTRIBUTE,
+    layer_state,
+    read_cached_codes,
+    write_cached_codes,
+)
 from arho_feature_template.qgis_plugin_tools.tools.resources import resources_path
 
 if TYPE_CHECKING:
-    from qgis.core import QgsFeature
+    from qgis.core import QgsFeature, QgsVectorLayer
 
     from arho_feature_template.core.models import AttributeValue
 
@@ -27,16 +37,42 @@ class PlanType(str, enum.Enum):
     TOWN = "town"
 
 
+@dataclass
+class CodeCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    # Misses the database could answer, meaning the cache was missing an existing code
+    db_fallbacks: int = 0
+
+    def count_db_fallback(self, value: Any) -> Any:
+        """Counts a database lookup made after a miss if it found the value, and returns the value."""
+        if value is not None:
+            self.db_fallbacks += 1
+        return value
+
+
 class AbstractCodeLayer(AbstractLayer):
     _cache: ClassVar[dict[str, dict[str, Any]]] = {}
     _attributes_to_leave_out_from_cache: ClassVar[list[str]] = ["created_at", "modified_at"]
     _field_names: ClassVar[list[str]] = []
+    # Reverse indexes of `_cache` (attribute name -> attribute value -> ID of the first code with the value),
+    # built lazily per attribute and dropped whenever `_cache` changes
+    _ids_by_value: ClassVar[dict[str, dict[Hashable, str] | None]] = {}
+    # State of the layer (row count and latest `modified_at`) when `_cache` was read, see `code_cache_store`
+    _cache_state: ClassVar[dict[str, Any] | None] = None
+    # Set while the cache is being built in the background (see `CodeCacheLoader`), waits for the build to finish
+    _pending_cache_load: ClassVar[Callable[[], None] | None] = None
+    cache_statistics: ClassVar[CodeCacheStatistics] = CodeCacheStatistics()
     category_only_codes: ClassVar[list[str]] = []
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls._cache = {}
         cls._field_names = []
+        cls._ids_by_value = {}
+        cls._cache_state = None
+        cls._pending_cache_load = None
+        cls.cache_statistics = CodeCacheStatistics()
 
     @classmethod
     def build_cache(cls):
@@ -46,29 +82,148 @@ class AbstractCodeLayer(AbstractLayer):
         Iterates features of the layer and stores found attributes to `_cache` class var dictionary (keys are
         code feature IDs, values are dictionaries where keys are attribute names and values are attribute values).
 
+        The codes are read from the persistent code cache in the user profile if they are still up to date there,
+        otherwise from the layer, after which the persistent code cache is updated.
+
         The built cache dictionary can be accessed with method `get_attribute_dict`.
         """
-        cls._field_names = cls.get_from_project().fields().names()
-        for feat in cls.get_from_project().getFeatures():
-            cls._cache_feature(feat)
+        cls.set_cache(*cls.read_codes(cls.get_from_project()))
+
+    @classmethod
+    def refresh_cache(cls, *, full: bool = False):
+        """
+        Brings the cache up to date with the layer.
+
+        By default only the codes modified after the stored `modified_at` watermark are read from the layer, and
+        all codes are read only if codes have been deleted. With `full`, all codes are read from the layer.
+        """
+        cls._wait_for_pending_cache_load()
+        cls.set_cache(*cls.read_codes(cls.get_from_project(), use_stored_codes=not full))
+
+    @classmethod
+    def clear_cache(cls):
+        """Empties the cache. The cache is built again when it is needed next time."""
+        cls._pending_cache_load = None
+        cls._cache = {}
+        cls._ids_by_value = {}
+        cls._cache_state = None
+
+    @classmethod
+    def read_codes(
+        cls,
+        layer: QgsVectorLayer,
+        *,
+        use_stored_codes: bool = True,
+    ) -> tuple[dict[str, dict[str, Any]], dict[str, Any]]:
+        """
+        Reads the codes of the layer in the format of `_cache` and the state of the layer they were read in.
+
+        Codes stored in the persistent code cache are used if they are up to date. If they are out of date, only
+        the codes modified after the stored watermark are read from the layer, unless codes have been deleted.
+        The persistent code cache is updated with the result.
+
+        Does not touch the class state, so it can be called from a background thread with a layer created in
+        that thread.
+        """
+        state = layer_state(layer)
+        stored = read_cached_codes(layer) if use_stored_codes else None
+        if stored is not None:
+            stored_codes, stored_state = stored
+            if stored_state == state:
+                return stored_codes, state
+
+            if stored_state.get("watermark") is not None and state.get("watermark") is not None:
+                codes = {**stored_codes, **cls._read_codes_modified_after(layer, stored_state["watermark"])}
+                # Deleted codes can not be detected from the modified codes, so read all codes in that case
+                if len(codes) == state["count"]:
+                    write_cached_codes(layer, codes, state)
+                    return codes, state
+
+        field_names = layer.fields().names()
+        codes = {feat["id"]: cls._attributes_from_feature(feat, field_names) for feat in layer.getFeatures()}
+        write_cached_codes(layer, codes, state)
+        return codes, state
+
+    @classmethod
+    def _read_codes_modified_after(cls, layer: QgsVectorLayer, watermark: str) -> dict[str, dict[str, Any]]:
+        field_names = layer.fields().names()
+        expression = f"{QgsExpression.quotedColumnRef(WATERMARK_ATTRIBUTE)} > {QgsExpression.quotedString(watermark)}"
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        return {feat["id"]: cls._attributes_from_feature(feat, field_names) for feat in layer.getFeatures(request)}
+
+    @classmethod
+    def set_cache(cls, codes: dict[str, dict[str, Any]], state: dict[str, Any] | None = None):
+        """Replaces the cache with codes read by `read_codes`."""
+        cls._pending_cache_load = None
+        cls._cache = codes
+        cls._ids_by_value = {}
+        cls._cache_state = state
+        cls._initialize_cache()
+
+    @classmethod
+    def _initialize_cache(cls):
+        """Hook for adding attributes that do not come from the layer to the built cache."""
 
     @classmethod
     def _cache_feature(cls, feat: QgsFeature):
         if len(cls._field_names) == 0:
             cls._field_names = cls.get_from_project().fields().names()
 
+        id_ = feat["id"]
+        if cls._cache.get(id_):
+            logger.info("Resaving feature (ID %s) to cache for layer %s", id_, cls.name)
+        cls._cache[id_] = cls._attributes_from_feature(feat, cls._field_names)
+        cls._ids_by_value = {}
+
+    @classmethod
+    def _attributes_from_feature(cls, feat: QgsFeature, field_names: list[str]) -> dict[str, Any]:
         attribute_dict = {}
-        for attribute in cls._field_names:
+        for attribute in field_names:
             if attribute in cls._attributes_to_leave_out_from_cache:
                 continue
             # NOTE: 'feat.attribute(attribute)' returns None if attribute is not found
             attribute_value_to_cache = feat[attribute]
             attribute_dict[attribute] = attribute_value_to_cache
+        return attribute_dict
 
-        id_ = feat["id"]
-        if cls._cache.get(id_):
-            logger.info("Resaving feature (ID %s) to cache for layer %s", id_, cls.name)
-        cls._cache[id_] = attribute_dict
+    @classmethod
+    def _wait_for_pending_cache_load(cls):
+        pending_cache_load = cls._pending_cache_load
+        if pending_cache_load is not None:
+            cls._pending_cache_load = None
+            pending_cache_load()
+
+    @classmethod
+    def _cached_id_by_attribute(cls, attribute: str, attribute_value: Any) -> str | None:
+        """Returns the ID of the first cached code whose attribute matches the value."""
+        if attribute not in cls._ids_by_value:
+            cls._ids_by_value[attribute] = cls._build_value_index(attribute)
+
+        ids_by_value = cls._ids_by_value[attribute]
+        if ids_by_value is not None and attribute_value is not None:
+            with suppress(TypeError):  # Unhashable value, fall back to linear search
+                return ids_by_value.get(attribute_value)
+
+        for id_, attribute_data in cls._cache.items():
+            if attribute_data[attribute] == attribute_value:
+                return id_
+        return None
+
+    @classmethod
+    def _build_value_index(cls, attribute: str) -> dict[Hashable, str] | None:
+        """Returns None if the attribute has unhashable values (e.g. localized text dictionaries)."""
+        ids_by_value: dict[Hashable, str] = {}
+        for id_, attribute_data in cls._cache.items():
+            value = attribute_data[attribute]
+            # NULL values are left to the linear search
+            if value is None or value == NULL:
+                continue
+            try:
+                ids_by_value.setdefault(value, id_)
+            except TypeError:
+                return None
+        return ids_by_value
 
     @classmethod
     def get_attribute_dict(cls) -> dict[str, dict[str, Any]]:
@@ -77,6 +232,7 @@ class AbstractCodeLayer(AbstractLayer):
 
         If cache does not exist yet, will build it first and return it then.
         """
+        cls._wait_for_pending_cache_load()
         # NOTE: If we build cache partially, we might return only part of features
         if not cls.cache_exists():
             cls.build_cache()
@@ -90,32 +246,42 @@ class AbstractCodeLayer(AbstractLayer):
     @classmethod
     def get_id_by_attribute(cls, attribute: str, attribute_value: str) -> str | None:
         """Tries to retrieve ID by attribute from cache, accesses DB if attribute not cachced."""
-        for _id, attribute_data in cls._cache.items():
-            if attribute_data[attribute] == attribute_value:
-                return _id
+        cls._wait_for_pending_cache_load()
+        id_ = cls._cached_id_by_attribute(attribute, attribute_value)
+        if id_ is not None:
+            cls.cache_statistics.hits += 1
+            return id_
 
-        return super().get_id_by_attribute(attribute, attribute_value)
+        cls.cache_statistics.misses += 1
+        return cls.cache_statistics.count_db_fallback(super().get_id_by_attribute(attribute, attribute_value))
 
     @classmethod
     def get_attribute_by_id(cls, target_attribute: str, id_: str) -> Any | None:
         """Tries to retrieve attribute by ID from cache, accesses DB if attribute not cachced."""
+        cls._wait_for_pending_cache_load()
         attribute_value = cls._cache.get(id_, {}).get(target_attribute, "not_found")
         # Attribute value could be None and we don't want to access DB in that without a need
         if attribute_value != "not_found":
+            cls.cache_statistics.hits += 1
             return attribute_value
 
-        return super().get_attribute_by_id(target_attribute, id_)
+        cls.cache_statistics.misses += 1
+        return cls.cache_statistics.count_db_fallback(super().get_attribute_by_id(target_attribute, id_))
 
     @classmethod
     def get_attributes_by_id(cls, id_: str) -> dict[str, Any]:
         """Will cache the queried feature as a side effect if not already present in cached."""
+        cls._wait_for_pending_cache_load()
         attributes = cls._cache.get(id_, {})
         if attributes:
+            cls.cache_statistics.hits += 1
             return attributes
 
+        cls.cache_statistics.misses += 1
         feat = cls.get_feature_by_id(id_)
         if not feat:
             return {}
+        cls.cache_statistics.db_fallbacks += 1
         cls._cache_feature(feat)
         return cls._cache[id_]
 
@@ -123,11 +289,16 @@ class AbstractCodeLayer(AbstractLayer):
     def get_attribute_value_by_another_attribute_value(
         cls, target_attribute: str, filter_attribute: str, filter_value: str
     ) -> Any | None:
-        for attribute_data in cls._cache.values():
-            if attribute_data[filter_attribute] == filter_value:
-                return attribute_data[target_attribute]
+        cls._wait_for_pending_cache_load()
+        id_ = cls._cached_id_by_attribute(filter_attribute, filter_value)
+        if id_ is not None:
+            cls.cache_statistics.hits += 1
+            return cls._cache[id_][target_attribute]
 
-        return super().get_attribute_value_by_another_attribute_value(target_attribute, filter_attribute, filter_value)
+        cls.cache_statistics.misses += 1
+        return cls.cache_statistics.count_db_fallback(
+            super().get_attribute_value_by_another_attribute_value(target_attribute, filter_attribute, filter_value)
+        )
 
 
 class PlanTypeLayer(AbstractCodeLayer):
@@ -199,8 +370,7 @@ class AdditionalInformationTypeLayer(AbstractCodeLayer):
     ]
 
     @classmethod
-    def build_cache(cls):
-        super().build_cache()
+    def _initialize_cache(cls):
         configs = cls.read_additional_information_configs()
         cls.initialize_from_additional_information_config(configs)
 
@@ -244,10 +414,13 @@ class AdditionalInformationTypeLayer(AbstractCodeLayer):
 
     @classmethod
     def get_default_value_by_id(cls, id_: str) -> AttributeValue | None:
+        cls._wait_for_pending_cache_load()
         attribute_value = cls._cache.get(id_, {}).get("default_value", "not_found")
         # Attribute value could be None and we don't want to access DB in that without a need
         if attribute_value != "not_found":
+            cls.cache_statistics.hits += 1
             return attribute_value
+        cls.cache_statistics.misses += 1
         return None
 
 
@@ -294,8 +467,7 @@ class PlanRegulationTypeLayer(AbstractCodeLayer):
     ]
 
     @classmethod
-    def build_cache(cls):
-        super().build_cache()
+    def _initialize_cache(cls):
         configs = cls.read_regulation_configs()
         cls.initialize_from_regulation_config(configs)
 
@@ -344,10 +516,13 @@ class PlanRegulationTypeLayer(AbstractCodeLayer):
 
     @classmethod
     def get_default_value_by_id(cls, id_: str) -> AttributeValue | None:
+        cls._wait_for_pending_cache_load()
         attribute_value = cls._cache.get(id_, {}).get("default_value", "not_found")
         # Attribute value could be None and we don't want to access DB in that without a need
         if attribute_value != "not_found":
+            cls.cache_statistics.hits += 1
             return attribute_value
+        cls.cache_statistics.misses += 1
         return None
 
 
@@ -394,3 +569,15 @@ class LegalEffectsLayer(AbstractCodeLayer):
 
 
 code_layers = AbstractCodeLayer.__subclasses__()
+
+
+def log_code_cache_statistics():
+    for layer_class in code_layers:
+        statistics = layer_class.cache_statistics
+        logger.info(
+            "Code cache of layer %s: %d hits, %d misses, %d DB fallbacks",
+            layer_class.name,
+            statistics.hits,
+            statistics.misses,
+            statistics.db_fallbacks,
+        )
@@ -5,9 +5,9 @@ from abc import abstractmethod
 from collections import defaultdict
 from string import Template
 from textwrap import dedent
-from typing import Any, ClassVar, Generator, cast
+from typing import TYPE_CHECKING, Any, ClassVar, Generator, cast
 
-from qgis.core import QgsFeature, QgsVectorLayerUtils
+from qgis.core import QgsFeature, QgsFeatureRequest, QgsVectorLayerUtils
 
 from arho_feature_template.core.models import (
     AdditionalInformation,
@@ -30,8 +30,27 @@ from arho_feature_template.utils.misc_utils import (
     serialize_localized_text,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from qgis.core import QgsGeometry
+
 logger = logging.getLogger(__name__)
 
+ATTRIBUTE_VALUE_ATTRIBUTES = (
+    "value_data_type",
+    "numeric_value",
+    "numeric_range_min",
+    "numeric_range_max",
+    "unit",
+    "text_value",
+    "text_syntax",
+    "code_list",
+    "code_value",
+    "code_title",
+    "height_reference_point",
+)
+
 
 class AbstractFeatureLayer(AbstractLayer):
     filter_template: ClassVar[Template | None]
@@ -105,6 +124,39 @@ class AbstractPlanMatterLayer(AbstractFeatureLayer):
         cls.apply_filter(filter_expression)
 
 
+class AbstractAssociationLayer(AbstractPlanLayer):
+    """Base class for layers whose features associate a feature (owner) with another feature or code (target)."""
+
+    @classmethod
+    def feature_from_model(cls, model: Any) -> QgsFeature:
+        msg = f"Layer {cls.name} has no model, use 'association_from' to create associations"
+        raise NotImplementedError(msg)
+
+    @classmethod
+    def get_associations_by_pair(
+        cls, owner_attribute: str, target_attribute: str, owner_ids: Iterable[str]
+    ) -> defaultdict[tuple[str, str], list[QgsFeature]]:
+        """Returns the associations of the given owners keyed by (owner ID, target ID) with a single query."""
+        associations: defaultdict[tuple[str, str], list[QgsFeature]] = defaultdict(list)
+        owner_ids = list(owner_ids)
+        if not owner_ids:
+            return associations
+
+        features = cls.get_features_by_attribute_value(
+            owner_attribute, owner_ids, attributes=(owner_attribute, target_attribute)
+        )
+        for feature in features:
+            associations[(feature[owner_attribute], feature[target_attribute])].append(feature)
+        return associations
+
+    @classmethod
+    def association_from(cls, owner_attribute: str, owner_id: str, target_attribute: str, target_id: str) -> QgsFeature:
+        feature = QgsVectorLayerUtils.createFeature(cls.get_from_project())
+        feature[owner_attribute] = owner_id
+        feature[target_attribute] = target_id
+        return feature
+
+
 class PlanMatterLayer(AbstractPlanMatterLayer):
     name = "Kaava-asia"
     filter_template = Template("id = '$plan_matter_id'")
@@ -166,6 +218,8 @@ class PlanMatterLayer(AbstractPlanMatterLayer):
 class PlanLayer(AbstractPlanLayer):
     name = "Kaavasuunnitelma"
     filter_template = Template("id = '$plan_id'")
+    model_attributes = ("id", "name", "description", "scale", "lifecycle_status_id", "plan_matter_id")
+    model_needs_geometry = True
 
     @classmethod
     def feature_from_model(cls, model: Plan) -> QgsFeature:
@@ -185,66 +239,26 @@ class PlanLayer(AbstractPlanLayer):
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> Plan:
-        group_ids = list(RegulationGroupAssociationLayer.get_group_ids_for_feature(feature["id"], cls.name))
-        general_regulation_features = list(RegulationGroupLayer.get_features_by_attribute_value("id", group_ids))
-
-        return Plan(
-            geom=feature.geometry(),
-            name=deserialize_localized_text(feature["name"]),
-            description=deserialize_localized_text(feature["description"]),
-            scale=feature["scale"],
-            lifecycle_status_id=feature["lifecycle_status_id"],
-            general_regulations=RegulationGroupLayer.models_from_features(general_regulation_features),
-            legal_effect_ids=list(LegalEffectAssociationLayer.get_legal_effect_ids_for_plan(feature["id"])),
-            documents=[
-                DocumentLayer.model_from_feature(feat)
-                for feat in DocumentLayer.get_features_by_attribute_value("plan_id", feature["id"])
-            ],
-            id_=feature["id"],
-            plan_matter_id=feature["plan_matter_id"],
-            modified=False,
-        )
+        return cls.models_from_features([feature])[0]
 
     @classmethod
     def models_from_features(cls, features: list[QgsFeature]) -> list[Plan]:
-        # General regulation groups
-        # COPIED FROM PlanObject's models_from_features
         plan_ids = {feat["id"] for feat in features}
-        plan_object_field_name = RegulationGroupAssociationLayer.layer_name_to_attribute_map.get(cls.name)
-        if not plan_object_field_name:
-            return []
-
-        association_features = RegulationGroupAssociationLayer.get_features_by_attribute_value(
-            plan_object_field_name, plan_ids
-        )
 
-        plan_object_ids_by_group_id: dict[str, list[str]] = defaultdict(list)
-        for association in association_features:
-            plan_object_ids_by_group_id[association["plan_regulation_group_id"]].append(
-                association[plan_object_field_name]
-            )
-
-        regulation_group_ids = set(plan_object_ids_by_group_id)
-        regulation_group_features = list(
-            RegulationGroupLayer.get_features_by_attribute_value("id", regulation_group_ids)
-        )
-        regulation_group_models = RegulationGroupLayer.models_from_features(regulation_group_features)
-
-        groups_by_plan_object_id: dict[str, list[RegulationGroup]] = defaultdict(list)
-        for group in regulation_group_models:
-            group_id = group.id_
-            if group_id:
-                for plan_object_id in plan_object_ids_by_group_id.get(group_id, []):
-                    groups_by_plan_object_id[plan_object_id].append(group)
+        # General regulation groups
+        groups_by_plan_id = RegulationGroupLayer.models_by_associated_feature_id(cls.name, plan_ids)
 
         # Legal effects
         legal_effects_by_plan_id: dict[str, list[str]] = defaultdict(list)
-        for feat in LegalEffectAssociationLayer.get_features_by_attribute_value("plan_id", plan_ids):
+        legal_effect_associations = LegalEffectAssociationLayer.get_features_by_attribute_value(
+            "plan_id", plan_ids, attributes=("plan_id", "legal_effects_of_master_plan_id")
+        )
+        for feat in legal_effect_associations:
             legal_effects_by_plan_id[feat["plan_id"]].append(feat["legal_effects_of_master_plan_id"])
 
         # Docs
         documents_by_plan_id: dict[str, list[Document]] = defaultdict(list)
-        all_doc_features = DocumentLayer.get_features_by_attribute_value("plan_id", plan_ids)
+        all_doc_features = DocumentLayer.get_model_features_by_attribute_value("plan_id", plan_ids)
         for model in DocumentLayer.models_from_features(list(all_doc_features)):
             documents_by_plan_id[cast(str, model.plan_id)].append(model)
 
@@ -255,7 +269,7 @@ class PlanLayer(AbstractPlanLayer):
                 description=deserialize_localized_text(feature["description"]),
                 scale=feature["scale"],
                 lifecycle_status_id=feature["lifecycle_status_id"],
-                general_regulations=groups_by_plan_object_id[feature["id"]],
+                general_regulations=groups_by_plan_id[feature["id"]],
                 legal_effect_ids=legal_effects_by_plan_id[feature["id"]],
                 documents=documents_by_plan_id[feature["id"]],
                 id_=feature["id"],
@@ -274,11 +288,15 @@ class PlanLayer(AbstractPlanLayer):
 
     @classmethod
     def get_active_plan(cls) -> Plan | None:
-        feat = cls.get_feature_by_id(get_active_plan_id(), no_geometries=False)
-        return cls.model_from_feature(feat) if feat else None
+        with cls.memoize_queries():
+            feat = cls.get_feature_by_id(get_active_plan_id(), no_geometries=False)
+            return cls.model_from_feature(feat) if feat else None
 
 
 class PlanObjectLayer(AbstractPlanLayer):
+    model_attributes = ("id", "name", "description", "type_of_underground_id", "plan_id")
+    model_needs_geometry = True
+
     @classmethod
     def feature_from_model(cls, model: PlanObject, plan_id: str | None = None) -> QgsFeature:
         if not model.geom:
@@ -295,54 +313,65 @@ class PlanObjectLayer(AbstractPlanLayer):
         return feature
 
     @classmethod
-    def models_from_features(cls, features: list[QgsFeature]) -> list[PlanObject]:
-        plan_object_ids = {feat["id"] for feat in features}
-        plan_object_field_name = RegulationGroupAssociationLayer.layer_name_to_attribute_map.get(cls.name)
-        if not plan_object_field_name:
-            return []
-
-        association_features = RegulationGroupAssociationLayer.get_features_by_attribute_value(
-            plan_object_field_name, plan_object_ids
-        )
-
-        plan_object_ids_by_group_id: dict[str, list[str]] = defaultdict(list)
-        for association in association_features:
-            plan_object_ids_by_group_id[association["plan_regulation_group_id"]].append(
-                association[plan_object_field_name]
-            )
-
-        regulation_group_ids = set(plan_object_ids_by_group_id)
-        regulation_group_features = list(
-            RegulationGroupLayer.get_features_by_attribute_value("id", regulation_group_ids)
-        )
-        regulation_group_models = RegulationGroupLayer.models_from_features(regulation_group_features)
+    def models_from_features(cls, features: list[QgsFeature], *, with_geometries: bool = True) -> list[PlanObject]:
+        """
+        Builds the models of the features with their regulation groups.
 
-        groups_by_plan_object_id: dict[str, list[RegulationGroup]] = defaultdict(list)
-        for group in regulation_group_models:
-            group_id = group.id_
-            if group_id:
-                for plan_object_id in plan_object_ids_by_group_id.get(group_id, []):
-                    groups_by_plan_object_id[plan_object_id].append(group)
+        If `with_geometries` is False, the geometries are left out of the models, see `FeatureGeometry`.
+        """
+        plan_object_ids = {feat["id"] for feat in features}
+        groups_by_plan_object_id = RegulationGroupLayer.models_by_associated_feature_id(cls.name, plan_object_ids)
 
         return [
-            PlanObject(
-                geom=feature.geometry(),
-                type_of_underground_id=feature["type_of_underground_id"],
-                layer_name=cls.get_from_project().name(),
-                name=deserialize_localized_text(feature["name"]),
-                description=deserialize_localized_text(feature["description"]),
-                regulation_groups=groups_by_plan_object_id[feature["id"]],
-                plan_id=feature["plan_id"],
-                modified=False,
-                id_=feature["id"],
+            cls.model_from_row(
+                row, feature.geometry() if with_geometries else None, groups_by_plan_object_id[row["id"]]
             )
-            for feature in features
+            for feature, row in zip(features, cls.rows_from_features(features))
         ]
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> PlanObject:
         return cls.models_from_features([feature])[0]
 
+    @classmethod
+    def model_from_row(
+        cls, row: QgsFeature | Mapping[str, Any], geom: QgsGeometry | None, regulation_groups: list[RegulationGroup]
+    ) -> PlanObject:
+        """Builds the model from a feature or a row of plan object attributes and already fetched children."""
+        return PlanObject(
+            geom=geom,
+            type_of_underground_id=row["type_of_underground_id"],
+            layer_name=cls.get_from_project().name(),
+            name=deserialize_localized_text(row["name"]),
+            description=deserialize_localized_text(row["description"]),
+            regulation_groups=regulation_groups,
+            plan_id=row["plan_id"],
+            modified=False,
+            id_=row["id"],
+        )
+
+
+class FeatureGeometry:
+    """
+    Geometry of a plan feature that is fetched from the layer only when it is needed.
+
+    Records just the layer and the QGIS feature ID (fid), so that views listing the plan features do not have to
+    hold a copy of every geometry.
+    """
+
+    __slots__ = ("fid", "layer_class")
+
+    def __init__(self, layer_class: type[PlanObjectLayer], fid: int):
+        self.layer_class = layer_class
+        self.fid = fid
+
+    def load(self) -> QgsGeometry | None:
+        request = QgsFeatureRequest(self.fid).setNoAttributes()
+        feature = next(self.layer_class.get_from_project().getFeatures(request), None)
+        if feature is None or not feature.hasGeometry():
+            return None
+        return feature.geometry()
+
 
 class PointLayer(PlanObjectLayer):
     name = "Pisteet"
@@ -366,7 +395,9 @@ class OtherAreaLayer(PlanObjectLayer):
 
 class RegulationGroupLayer(AbstractPlanLayer):
     name = "Kaavamääräysryhmät"
+    use_attribute_index = True
     filter_template = Template("plan_id = '$plan_id'")
+    model_attributes = ("id", "type_of_plan_regulation_group_id", "name", "short_name", "ordering")
 
     @classmethod
     def feature_from_model(cls, model: RegulationGroup, plan_id: str | None = None) -> QgsFeature:
@@ -387,7 +418,7 @@ class RegulationGroupLayer(AbstractPlanLayer):
         group_ids = {feature["id"] for feature in features}
 
         regulation_features = list(
-            PlanRegulationLayer.get_features_by_attribute_value("plan_regulation_group_id", group_ids)
+            PlanRegulationLayer.get_model_features_by_attribute_value("plan_regulation_group_id", group_ids)
         )
         regulation_models = PlanRegulationLayer.models_from_features(regulation_features)
         regulations_by_group_id: dict[str, list[Regulation]] = defaultdict(list)
@@ -396,7 +427,7 @@ class RegulationGroupLayer(AbstractPlanLayer):
                 regulations_by_group_id[regulation.regulation_group_id].append(regulation)
 
         proposition_features = list(
-            PlanPropositionLayer.get_features_by_attribute_value("plan_regulation_group_id", group_ids)
+            PlanPropositionLayer.get_model_features_by_attribute_value("plan_regulation_group_id", group_ids)
         )
         proposition_models = PlanPropositionLayer.models_from_features(proposition_features)
         propositions_by_group_id: dict[str, list[Proposition]] = defaultdict(list)
@@ -405,27 +436,70 @@ class RegulationGroupLayer(AbstractPlanLayer):
                 propositions_by_group_id[proposition.regulation_group_id].append(proposition)
 
         return [
-            RegulationGroup(
-                type_code_id=feature["type_of_plan_regulation_group_id"],
-                heading=deserialize_localized_text(feature["name"]),
-                letter_code=feature["short_name"],
-                color_code=None,
-                group_number=feature["ordering"],
-                regulations=regulations_by_group_id[feature["id"]],
-                propositions=propositions_by_group_id[feature["id"]],
-                modified=False,
-                id_=feature["id"],
-            )
-            for feature in features
+            cls.model_from_row(row, regulations_by_group_id[row["id"]], propositions_by_group_id[row["id"]])
+            for row in cls.rows_from_features(features)
         ]
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> RegulationGroup:
         return cls.models_from_features([feature])[0]
 
+    @classmethod
+    def models_by_associated_feature_id(
+        cls, layer_name: str, feature_ids: set[str]
+    ) -> defaultdict[str, list[RegulationGroup]]:
+        """Returns the regulation groups associated with the features of the given layer keyed by feature ID."""
+        groups_by_feature_id: defaultdict[str, list[RegulationGroup]] = defaultdict(list)
+        field_name = RegulationGroupAssociationLayer.layer_name_to_attribute_map.get(layer_name)
+        if not field_name:
+            return groups_by_feature_id
 
-class RegulationGroupAssociationLayer(AbstractPlanLayer):
+        association_features = RegulationGroupAssociationLayer.get_features_by_attribute_value(
+            field_name, feature_ids, attributes=("plan_regulation_group_id", field_name)
+        )
+
+        feature_ids_by_group_id: dict[str, list[str]] = defaultdict(list)
+        for association in association_features:
+            feature_ids_by_group_id[association["plan_regulation_group_id"]].append(association[field_name])
+
+        regulation_group_features = list(cls.get_model_features_by_attribute_value("id", set(feature_ids_by_group_id)))
+        for group in cls.models_from_features(regulation_group_features):
+            group_id = group.id_
+            if group_id:
+                for feature_id in feature_ids_by_group_id.get(group_id, []):
+                    groups_by_feature_id[feature_id].append(group)
+
+        return groups_by_feature_id
+
+    @classmethod
+    def model_from_row(
+        cls, row: QgsFeature | Mapping[str, Any], regulations: list[Regulation], propositions: list[Proposition]
+    ) -> RegulationGroup:
+        """Builds the model from a feature or a row of regulation group attributes and already fetched children."""
+        return RegulationGroup(
+            type_code_id=row["type_of_plan_regulation_group_id"],
+            heading=deserialize_localized_text(row["name"]),
+            letter_code=row["short_name"],
+            color_code=None,
+            group_number=row["ordering"],
+            regulations=regulations,
+            propositions=propositions,
+            modified=False,
+            id_=row["id"],
+        )
+
+
+class RegulationGroupAssociationLayer(AbstractAssociationLayer):
     name = "Kaavamääräysryhmien assosiaatiot"
+    use_attribute_index = True
+    indexed_attributes = (
+        "plan_regulation_group_id",
+        "other_area_id",
+        "point_id",
+        "land_use_area_id",
+        "line_id",
+        "plan_id",
+    )
     filter_template = Template(
         dedent(
             """\
@@ -447,29 +521,6 @@ class RegulationGroupAssociationLayer(AbstractPlanLayer):
         PlanLayer.name: "plan_id",
     }
 
-    @classmethod
-    def feature_from(cls, regulation_group_id: str, layer_name: str, feature_id: str) -> QgsFeature | None:
-        layer = cls.get_from_project()
-        attribute = cls.layer_name_to_attribute_map.get(layer_name)
-
-        feature = QgsVectorLayerUtils.createFeature(layer)
-        feature["plan_regulation_group_id"] = regulation_group_id
-
-        if not attribute:
-            msg = f"Unrecognized layer name given for saving regulation group association: {layer_name}"
-            raise ValueError(msg)
-        feature[attribute] = feature_id
-
-        return feature
-
-    @classmethod
-    def association_exists(cls, regulation_group_id: str, layer_name: str, feature_id: str):
-        attribute = cls.layer_name_to_attribute_map.get(layer_name)
-        for feature in cls.get_features_by_attribute_value("plan_regulation_group_id", regulation_group_id):
-            if feature[attribute] == feature_id:
-                return True
-        return False
-
     @classmethod
     def get_associations_for_feature(cls, feature_id: str, layer_name: str) -> Generator[QgsFeature]:
         attribute = cls.layer_name_to_attribute_map.get(layer_name)
@@ -499,16 +550,8 @@ class RegulationGroupAssociationLayer(AbstractPlanLayer):
             raise LayerNotFoundError(layer_name)
         return cls.get_attribute_values_by_another_attribute_value("plan_regulation_group_id", attribute, feature_id)
 
-    @classmethod
-    def get_dangling_associations(  # by_feature
-        cls, groups: list[RegulationGroup], feature_id: str, layer_name: str
-    ) -> list[QgsFeature]:
-        associations = RegulationGroupAssociationLayer.get_associations_for_feature(feature_id, layer_name)
-        updated_group_ids = [group.id_ for group in groups]
-        return [assoc for assoc in associations if assoc["plan_regulation_group_id"] not in updated_group_ids]
-
 
-def attribute_value_model_from_feature(feature: QgsFeature) -> AttributeValue:
+def attribute_value_model_from_feature(feature: QgsFeature | Mapping[str, Any]) -> AttributeValue:
     return AttributeValue(
         value_data_type=feature["value_data_type"],
         numeric_value=feature["numeric_value"],
@@ -542,6 +585,15 @@ def update_feature_from_attribute_value_model(value: AttributeValue | None, feat
 
 class PlanRegulationLayer(AbstractPlanLayer):
     name = "Kaavamääräys"
+    use_attribute_index = True
+    indexed_attributes = ("plan_regulation_group_id",)
+    model_attributes = (
+        "id",
+        "type_of_plan_regulation_id",
+        "subject_identifiers",
+        "plan_regulation_group_id",
+        *ATTRIBUTE_VALUE_ATTRIBUTES,
+    )
     filter_template = Template(
         dedent(
             """\
@@ -572,7 +624,7 @@ class PlanRegulationLayer(AbstractPlanLayer):
         regulation_ids = [feature["id"] for feature in features]
 
         info_features = list(
-            AdditionalInformationLayer.get_features_by_attribute_value("plan_regulation_id", regulation_ids)
+            AdditionalInformationLayer.get_model_features_by_attribute_value("plan_regulation_id", regulation_ids)
         )
         info_models = AdditionalInformationLayer.models_from_features(info_features)
         infos_by_regulation_id: dict[str, list[AdditionalInformation]] = defaultdict(list)
@@ -581,7 +633,9 @@ class PlanRegulationLayer(AbstractPlanLayer):
                 infos_by_regulation_id[info.plan_regulation_id].append(info)
 
         plan_theme_associations = list(
-            PlanThemeAssociationLayer.get_features_by_attribute_value("plan_regulation_id", regulation_ids)
+            PlanThemeAssociationLayer.get_features_by_attribute_value(
+                "plan_regulation_id", regulation_ids, attributes=("plan_regulation_id", "plan_theme_id")
+            )
         )
 
         plan_theme_ids_by_regulation_id: dict[str, list[str]] = defaultdict(list)
@@ -589,7 +643,11 @@ class PlanRegulationLayer(AbstractPlanLayer):
             plan_theme_ids_by_regulation_id[association["plan_regulation_id"]].append(association["plan_theme_id"])
 
         verbal_regulation_type_associations = list(
-            TypeOfVerbalRegulationAssociationLayer.get_features_by_attribute_value("plan_regulation_id", regulation_ids)
+            TypeOfVerbalRegulationAssociationLayer.get_features_by_attribute_value(
+                "plan_regulation_id",
+                regulation_ids,
+                attributes=("plan_regulation_id", "type_of_verbal_plan_regulation_id"),
+            )
         )
 
         verbal_regulation_types_by_regulation_id: dict[str, list[str]] = defaultdict(list)
@@ -599,26 +657,42 @@ class PlanRegulationLayer(AbstractPlanLayer):
             )
 
         return [
-            Regulation(
-                regulation_type_id=feature["type_of_plan_regulation_id"],
-                value=attribute_value_model_from_feature(feature),
-                additional_information=infos_by_regulation_id[feature["id"]],
-                regulation_number=None,
-                files=[],
-                theme_ids=plan_theme_ids_by_regulation_id[feature["id"]],
-                subject_identifiers=feature["subject_identifiers"],
-                regulation_group_id=feature["plan_regulation_group_id"],
-                verbal_regulation_type_ids=verbal_regulation_types_by_regulation_id[feature["id"]],
-                modified=False,
-                id_=feature["id"],
+            cls.model_from_row(
+                row,
+                infos_by_regulation_id[row["id"]],
+                plan_theme_ids_by_regulation_id[row["id"]],
+                verbal_regulation_types_by_regulation_id[row["id"]],
             )
-            for feature in features
+            for row in cls.rows_from_features(features)
         ]
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> Regulation:
         return cls.models_from_features([feature])[0]
 
+    @classmethod
+    def model_from_row(
+        cls,
+        row: QgsFeature | Mapping[str, Any],
+        additional_information: list[AdditionalInformation],
+        theme_ids: list[str],
+        verbal_regulation_type_ids: list[str],
+    ) -> Regulation:
+        """Builds the model from a feature or a row of regulation attributes and already fetched children."""
+        return Regulation(
+            regulation_type_id=row["type_of_plan_regulation_id"],
+            value=attribute_value_model_from_feature(row),
+            additional_information=additional_information,
+            regulation_number=None,
+            files=[],
+            theme_ids=theme_ids,
+            subject_identifiers=row["subject_identifiers"],
+            regulation_group_id=row["plan_regulation_group_id"],
+            verbal_regulation_type_ids=verbal_regulation_type_ids,
+            modified=False,
+            id_=row["id"],
+        )
+
     @classmethod
     def regulations_with_group_id(cls, group_id: str) -> Generator[QgsFeature]:
         return cls.get_features_by_attribute_value("plan_regulation_group_id", group_id)
@@ -633,8 +707,10 @@ class PlanRegulationLayer(AbstractPlanLayer):
         ]
 
 
-class TypeOfVerbalRegulationAssociationLayer(AbstractPlanLayer):
+class TypeOfVerbalRegulationAssociationLayer(AbstractAssociationLayer):
     name = "Sanallisten kaavamääräyksien lajien assosiaatiot"
+    use_attribute_index = True
+    indexed_attributes = ("plan_regulation_id",)
     filter_template = Template(
         dedent(
             """\
@@ -651,72 +727,25 @@ class TypeOfVerbalRegulationAssociationLayer(AbstractPlanLayer):
         )
     )
 
-    @classmethod
-    def feature_from(cls, regulation_id: str, type_of_verbal_regulation_id: str) -> QgsFeature | None:
-        layer = cls.get_from_project()
-
-        feature = QgsVectorLayerUtils.createFeature(layer)
-        feature["plan_regulation_id"] = regulation_id
-        feature["type_of_verbal_plan_regulation_id"] = type_of_verbal_regulation_id
-        return feature
-
-    @classmethod
-    def association_exists(cls, regulation_id: str, type_of_verbal_regulation_id: str) -> bool:
-        for feature in cls.get_features_by_attribute_value("plan_regulation_id", regulation_id):
-            if feature["type_of_verbal_plan_regulation_id"] == type_of_verbal_regulation_id:
-                return True
-        return False
-
-    @classmethod
-    def get_associations_for_regulation(cls, regulation_id: str) -> Generator[QgsFeature]:
-        return cls.get_features_by_attribute_value("plan_regulation_id", regulation_id)
-
-    @classmethod
-    def get_dangling_associations(cls, regulation_id: str, updated_type_ids: list[str]) -> list[QgsFeature]:
-        associations = cls.get_associations_for_regulation(regulation_id)
-        return [assoc for assoc in associations if assoc["type_of_verbal_plan_regulation_id"] not in updated_type_ids]
 
-
-class LegalEffectAssociationLayer(AbstractPlanLayer):
+class LegalEffectAssociationLayer(AbstractAssociationLayer):
     name = "Yleiskaavan oikeusvaikutusten assosiaatiot"
+    use_attribute_index = True
+    indexed_attributes = ("plan_id",)
     filter_template = Template("plan_id = '$plan_id'")
 
-    @classmethod
-    def feature_from(cls, plan_id: str, legal_effect_id: str) -> QgsFeature | None:
-        layer = cls.get_from_project()
-
-        feature = QgsVectorLayerUtils.createFeature(layer)
-        feature["plan_id"] = plan_id
-        feature["legal_effects_of_master_plan_id"] = legal_effect_id
-        return feature
-
-    @classmethod
-    def association_exists(cls, plan_id: str, legal_effect_id: str) -> bool:
-        for feature in cls.get_features_by_attribute_value("plan_id", plan_id):
-            if feature["legal_effects_of_master_plan_id"] == legal_effect_id:
-                return True
-        return False
-
-    @classmethod
-    def get_associations_for_plan(cls, plan_id: str) -> Generator[QgsFeature]:
-        return cls.get_features_by_attribute_value("plan_id", plan_id)
-
     @classmethod
     def get_legal_effect_ids_for_plan(cls, plan_id: str) -> Generator[QgsFeature]:
         return cls.get_attribute_values_by_another_attribute_value(
             "legal_effects_of_master_plan_id", "plan_id", plan_id
         )
 
-    @classmethod
-    def get_dangling_associations(cls, plan_id: str, updated_legal_effect_ids: list[str]) -> list[QgsFeature]:
-        associations = cls.get_associations_for_plan(plan_id)
-        return [
-            assoc for assoc in associations if assoc["legal_effects_of_master_plan_id"] not in updated_legal_effect_ids
-        ]
-
 
 class PlanPropositionLayer(AbstractPlanLayer):
     name = "Kaavasuositus"
+    use_attribute_index = True
+    indexed_attributes = ("plan_regulation_group_id",)
+    model_attributes = ("id", "text_value", "plan_regulation_group_id", "ordering")
     filter_template = Template(
         dedent(
             """\
@@ -745,7 +774,9 @@ class PlanPropositionLayer(AbstractPlanLayer):
     def models_from_features(cls, features: list[QgsFeature]) -> list[Proposition]:
         proposition_ids = {feature["id"] for feature in features}
         plan_theme_associations = list(
-            PlanThemeAssociationLayer.get_features_by_attribute_value("plan_proposition_id", proposition_ids)
+            PlanThemeAssociationLayer.get_features_by_attribute_value(
+                "plan_proposition_id", proposition_ids, attributes=("plan_proposition_id", "plan_theme_id")
+            )
         )
 
         plan_theme_ids_by_proposition_id: dict[str, list[str]] = defaultdict(list)
@@ -753,21 +784,26 @@ class PlanPropositionLayer(AbstractPlanLayer):
             plan_theme_ids_by_proposition_id[association["plan_proposition_id"]].append(association["plan_theme_id"])
 
         return [
-            Proposition(
-                value=deserialize_localized_text(feature["text_value"]),
-                regulation_group_id=feature["plan_regulation_group_id"],
-                proposition_number=feature["ordering"],
-                theme_ids=plan_theme_ids_by_proposition_id[feature["id"]],
-                modified=False,
-                id_=feature["id"],
-            )
-            for feature in features
+            cls.model_from_row(row, plan_theme_ids_by_proposition_id[row["id"]])
+            for row in cls.rows_from_features(features)
         ]
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> Proposition:
         return cls.models_from_features([feature])[0]
 
+    @classmethod
+    def model_from_row(cls, row: QgsFeature | Mapping[str, Any], theme_ids: list[str]) -> Proposition:
+        """Builds the model from a feature or a row of proposition attributes and already fetched children."""
+        return Proposition(
+            value=deserialize_localized_text(row["text_value"]),
+            regulation_group_id=row["plan_regulation_group_id"],
+            proposition_number=row["ordering"],
+            theme_ids=theme_ids,
+            modified=False,
+            id_=row["id"],
+        )
+
     @classmethod
     def propositions_with_group_id(cls, group_id: str) -> Generator[QgsFeature]:
         return cls.get_features_by_attribute_value("plan_regulation_group_id", group_id)
@@ -782,8 +818,10 @@ class PlanPropositionLayer(AbstractPlanLayer):
         ]
 
 
-class PlanThemeAssociationLayer(AbstractPlanLayer):
+class PlanThemeAssociationLayer(AbstractAssociationLayer):
     name = "Kaavoitusteemojen assosiaatiot"
+    use_attribute_index = True
+    indexed_attributes = ("plan_regulation_id", "plan_proposition_id")
     filter_template = Template(
         dedent(
             """\
@@ -805,56 +843,6 @@ class PlanThemeAssociationLayer(AbstractPlanLayer):
         )
     )
 
-    @classmethod
-    def feature_from(
-        cls, plan_theme_id: str, plan_regulation_id: str | None = None, plan_proposition_id: str | None = None
-    ) -> QgsFeature | None:
-        layer = cls.get_from_project()
-
-        feature = QgsVectorLayerUtils.createFeature(layer)
-        feature["plan_regulation_id"] = plan_regulation_id
-        feature["plan_proposition_id"] = plan_proposition_id
-        feature["plan_theme_id"] = plan_theme_id
-        return feature
-
-    @classmethod
-    def regulation_association_exists(cls, plan_theme_id: str, plan_regulation_id: str | None = None) -> bool:
-        if plan_regulation_id:
-            for feature in cls.get_features_by_attribute_value("plan_regulation_id", plan_regulation_id):
-                if feature["plan_theme_id"] == plan_theme_id:
-                    return True
-        return False
-
-    @classmethod
-    def proposition_association_exists(cls, plan_theme_id: str, plan_proposition_id: str | None = None) -> bool:
-        if plan_proposition_id:
-            for feature in cls.get_features_by_attribute_value("plan_proposition_id", plan_proposition_id):
-                if feature["plan_theme_id"] == plan_theme_id:
-                    return True
-        return False
-
-    @classmethod
-    def get_associations_for_plan_regulation(cls, plan_regulation_id: str) -> Generator[QgsFeature]:
-        return cls.get_features_by_attribute_value("plan_regulation_id", plan_regulation_id)
-
-    @classmethod
-    def get_associations_for_plan_proposition(cls, plan_proposition_id: str) -> Generator[QgsFeature]:
-        return cls.get_features_by_attribute_value("plan_proposition_id", plan_proposition_id)
-
-    @classmethod
-    def get_dangling_regulation_associations(
-        cls, plan_regulation_id: str, updated_plan_theme_ids: list[str]
-    ) -> list[QgsFeature]:
-        associations = cls.get_associations_for_plan_regulation(plan_regulation_id)
-        return [assoc for assoc in associations if assoc["plan_theme_id"] not in updated_plan_theme_ids]
-
-    @classmethod
-    def get_dangling_proposition_associations(
-        cls, plan_proposition_id: str, updated_plan_theme_ids: list[str]
-    ) -> list[QgsFeature]:
-        associations = cls.get_associations_for_plan_proposition(plan_proposition_id)
-        return [assoc for assoc in associations if assoc["plan_theme_id"] not in updated_plan_theme_ids]
-
 
 class DocumentLayer(AbstractPlanLayer):
     name = "Asiakirjat"
@@ -941,6 +929,9 @@ class SourceDataLayer(AbstractPlanMatterLayer):
 
 class AdditionalInformationLayer(AbstractPlanLayer):
     name = "Kaavamääräyksen lisätiedot"
+    use_attribute_index = True
+    indexed_attributes = ("plan_regulation_id",)
+    model_attributes = ("id", "type_additional_information_id", "plan_regulation_id", *ATTRIBUTE_VALUE_ATTRIBUTES)
     filter_template = Template(
         dedent(
             """\
@@ -970,16 +961,18 @@ class AdditionalInformationLayer(AbstractPlanLayer):
 
     @classmethod
     def models_from_features(cls, features: list[QgsFeature]) -> list[AdditionalInformation]:
-        return [
-            AdditionalInformation(
-                additional_information_type_id=feature["type_additional_information_id"],
-                id_=feature["id"],
-                plan_regulation_id=feature["plan_regulation_id"],
-                value=attribute_value_model_from_feature(feature),
-                modified=False,
-            )
-            for feature in features
-        ]
+        return [cls.model_from_row(row) for row in cls.rows_from_features(features)]
+
+    @classmethod
+    def model_from_row(cls, row: QgsFeature | Mapping[str, Any]) -> AdditionalInformation:
+        """Builds the model from a feature or a row of additional information attributes."""
+        return AdditionalInformation(
+            additional_information_type_id=row["type_additional_information_id"],
+            id_=row["id"],
+            plan_regulation_id=row["plan_regulation_id"],
+            value=attribute_value_model_from_feature(row),
+            modified=False,
+        )
 
     @classmethod
     def model_from_feature(cls, feature: QgsFeature) -> AdditionalInformation:
@@ -1030,6 +1023,8 @@ plan_matter_layers = AbstractPlanMatterLayer.__subclasses__()
 
 plan_layers = AbstractPlanLayer.__subclasses__()
 plan_layers.remove(PlanObjectLayer)
+plan_layers.remove(AbstractAssociationLayer)
 
 plan_feature_layers = PlanObjectLayer.__subclasses__()
 plan_layers.extend(plan_feature_layers)
+plan_layers.extend(AbstractAssociationLayer.__subclasses__())
@@ -3,10 +3,10 @@ from __future__ import annotations
 import os
 from contextlib import suppress
 from functools import wraps
-from typing import TYPE_CHECKING, Any, cast
+from typing import TYPE_CHECKING, Any, Iterable, cast
 
 from qgis.core import QgsExpressionContextUtils, QgsProject, QgsVectorLayer
-from qgis.PyQt.QtCore import NULL, Qt, pyqtBoundSignal
+from qgis.PyQt.QtCore import NULL, Qt, QVariant, pyqtBoundSignal
 from qgis.PyQt.QtWidgets import QMessageBox
 from qgis.utils import OverrideCursor, iface
 
@@ -170,6 +170,12 @@ def null_to_none(value) -> Any:
     return value
 
 
+def nulls_to_none(values: Iterable[Any]) -> list[Any]:
+    """Converts NULLs in a list of attribute values, such as `QgsFeature.attributes()`, to None."""
+    # NULL attribute values are the only QVariants in the list, so a type check is enough instead of comparisons
+    return [None if isinstance(value, QVariant) and value.isNull() else value for value in values]
+
+
 def set_imported_layer_invisible(layer: QgsVectorLayer) -> None:
     root = QgsProject.instance().layerTreeRoot()
     layer_node = root.findLayer(layer.id())
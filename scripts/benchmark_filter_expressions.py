@@ -0,0 +1,87 @@
+"""
+Measures attribute value queries with one IN list expression compared to the chunked expressions.
+
+For 1k, 10k and 50k IDs, times parsing the expressions and fetching the matching features from a memory layer with
+one expression holding all IDs and with the `MAX_FILTER_VALUES` sized chunks of `create_filter_expressions`. A
+memory layer evaluates the expressions itself, so provider side SQL compilation is not covered. Needs PyQGIS. Run
+from the repository root:
+
+    python scripts/benchmark_filter_expressions.py --features 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from qgis.core import QgsApplication, QgsExpression, QgsFeature, QgsFeatureRequest, QgsProject, QgsVectorLayer
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from arho_feature_template.project.layers import AbstractLayer
+
+ID_COUNTS = (1000, 10000, 50000)
+
+
+class BenchmarkLayer(AbstractLayer):
+    name = "Filter expression benchmark layer"
+
+
+def add_layer(feature_count: int) -> list[str]:
+    layer = QgsVectorLayer("NoGeometry?field=id:string", BenchmarkLayer.name, "memory")
+    ids = [str(uuid.uuid4()) for _ in range(feature_count)]
+    features = []
+    for id_ in ids:
+        feature = QgsFeature(layer.fields())
+        feature["id"] = id_
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    QgsProject.instance().addMapLayer(layer)
+    return ids
+
+
+def time_query(expressions: list[str]) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    for expression in expressions:
+        QgsExpression(expression)
+    parse_time = time.perf_counter() - start
+
+    layer = BenchmarkLayer.get_from_project()
+    start = time.perf_counter()
+    count = 0
+    for expression in expressions:
+        request = QgsFeatureRequest().setFilterExpression(expression).setFlags(QgsFeatureRequest.NoGeometry)
+        count += sum(1 for _ in layer.getFeatures(request))
+    return parse_time, time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--features", type=int, default=100000)
+    args = parser.parse_args()
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    ids = add_layer(max(args.features, *ID_COUNTS))
+
+    for id_count in ID_COUNTS:
+        values = ids[:id_count]
+        for label, expressions in (
+            ("single", [BenchmarkLayer.create_filter_expression("id", values)]),
+            ("chunked", BenchmarkLayer.create_filter_expressions("id", values)),
+        ):
+            parse_time, query_time, count = time_query(expressions)
+            print(
+                f"{id_count} IDs, {label} ({len(expressions)} expressions): "
+                f"parse {parse_time * 1000:.0f} ms, query {query_time * 1000:.0f} ms, {count} features"
+            )
+
+    QgsProject.instance().clear()
+    app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
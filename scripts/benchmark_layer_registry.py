@@ -0,0 +1,63 @@
+"""
+Measures the cost of resolving a plugin layer by name compared to the cached handle of `LayerRegistry`.
+
+Adds a memory layer for every plan and code layer class, and some other layers, to a project, and times
+`get_vector_layer_from_project` (a name lookup on every call) against `AbstractLayer.get_from_project` (the
+registry). Needs PyQGIS. Run from the repository root:
+
+    python scripts/benchmark_layer_registry.py --calls 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from qgis.core import QgsApplication, QgsProject, QgsVectorLayer
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from arho_feature_template.project.layers.code_layers import code_layers
+from arho_feature_template.project.layers.plan_layers import plan_layers
+from arho_feature_template.utils.project_utils import get_vector_layer_from_project
+
+
+def add_layers(other_layer_count: int):
+    project = QgsProject.instance()
+    for layer_class in plan_layers + code_layers:
+        project.addMapLayer(QgsVectorLayer("NoGeometry?field=id:string", layer_class.name, "memory"))
+    for i in range(other_layer_count):
+        project.addMapLayer(QgsVectorLayer("NoGeometry?field=id:string", f"Other layer {i}", "memory"))
+
+
+def time_per_call(function, calls: int) -> float:
+    layer_classes = plan_layers + code_layers
+    start = time.perf_counter()
+    for i in range(calls):
+        function(layer_classes[i % len(layer_classes)])
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--other-layers", type=int, default=50)
+    args = parser.parse_args()
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    add_layers(args.other_layers)
+
+    by_name = time_per_call(lambda layer_class: get_vector_layer_from_project(layer_class.name), args.calls)
+    by_registry = time_per_call(lambda layer_class: layer_class.get_from_project(), args.calls)
+    print(f"Name lookup: {by_name * 1e6:.2f} µs per call")
+    print(f"Registry:    {by_registry * 1e6:.2f} µs per call")
+
+    QgsProject.instance().clear()
+    app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measures the time to build and the memory used by the plan models of a synthetic large plan.
+
+Builds plan objects with regulation groups, regulations, additional information and propositions, and reports
+the time the build takes and the memory allocated per model with tracemalloc. Needs PyQGIS to import the models, but no QGIS application or
+project. Run from the repository root:
+
+    python scripts/benchmark_plan_models.py --plan-objects 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from arho_feature_template.core.models import (
+    AdditionalInformation,
+    AttributeValue,
+    Document,
+    Plan,
+    PlanObject,
+    Proposition,
+    Regulation,
+    RegulationGroup,
+)
+
+GROUPS_PER_PLAN_OBJECT = 2
+REGULATIONS_PER_GROUP = 3
+DOCUMENTS = 50
+
+
+def build_plan(plan_object_count: int) -> tuple[Plan, list[PlanObject]]:
+    plan_objects = []
+    for i in range(plan_object_count):
+        regulation_groups = [
+            RegulationGroup(
+                heading=f"Group {i}-{j}",
+                letter_code="A",
+                regulations=[
+                    Regulation(
+                        regulation_type_id=f"type {k}",
+                        value=AttributeValue(numeric_value=k, unit="m"),
+                        additional_information=[
+                            AdditionalInformation(
+                                additional_information_type_id="info", value=AttributeValue(text_value="text")
+                            )
+                        ],
+                        theme_ids=["theme"],
+                        id_=f"regulation {i}-{j}-{k}",
+                    )
+                    for k in range(REGULATIONS_PER_GROUP)
+                ],
+                propositions=[Proposition(value="proposition")],
+                id_=f"group {i}-{j}",
+            )
+            for j in range(GROUPS_PER_PLAN_OBJECT)
+        ]
+        plan_objects.append(PlanObject(name=f"Plan object {i}", regulation_groups=regulation_groups, id_=str(i)))
+    plan = Plan(name="Plan", documents=[Document(name=f"Document {i}") for i in range(DOCUMENTS)])
+    return plan, plan_objects
+
+
+def model_count(plan_object_count: int) -> int:
+    # Regulation, its value, additional information and its value
+    models_per_regulation = 4
+    # Regulation group, its regulations and proposition
+    models_per_group = 1 + REGULATIONS_PER_GROUP * models_per_regulation + 1
+    return plan_object_count * (1 + GROUPS_PER_PLAN_OBJECT * models_per_group) + 1 + DOCUMENTS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--plan-objects", type=int, default=2000)
+    args = parser.parse_args()
+
+    count = model_count(args.plan_objects)
+
+    gc.collect()
+    start = time.perf_counter()
+    plan = build_plan(args.plan_objects)
+    elapsed = time.perf_counter() - start
+    print(f"{count} models built in {elapsed * 1000:.0f} ms, {elapsed / count * 1e6:.1f} µs per model")
+    del plan
+
+    # Measured in a separate build, since tracing the allocations slows the build down
+    gc.collect()
+    tracemalloc.start()
+    plan = build_plan(args.plan_objects)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{count} models, {allocated / 1e6:.1f} MB, {allocated / count:.0f} bytes per model")
+    del plan
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures loading the bundled template libraries from YAML compared to their parsed copies.
+
+For each bundled library, times parsing the YAML file and the steps `TemplateManager._load_yaml` takes when the
+parsed copy in the user profile is up to date: hashing the file content and reading the JSON copy. Plain Python, the
+parsed copies are written to a temporary directory. Run from the repository root:
+
+    python scripts/benchmark_template_cache.py --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+LIBRARIES_DIR = Path(__file__).resolve().parents[1] / "arho_feature_template" / "resources" / "libraries"
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def parse_yaml(file_path: Path):
+    return yaml.load(file_path.read_bytes().decode("utf-8"), Loader=SafeLoader)  # noqa: S506
+
+
+def read_parsed_copy(file_path: Path, cache_path: Path):
+    content_hash = hashlib.sha256(file_path.read_bytes()).hexdigest()
+    with cache_path.open(encoding="utf-8") as f:
+        cached = json.load(f)
+    assert cached["sha256"] == content_hash  # noqa: S101
+    return cached["data"]
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"YAML loader: {SafeLoader.__name__}")
+    total_parse = total_cached = 0.0
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for file_path in sorted(LIBRARIES_DIR.glob("*/*.yaml")):
+            cache_path = Path(cache_dir) / f"{file_path.stem}.json"
+            cache_path.write_text(
+                json.dumps(
+                    {
+                        "sha256": hashlib.sha256(file_path.read_bytes()).hexdigest(),
+                        "data": parse_yaml(file_path),
+                    },
+                    ensure_ascii=False,
+                ),
+                encoding="utf-8",
+            )
+
+            parse = best_time(lambda file_path=file_path: parse_yaml(file_path), args.repeat)
+            cached = best_time(
+                lambda file_path=file_path, cache_path=cache_path: read_parsed_copy(file_path, cache_path), args.repeat
+            )
+            total_parse += parse
+            total_cached += cached
+            print(
+                f"{file_path.relative_to(LIBRARIES_DIR)}: YAML {parse * 1000:.1f} ms, parsed copy {cached * 1000:.1f} ms"
+            )
+    print(f"Total: YAML {total_parse * 1000:.1f} ms, parsed copy {total_cached * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
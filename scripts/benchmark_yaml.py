@@ -0,0 +1,98 @@
+"""
+Measures loading and dumping the bundled template libraries with the pure-Python and the libyaml based PyYAML classes.
+
+Loading compares `yaml.SafeLoader` with `yaml.CSafeLoader`. Dumping compares the former way of writing a library,
+building a cleaned copy of the data and dumping it with `yaml.safe_dump`, with the dumper of `TemplateManager`,
+which is based on `yaml.CSafeDumper` and leaves out the empty values while emitting. The dumper is repeated here,
+since `TemplateManager` can not be imported without PyQGIS. Plain Python, needs PyYAML built with libyaml. Run
+from the repository root:
+
+    python scripts/benchmark_yaml.py --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+LIBRARIES_DIR = Path(__file__).resolve().parents[1] / "arho_feature_template" / "resources" / "libraries"
+DUMP_OPTIONS = {"sort_keys": False, "allow_unicode": True, "default_flow_style": False}
+
+
+def is_empty_value(value: Any) -> bool:
+    return value is None or (isinstance(value, (str, list)) and len(value) == 0)
+
+
+class TemplateDumper(yaml.CSafeDumper):
+    """Same as `template_manager._TemplateDumper`."""
+
+
+TemplateDumper.add_representer(
+    dict,
+    lambda dumper, data: dumper.represent_mapping(
+        "tag:yaml.org,2002:map", ((key, value) for key, value in data.items() if not is_empty_value(value))
+    ),
+)
+
+
+def clean_data(data: Any) -> Any:
+    """The former `TemplateManager._clean_data`."""
+    if isinstance(data, dict):
+        cleaned_dict = {}
+        for key, value in data.items():
+            cleaned_value = clean_data(value)
+            if not is_empty_value(cleaned_value):
+                cleaned_dict[key] = cleaned_value
+        return cleaned_dict
+    if isinstance(data, list):
+        return [clean_data(item) for item in data]
+    return data
+
+
+def best_time(function, repeat: int) -> tuple[float, Any]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    totals = dict.fromkeys(("SafeLoader", "CSafeLoader", "clean + safe_dump", "TemplateDumper"), 0.0)
+    for file_path in sorted(LIBRARIES_DIR.glob("*/*.yaml")):
+        content = file_path.read_text(encoding="utf-8")
+        times = {}
+        times["SafeLoader"], _ = best_time(
+            lambda content=content: yaml.load(content, Loader=yaml.SafeLoader), args.repeat
+        )
+        times["CSafeLoader"], data = best_time(
+            lambda content=content: yaml.load(content, Loader=yaml.CSafeLoader), args.repeat
+        )
+        times["clean + safe_dump"], old_output = best_time(
+            lambda data=data: yaml.safe_dump(clean_data(data), **DUMP_OPTIONS), args.repeat
+        )
+        times["TemplateDumper"], new_output = best_time(
+            lambda data=data: yaml.dump(data, Dumper=TemplateDumper, **DUMP_OPTIONS), args.repeat
+        )
+        # Both leave out the same empty values, so the written libraries must not differ
+        assert new_output == old_output  # noqa: S101
+
+        for name, elapsed in times.items():
+            totals[name] += elapsed
+        print(
+            f"{file_path.relative_to(LIBRARIES_DIR)}: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in times.items())
+        )
+    print("Total: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
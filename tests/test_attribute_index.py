@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from qgis.core import QgsProject, QgsVectorLayer
+from qgis.PyQt.QtCore import NULL
+
+from arho_feature_template.project.layers import AbstractLayer
+
+LAYER_NAME = "Attribute index test layer"
+
+
+class IndexedLayer(AbstractLayer):
+    name = LAYER_NAME
+    use_attribute_index = True
+    indexed_attributes = ("group_id",)
+
+
+def _write_features(path, features: list[dict]):
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [{"type": "Feature", "geometry": None, "properties": feature} for feature in features],
+            }
+        ),
+        encoding="utf-8",
+    )
+
+
+@pytest.fixture
+def layer_file(tmp_path):
+    path = tmp_path / "features.geojson"
+    _write_features(path, [{"id": "a", "group_id": "g1"}, {"id": "b", "group_id": "g1"}])
+    return path
+
+
+@pytest.fixture
+def indexed_layer(qgis_new_project, layer_file):  # noqa: ARG001
+    layer = QgsVectorLayer(str(layer_file), LAYER_NAME, "ogr")
+    assert layer.isValid()
+    QgsProject.instance().addMapLayer(layer)
+    yield layer
+    IndexedLayer.reset_attribute_index()
+
+
+def _ids(features) -> list[str]:
+    return [feature["id"] for feature in features]
+
+
+@pytest.mark.usefixtures("indexed_layer")
+def test_indexed_lookup_returns_each_feature_once():
+    assert _ids(IndexedLayer.get_features_by_attribute_value("id", ["a", "a"])) == ["a"]
+    assert sorted(_ids(IndexedLayer.get_features_by_attribute_value("group_id", ["g1", "g1"]))) == ["a", "b"]
+
+
+def test_index_is_rebuilt_when_layer_is_replaced_under_the_same_id(indexed_layer, layer_file, tmp_path):
+    project = QgsProject.instance()
+    assert _ids(IndexedLayer.get_features_by_attribute_value("group_id", "g1")) == ["a", "b"]
+
+    project_file = str(tmp_path / "project.qgz")
+    assert project.write(project_file)
+    layer_id = indexed_layer.id()
+    _write_features(layer_file, [{"id": "c", "group_id": "g1"}])
+
+    # Reading the project recreates the layer with the ID stored in the project file
+    assert project.read(project_file)
+    reloaded_layer = IndexedLayer.get_from_project()
+    assert reloaded_layer.id() == layer_id
+
+    assert _ids(IndexedLayer.get_features_by_attribute_value("group_id", "g1")) == ["c"]
+    assert _ids(IndexedLayer.get_features_by_attribute_value("id", "a")) == []
+
+
+@pytest.mark.usefixtures("indexed_layer")
+def test_indexed_lookup_returns_only_requested_attributes():
+    features = list(IndexedLayer.get_features_by_attribute_value("group_id", "g1", attributes=["id"]))
+
+    assert _ids(features) == ["a", "b"]
+    assert all(feature["group_id"] == NULL for feature in features)
+    assert IndexedLayer.get_feature_by_id("a")["group_id"] == "g1"
+
+
+def test_renamed_layer_is_no_longer_indexed(indexed_layer, tmp_path):
+    other_file = tmp_path / "other_features.geojson"
+    _write_features(other_file, [{"id": "c", "group_id": "g1"}])
+    other_layer = QgsVectorLayer(str(other_file), "Other layer", "ogr")
+    QgsProject.instance().addMapLayer(other_layer)
+    assert _ids(IndexedLayer.get_features_by_attribute_value("group_id", "g1")) == ["a", "b"]
+
+    indexed_layer.setName("Renamed layer")
+    other_layer.setName(LAYER_NAME)
+
+    assert IndexedLayer.get_from_project() is other_layer
+    assert _ids(IndexedLayer.get_features_by_attribute_value("group_id", "g1")) == ["c"]
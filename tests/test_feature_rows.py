@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from qgis.core import QgsFeature, QgsVectorLayer
+from qgis.PyQt.QtCore import NULL, QVariant
+
+from arho_feature_template.project.layers import AbstractLayer
+from arho_feature_template.utils.misc_utils import nulls_to_none
+
+
+def test_nulls_to_none_converts_only_nulls():
+    assert nulls_to_none([NULL, QVariant(), "", 0, False, "text"]) == [None, None, "", 0, False, "text"]
+
+
+def test_rows_from_features():
+    layer = QgsVectorLayer("NoGeometry?field=id:string&field=ordering:integer&field=name:string", "Rows", "memory")
+    features = []
+    for attributes in (["a", 1, NULL], ["b", NULL, "name"]):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes(attributes)
+        features.append(feature)
+
+    assert AbstractLayer.rows_from_features(features) == [
+        {"id": "a", "ordering": 1, "name": None},
+        {"id": "b", "ordering": None, "name": "name"},
+    ]
+    assert AbstractLayer.rows_from_features([]) == []
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+from qgis.core import QgsProject, QgsVectorLayer
+
+from arho_feature_template.exceptions import LayerNotFoundError
+from arho_feature_template.project.layers import AbstractLayer
+
+LAYER_NAME = "Layer registry test layer"
+
+
+class RegisteredLayer(AbstractLayer):
+    name = LAYER_NAME
+
+
+def _add_layer(name: str) -> QgsVectorLayer:
+    layer = QgsVectorLayer("NoGeometry?field=id:string", name, "memory")
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+@pytest.mark.usefixtures("qgis_new_project")
+def test_layer_handle_is_reused():
+    layer = _add_layer(LAYER_NAME)
+
+    assert RegisteredLayer.get_from_project() is layer
+    assert RegisteredLayer.get_from_project() is layer
+
+
+@pytest.mark.usefixtures("qgis_new_project")
+def test_renamed_layer_is_looked_up_again():
+    layer = _add_layer(LAYER_NAME)
+    other_layer = _add_layer("Other layer")
+    assert RegisteredLayer.get_from_project() is layer
+
+    layer.setName("Renamed layer")
+    assert not RegisteredLayer.exists()
+
+    other_layer.setName(LAYER_NAME)
+    assert RegisteredLayer.get_from_project() is other_layer
+
+
+@pytest.mark.usefixtures("qgis_new_project")
+def test_removed_layer_is_not_returned():
+    layer = _add_layer(LAYER_NAME)
+    assert RegisteredLayer.get_from_project() is layer
+
+    QgsProject.instance().removeMapLayer(layer.id())
+
+    with pytest.raises(LayerNotFoundError):
+        RegisteredLayer.get_from_project()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import gc
+
+from qgis.PyQt.QtCore import NULL
+
+from arho_feature_template.core.models import (
+    AdditionalInformation,
+    AttributeValue,
+    Proposition,
+    Regulation,
+    RegulationGroup,
+    RegulationGroupLibrary,
+)
+
+
+def _regulation_group() -> RegulationGroup:
+    return RegulationGroup(
+        heading="Group",
+        letter_code="A",
+        regulations=[
+            Regulation(
+                regulation_type_id="type",
+                value=AttributeValue(numeric_value=1, unit="m"),
+                additional_information=[
+                    AdditionalInformation(additional_information_type_id="info", value=AttributeValue(text_value="x"))
+                ],
+                theme_ids=["theme"],
+            )
+        ],
+    )
+
+
+def test_assigned_list_is_copied():
+    theme_ids = ["a"]
+    regulation = Regulation(regulation_type_id="type")
+
+    regulation.theme_ids = theme_ids
+    theme_ids.append("b")
+
+    assert regulation.theme_ids == ["a"]
+    assert regulation.theme_ids is not theme_ids
+
+
+def test_reassigning_own_list_keeps_it():
+    regulation = Regulation(regulation_type_id="type", theme_ids=["a"])
+    theme_ids = regulation.theme_ids
+
+    regulation.theme_ids = theme_ids
+    theme_ids.append("b")
+
+    assert regulation.theme_ids is theme_ids
+    assert regulation.theme_ids == ["a", "b"]
+
+
+def test_data_hash_is_invalidated_by_assignment():
+    group = _regulation_group()
+    data_hash = group.data_hash()
+
+    group.regulations[0].value = AttributeValue(numeric_value=2, unit="m")
+
+    assert group.data_hash() != data_hash
+
+
+def test_data_hash_is_invalidated_by_nested_list_mutation():
+    group = _regulation_group()
+    data_hash = group.data_hash()
+
+    group.regulations[0].theme_ids.append("other theme")
+    assert group.data_hash() != data_hash
+
+    group.regulations[0].theme_ids.pop()
+    assert group.data_hash() == data_hash
+
+    group.regulations[0].additional_information.clear()
+    assert group.data_hash() != data_hash
+
+
+def test_data_hash_is_invalidated_through_parent_of_nested_model():
+    group = _regulation_group()
+    data_hash = group.data_hash()
+
+    group.regulations[0].additional_information[0].value = AttributeValue(text_value="y")
+
+    assert group.data_hash() != data_hash
+
+
+def test_child_outliving_its_parent():
+    group = _regulation_group()
+    regulation = group.regulations[0]
+    data_hash = regulation.data_hash()
+    group.data_hash()
+
+    del group
+    gc.collect()
+    regulation.theme_ids.append("other theme")
+
+    assert regulation.data_hash() != data_hash
+
+
+def test_null_values_become_none():
+    regulation = Regulation(regulation_type_id="type", value=NULL, id_=NULL, regulation_group_id="group")
+
+    assert regulation.value is None
+    assert regulation.id_ is None
+    assert regulation.regulation_group_id == "group"
+
+
+def test_plain_values_are_kept():
+    proposition = Proposition(value="", proposition_number=0, modified=False, theme_ids=[])
+
+    assert proposition.value == ""
+    assert proposition.proposition_number == 0
+    assert proposition.modified is False
+    assert proposition.theme_ids == []
+
+
+def test_attribute_value_nulls_and_empty_values_become_none():
+    value = AttributeValue(numeric_value=NULL, unit="", text_value="text")
+
+    assert value.numeric_value is None
+    assert value.unit is None
+    assert value.text_value == "text"
+
+
+def test_empty_attribute_value_is_detected():
+    assert AttributeValue().is_empty()
+    assert AttributeValue(text_value="", code_value=NULL).is_empty()
+    assert not AttributeValue(numeric_value=1).is_empty()
+
+
+def test_additional_information_with_empty_value_has_no_value():
+    empty = AdditionalInformation(additional_information_type_id="info", value=AttributeValue(text_value=NULL))
+    filled = AdditionalInformation(additional_information_type_id="info", value=AttributeValue(text_value="x"))
+
+    assert empty.value is None
+    assert filled.value == AttributeValue(text_value="x")
+
+
+def _library(group_data: list[dict]) -> RegulationGroupLibrary:
+    return RegulationGroupLibrary.from_template_dict(
+        {"name": "Library", "plan_regulation_groups": group_data}, RegulationGroupLibrary.LibraryType.CUSTOM
+    )
+
+
+def test_library_converts_groups_only_when_loaded():
+    library = _library([{"heading": "First"}, {"heading": "Second"}])
+
+    repr(library)
+    assert library == _library([])
+    assert library.group_count == 2
+    assert library.regulation_group_data is not None
+
+    assert library.load_regulation_groups()
+    assert [group.heading for group in library.regulation_groups] == ["First", "Second"]
+    assert library.regulation_group_data is None
+
+
+def test_library_with_invalid_groups_is_marked_failed():
+    library = _library([{"heading": "Group", "plan_propositions": [{"unknown": "x"}]}])
+
+    assert not library.load_regulation_groups()
+    assert not library.status
+    assert library.regulation_groups == []
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+from qgis.core import QgsProject, QgsVectorLayer
+from qgis.PyQt.QtCore import QDateTime
+
+from arho_feature_template.core.plan_graph_loader import _RowNormalizer, _uuid_literal
+from arho_feature_template.project.layers import AbstractLayer
+
+LAYER_NAME = "Plan graph loader test layer"
+
+
+class NormalizedLayer(AbstractLayer):
+    name = LAYER_NAME
+
+
+@pytest.fixture
+def normalized_layer(qgis_new_project):  # noqa: ARG001
+    layer = QgsVectorLayer(
+        "NoGeometry?field=id:string&field=ordering:integer&field=numeric_value:double&field=modified_at:datetime",
+        LAYER_NAME,
+        "memory",
+    )
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+def test_uuid_literal():
+    assert _uuid_literal("0f7c0c4e-5b7e-4d3c-9f1a-2f0b1d6c9a11") == "'0f7c0c4e-5b7e-4d3c-9f1a-2f0b1d6c9a11'::uuid"
+    assert _uuid_literal("x'; DROP TABLE hame.plan; --") is None
+
+
+@pytest.mark.usefixtures("normalized_layer")
+def test_row_normalizer_converts_json_values_to_field_types():
+    row = {"id": "a", "ordering": 2.0, "numeric_value": 5, "modified_at": "2024-05-02T10:11:12.345+03:00"}
+
+    normalized = _RowNormalizer().normalize(NormalizedLayer, row)
+
+    assert normalized["id"] == "a"
+    assert normalized["ordering"] == 2
+    assert isinstance(normalized["ordering"], int)
+    assert isinstance(normalized["numeric_value"], float)
+    assert isinstance(normalized["modified_at"], QDateTime)
+    assert normalized["modified_at"].isValid()
+
+
+@pytest.mark.usefixtures("normalized_layer")
+def test_row_normalizer_keeps_nulls():
+    row = {"id": "a", "ordering": None, "numeric_value": None, "modified_at": None}
+
+    assert _RowNormalizer().normalize(NormalizedLayer, dict(row)) == row
@@ -0,0 +1,40 @@
+from arho_feature_template.project.layers.plan_layers import (
+    AdditionalInformationLayer,
+    DocumentLayer,
+    LandUseAreaLayer,
+    LegalEffectAssociationLayer,
+    LineLayer,
+    OtherAreaLayer,
+    PlanLayer,
+    PlanPropositionLayer,
+    PlanRegulationLayer,
+    PlanThemeAssociationLayer,
+    PointLayer,
+    RegulationGroupAssociationLayer,
+    RegulationGroupLayer,
+    TypeOfVerbalRegulationAssociationLayer,
+    plan_layers,
+)
+
+
+def test_plan_layers_contains_only_concrete_layers():
+    assert sorted(plan_layers, key=lambda layer_class: layer_class.__name__) == sorted(
+        [
+            PlanLayer,
+            RegulationGroupLayer,
+            PlanRegulationLayer,
+            PlanPropositionLayer,
+            DocumentLayer,
+            AdditionalInformationLayer,
+            PointLayer,
+            LineLayer,
+            LandUseAreaLayer,
+            OtherAreaLayer,
+            RegulationGroupAssociationLayer,
+            TypeOfVerbalRegulationAssociationLayer,
+            LegalEffectAssociationLayer,
+            PlanThemeAssociationLayer,
+        ],
+        key=lambda layer_class: layer_class.__name__,
+    )
+    assert len(plan_layers) == len(set(plan_layers))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import pytest
+from qgis.core import QgsFeature, QgsProject, QgsVectorLayer
+
+from arho_feature_template.core.feature_editing import delete_feature, save_feature, unit_of_work
+from arho_feature_template.project.layers.plan_layers import PlanRegulationLayer, RegulationGroupLayer
+
+
+def _names(layer: QgsVectorLayer) -> list[str]:
+    return sorted(feature["name"] for feature in layer.getFeatures())
+
+
+def _feature(layer: QgsVectorLayer, name: str) -> QgsFeature:
+    feature = QgsFeature(layer.fields())
+    feature["name"] = name
+    return feature
+
+
+@pytest.fixture
+def layer_with_pending_edit(qgis_new_project):  # noqa: ARG001
+    layer = QgsVectorLayer("NoGeometry?field=name:string", "Unit of work test layer", "memory")
+    QgsProject.instance().addMapLayer(layer)
+
+    layer.startEditing()
+    layer.beginEditCommand("User edit")
+    layer.addFeature(_feature(layer, "user"))
+    layer.endEditCommand()
+    return layer
+
+
+@pytest.mark.usefixtures("qgis_iface")
+def test_failed_unit_keeps_pending_edits(layer_with_pending_edit, monkeypatch):
+    layer = layer_with_pending_edit
+    monkeypatch.setattr(layer, "commitChanges", lambda stopEditing: False)  # noqa: ARG005, N803
+
+    with unit_of_work() as unit:
+        save_feature(_feature(layer, "unit"), layer, None)
+
+    assert not unit.committed
+    assert layer.isEditable()
+    assert _names(layer) == ["user"]
+    assert layer.undoStack().index() == 1
+
+
+def test_unit_raising_keeps_pending_edits(layer_with_pending_edit):
+    layer = layer_with_pending_edit
+
+    def save_and_fail():
+        with unit_of_work():
+            save_feature(_feature(layer, "unit"), layer, None)
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        save_and_fail()
+
+    assert layer.isEditable()
+    assert _names(layer) == ["user"]
+
+
+def test_unit_rolled_back_without_exception_is_not_committed(layer_with_pending_edit):
+    layer = layer_with_pending_edit
+
+    with unit_of_work() as unit:
+        save_feature(_feature(layer, "unit"), layer, None)
+        unit.rollback()
+
+    assert not unit.committed
+    assert layer.isModified()
+    assert layer.dataProvider().featureCount() == 0
+    assert _names(layer) == ["user"]
+
+
+def _committed_layer(name: str, feature_names: list[str]) -> QgsVectorLayer:
+    layer = QgsVectorLayer("NoGeometry?field=name:string", name, "memory")
+    layer.dataProvider().addFeatures([_feature(layer, feature_name) for feature_name in feature_names])
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+@pytest.mark.usefixtures("qgis_new_project")
+def test_deletes_are_committed_children_first_after_inserts():
+    parent_layer = _committed_layer(RegulationGroupLayer.name, ["old parent"])
+    child_layer = _committed_layer(PlanRegulationLayer.name, ["old child"])
+    events = []
+    for layer in (parent_layer, child_layer):
+        layer.committedFeaturesAdded.connect(lambda _, __, layer=layer: events.append((layer.name(), "add")))
+        layer.committedFeaturesRemoved.connect(lambda _, __, layer=layer: events.append((layer.name(), "delete")))
+
+    with unit_of_work() as unit:
+        delete_feature(next(parent_layer.getFeatures()), parent_layer)
+        delete_feature(next(child_layer.getFeatures()), child_layer)
+        save_feature(_feature(parent_layer, "new parent"), parent_layer, None)
+        save_feature(_feature(child_layer, "new child"), child_layer, None)
+
+    assert unit.committed
+    assert events == [
+        (RegulationGroupLayer.name, "add"),
+        (PlanRegulationLayer.name, "add"),
+        (PlanRegulationLayer.name, "delete"),
+        (RegulationGroupLayer.name, "delete"),
+    ]
+    assert _names(parent_layer) == ["new parent"]
+    assert _names(child_layer) == ["new child"]